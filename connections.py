@@ -0,0 +1,157 @@
+import socket
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager
+
+_SETTINGS = None
+_POOL_MANAGER = None
+_lock = threading.Lock()
+_thread_local = threading.local()
+
+
+def _get_settings():
+    """Lazily load pool settings from config.toml with safe fallbacks."""
+    global _SETTINGS
+    if _SETTINGS is not None:
+        return _SETTINGS
+    launcher = {}
+    try:
+        from config_loader import load_config
+        launcher = load_config()["launcher"]
+    except Exception:
+        pass
+    _SETTINGS = {
+        # 每个主机保留的连接数上限，默认与单主机并发上限一致
+        "per_host": launcher.get("pool_maxsize_per_host") or launcher.get("max_connections_per_host") or launcher.get("download_threads", 64),
+        "hosts": launcher.get("pool_hosts", 32),
+        "prewarm": launcher.get("prewarm_connections", 4),
+    }
+    return _SETTINGS
+
+
+def pool_manager():
+    """进程内唯一的 urllib3 PoolManager，download 与 realtime 的所有线程共用"""
+    global _POOL_MANAGER
+    if _POOL_MANAGER is None:
+        with _lock:
+            if _POOL_MANAGER is None:
+                settings = _get_settings()
+                # 不阻塞：连接数上限由 download.HostGate 控制，超出的连接用完即关闭
+                _POOL_MANAGER = PoolManager(num_pools=settings["hosts"], maxsize=settings["per_host"], block=False)
+    return _POOL_MANAGER
+
+
+class SharedAdapter(HTTPAdapter):
+    """使用共享 PoolManager 的 HTTPAdapter；每个 adapter 只保留自己的重试策略"""
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = pool_manager()
+
+    def close(self):
+        # 共享连接池不随单个 Session 关闭
+        for proxy in self.proxy_manager.values():
+            proxy.clear()
+
+
+def get_session(name, max_retries=0):
+    """按线程缓存的 Session；name 区分不同的重试策略，底层连接在所有线程与模块之间共享"""
+    sessions = getattr(_thread_local, "sessions", None)
+    if sessions is None:
+        sessions = _thread_local.sessions = {}
+    sess = sessions.get(name)
+    if sess is None:
+        sess = requests.Session()
+        adapter = SharedAdapter(max_retries=max_retries)
+        sess.mount("http://", adapter)
+        sess.mount("https://", adapter)
+        sessions[name] = sess
+    return sess
+
+
+def _connection_pool(origin):
+    """取得 requests 实际会使用的连接池：池键包含 TLS 参数，需按 Session.request 的方式合并环境变量中的设置"""
+    sess = get_session("prewarm")
+    settings = sess.merge_environment_settings(origin, {}, None, None, None)
+    adapter = sess.get_adapter(origin)
+    if hasattr(adapter, "get_connection_with_tls_context"):
+        request = requests.Request("GET", origin).prepare()
+        return adapter.get_connection_with_tls_context(request, settings["verify"], settings["proxies"], settings["cert"])
+    return adapter.get_connection(origin, settings["proxies"])
+
+
+def _warm(origin, count, timeout):
+    parsed = urllib.parse.urlparse(origin)
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    # 预先解析 DNS（结果进入系统解析缓存）
+    socket.getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+    pool = _connection_pool(origin)
+    conns = [pool._get_conn() for _ in range(count)]
+    cold = [conn for conn in conns if getattr(conn, "sock", None) is None]
+
+    def connect(conn):
+        conn.timeout = timeout
+        conn.connect()
+
+    try:
+        if cold:
+            with ThreadPoolExecutor(max_workers=len(cold)) as executor:
+                list(executor.map(connect, cold))
+    finally:
+        for conn in conns:
+            pool._put_conn(conn)
+    return len(cold)
+
+
+def prewarm(urls, count=None, timeout=10.0):
+    """为 urls 涉及的每个主机预先解析 DNS 并建立 count 个已完成握手的空闲连接
+
+    在后台线程中进行，立即返回各主机的 Future（结果为新建的连接数）。
+    """
+    if count is None:
+        count = _get_settings()["prewarm"]
+    origins = []
+    for url in urls:
+        parsed = urllib.parse.urlparse(str(url))
+        origin = f"{parsed.scheme}://{parsed.netloc}/"
+        if parsed.scheme in ("http", "https") and parsed.hostname and origin not in origins:
+            origins.append(origin)
+    if not origins or count <= 0:
+        return []
+    executor = ThreadPoolExecutor(max_workers=len(origins), thread_name_prefix="pool-prewarm")
+    try:
+        return [executor.submit(_warm, origin, min(count, _get_settings()["per_host"]), timeout) for origin in origins]
+    finally:
+        executor.shutdown(wait=False)
+
+
+def stats():
+    """连接池统计：每个主机新建的连接数（握手次数）、请求数、连接复用率与空闲连接数"""
+    manager = pool_manager()
+    hosts = {}
+    for key in manager.pools.keys():
+        try:
+            pool = manager.pools[key]
+        except KeyError:
+            continue
+        name = f"{pool.scheme}://{pool.host}:{pool.port}"
+        entry = hosts.setdefault(name, {"handshakes": 0, "requests": 0, "idle": 0})
+        entry["handshakes"] += pool.num_connections
+        entry["requests"] += pool.num_requests
+        entry["idle"] += sum(1 for conn in list(pool.pool.queue) if conn is not None and getattr(conn, "sock", None) is not None) if pool.pool else 0
+    for entry in hosts.values():
+        entry["reuse"] = max(0.0, 1 - entry["handshakes"] / entry["requests"]) if entry["requests"] else 0.0
+    handshakes = sum(entry["handshakes"] for entry in hosts.values())
+    requests_made = sum(entry["requests"] for entry in hosts.values())
+    return {
+        "hosts": hosts,
+        "handshakes": handshakes,
+        "requests": requests_made,
+        "reuse": max(0.0, 1 - handshakes / requests_made) if requests_made else 0.0,
+    }
@@ -6,11 +6,15 @@ import urllib
 import platform
 from config_loader import load_config
 import download
+import connections
 import zipfile
 import random
 import subprocess
+import shutil
+import hashlib
+import threading
+import concurrent.futures
 import findjava
-import requests
 from typing import Optional
 #config = toml.load('config.toml')
 class core:
@@ -20,11 +24,99 @@ class core:
 		self.game_path = self.config["launcher"]["game_path"][self.config["launcher"]["latest_game_path_used"]]
 		self.threads = self.config["launcher"]["download_threads"]
 		self.system_type = platform.system().lower()
-	def show_all_version(self):
+		# 各版本安装进度，见 install_status()
+		self._installs = {}
+		self._installs_lock = threading.Lock()
+		# 正在安装（含后台资源下载）或校验的版本，见 _claim()
+		self._busy = {}
+		self._sweep_natives_staging(pathlib.Path(self.game_path) / "cache" / "natives")
+	def _fetch_manifest(self):
+		"""获取版本清单，使用 ETag/Last-Modified 条件请求复用本地缓存"""
+		cache_dir = pathlib.Path(self.game_path) / "cache"
+		manifest_path = cache_dir / "version_manifest.json"
+		meta_path = cache_dir / "version_manifest.meta.json"
+		meta = {}
+		try:
+			with open(meta_path, "r", encoding="utf-8") as f:
+				meta = json.load(f)
+		except Exception:
+			meta = {}
+		# 清单源变更后旧缓存作废
+		if meta.get("url") != self.source_link or not manifest_path.exists():
+			meta = {}
+		headers = {}
+		if meta.get("etag"):
+			headers["If-None-Match"] = meta["etag"]
+		if meta.get("last_modified"):
+			headers["If-Modified-Since"] = meta["last_modified"]
 		try:
-			resp = requests.get(self.source_link, timeout=10)
+			resp = connections.get_session("core").get(self.source_link, headers=headers, timeout=10)
+			if resp.status_code == 304:
+				with open(manifest_path, "r", encoding="utf-8") as f:
+					return json.load(f)
 			resp.raise_for_status()
-			_source_get_json = resp.json()
+			data = resp.json()
+		except Exception as e:
+			# 网络不可用时退回到本地缓存
+			if meta:
+				try:
+					with open(manifest_path, "r", encoding="utf-8") as f:
+						data = json.load(f)
+					prints.prints("warning", f"Using cached version manifest: {e}")
+					return data
+				except Exception:
+					pass
+			raise
+		# 先写临时文件再原子替换，进程中断或并发写入时不会留下不完整的缓存；
+		# 清单先于元数据替换，中断时旧元数据的校验值与新清单不符，下次请求只会多下载一次
+		suffix = f".tmp-{os.getpid()}-{threading.get_ident()}"
+		tmp_path = None
+		try:
+			os.makedirs(cache_dir, exist_ok=True)
+			tmp_path = manifest_path.with_name(manifest_path.name + suffix)
+			with open(tmp_path, "w", encoding="utf-8") as f:
+				f.write(resp.text)
+			os.replace(tmp_path, manifest_path)
+			tmp_path = meta_path.with_name(meta_path.name + suffix)
+			with open(tmp_path, "w", encoding="utf-8") as f:
+				json.dump({
+					"url": self.source_link,
+					"etag": resp.headers.get("ETag"),
+					"last_modified": resp.headers.get("Last-Modified"),
+				}, f)
+			os.replace(tmp_path, meta_path)
+		except Exception as e:
+			prints.prints("warning", f"Failed to cache version manifest: {e}")
+			if tmp_path is not None:
+				try:
+					os.remove(tmp_path)
+				except OSError:
+					pass
+		return data
+	def _fetch_version_json(self, version, game_path, save_path):
+		"""下载版本JSON；v2 清单提供 sha1 时按 sha1 缓存，同一内容只下载一次"""
+		sha1 = version.get("sha1")
+		if not sha1:
+			return download.main({version["url"]: {"save": save_path}}, 1, True)[0]
+		cached = pathlib.Path(game_path) / "cache" / "versions" / sha1[:2] / f"{sha1}.json"
+		result = download.main({version["url"]: {"save": cached, "sha1": sha1}}, 1, True)[0]
+		if result[0] != "success":
+			return result
+		tmp_path = pathlib.Path(f"{save_path}.tmp-{os.getpid()}-{threading.get_ident()}")
+		try:
+			shutil.copyfile(cached, tmp_path)
+			os.replace(tmp_path, save_path)
+		except Exception as e:
+			try:
+				os.remove(tmp_path)
+			except OSError:
+				pass
+			prints.prints("error", f"Failed to copy {cached} to {save_path}: {e}")
+			return ["error", str(e)]
+		return result
+	def show_all_version(self):
+		try:
+			_source_get_json = self._fetch_manifest()
 		except Exception as e:
 			prints.prints("error", f"Failed to fetch version manifest: {e}")
 			return {"status": "error"}
@@ -46,10 +138,20 @@ class core:
 		"all_old_version": all_old_version
 		}
 	def download(self,game_type,game_version,game_rename=None,game_path=None):
-		if game_path is None:
-			game_path = self.game_path
 		if game_rename is None:
 			game_rename = game_version
+		# 同名版本的安装或校验未结束时（包括后台资源下载）不能再次开始，否则两个任务图会写同一个 .part
+		claim = self._claim(game_rename)
+		if claim is None:
+			return ["error",f"{game_rename} is already being installed or verified"]
+		try:
+			return self._download(game_type, game_version, game_rename, game_path, claim)
+		finally:
+			if not claim["background"]:
+				self._release(game_rename, claim)
+	def _download(self, game_type, game_version, game_rename, game_path, claim):
+		if game_path is None:
+			game_path = self.game_path
 		game_path = pathlib.Path(game_path)
 		create_folder = self._Createfolders(game_path,game_rename)
 		all_version = self.show_all_version()
@@ -68,64 +170,487 @@ class core:
 					_version_json = install_path / str(game_rename+pathlib.Path(version["url"]).suffix)
 				else:
 					_version_json = install_path / os.path.basename(urllib.parse.urlparse(version["url"]).path)# 主要是获取游戏JSON文件在url中的文件名
-				if download.main({version["url"]:{"save":_version_json}}, 1, True)[0][0] == "success":
+				if self._fetch_version_json(version, game_path, _version_json)[0] == "success":
 					with open(_version_json,"r") as f:
 						_game_json = json.load(f)
 					prints.prints("info",f"reading {_version_json}")
-					library_url = {}
-					natives_url = {}
-					# Normalize OS key for natives mapping
-					current_os_key = self.system_type
-					if current_os_key == "darwin":
-						current_os_key = "osx"
-					# Collect library artifacts and native classifiers for download first
-					for library in _game_json["libraries"]:
-						downloads = library.get("downloads", {})
-						artifact = downloads.get("artifact")
-						if artifact:
-							lib_artifact_path = artifact.get("path")
-							lib_artifact_url = artifact.get("url")
-							# 替换链接的默认源为bmclapi源
-							if self.config["launcher"]["source_link_used"] != "mojang" and lib_artifact_url:
-								lib_artifact_url = lib_artifact_url.replace("https://libraries.minecraft.net/",self.config["source_link"][self.config["launcher"]["source_link_used"]]["libraries"])
-							if lib_artifact_url and lib_artifact_path:
-								library_url[lib_artifact_url] = {"save": game_path / "libraries" / lib_artifact_path,
-									"size": artifact.get("size"),
-									"sha1": artifact.get("sha1")}
-								os.makedirs(os.path.dirname(game_path / "libraries" / lib_artifact_path), exist_ok=True)
-						# Handle native classifiers
-						if "natives" in library and "classifiers" in downloads:
-							classifier_key = library["natives"].get(current_os_key)
-							if classifier_key:
-								classifier = downloads["classifiers"].get(classifier_key)
-								if classifier:
-									native_path = classifier.get("path")
-									native_url = classifier.get("url")
-									if self.config["launcher"]["source_link_used"] != "mojang" and native_url:
-										native_url = native_url.replace("https://libraries.minecraft.net/", self.config["source_link"][self.config["launcher"]["source_link_used"]]["libraries"])
-									if native_url and native_path:
-										natives_url[native_url] = {"save": game_path / "libraries" / native_path,
-											"size": classifier.get("size"),
-											"sha1": classifier.get("sha1")}
-										os.makedirs(os.path.dirname(game_path / "libraries" / native_path), exist_ok=True)
-					# Download libraries and natives
-					download.main(library_url, self.threads, True)
-					if natives_url:
-						download.main(natives_url, self.threads, True)
-						# Extract natives after download
-						natives_dir = install_path / (game_rename+"-natives")
-						for save_info in natives_url.values():
-							self._extract_libraries(save_info["save"], natives_dir)
-					# 下载assets的json文件
+					library_url, natives_url = self._library_files(_game_json, game_path)
+					# 所有阶段放进同一个依赖感知任务图，共享一个线程池：
+					# 资源索引与资源对象在解析版本JSON后立即开始，natives 每下载完一个就解压一个
+					natives_dir = install_path / (game_rename+"-natives")
 					_assetsIndex = _game_json["assetIndex"]
 					assetsJsonSavePath = game_path / "assets" / "indexes" / urllib.parse.urlparse(_assetsIndex["url"]).path.split('/')[-1]
-					download.main({_assetsIndex["url"]:{"save":assetsJsonSavePath,"size":_assetsIndex.get("size"),"sha1":_assetsIndex.get("sha1")}}, 1, True)
-					self.download_assets(assetsJsonSavePath)
-					return ["success",f"{game_rename} installation is complete"]
+					client = _game_json.get("downloads", {}).get("client")
+					files = {}
+					if client:
+						files[client["url"]] = {"save": install_path / f"{game_rename}.jar", "size": client.get("size"), "sha1": client.get("sha1")}
+					files.update(library_url)
+					index_info = {"save":assetsJsonSavePath,"size":_assetsIndex.get("size"),"sha1":_assetsIndex.get("sha1")}
+					# 增量安装：与上次安装记录的文件列表比较，未变化且仍在磁盘上的文件不再提交
+					install_state = self._install_state(game_path, {**files, **natives_url}, index_info)
+					previous_state = self._load_install_state(game_path, game_rename) if self.config["launcher"].get("incremental_install", True) else {}
+					unchanged = self._unchanged_files(game_path, previous_state, {**files, **natives_url, _assetsIndex["url"]: index_info})
+					# natives 目录被清空时重新解压全部 natives
+					if not os.path.isdir(natives_dir) or not os.listdir(natives_dir):
+						unchanged -= natives_url.keys()
+					prints.prints("info", self._describe_plan(previous_state, install_state, unchanged))
+					# 资源索引即将被替换时先记下旧索引引用的对象，安装完成后用于回收
+					old_objects = self._index_objects(game_path / previous_state["asset_index"]) if previous_state.get("asset_index") and _assetsIndex["url"] not in unchanged else None
+					# 磁盘空间预检：开始传输前统计客户端、依赖库、natives 与缺失资源对象的大小
+					required = download.missing_bytes(files) + download.missing_bytes(natives_url) + self._missing_asset_bytes(_assetsIndex, assetsJsonSavePath, game_path)
+					space = download.check_free_space(game_path, required, self.config)
+					if space[0] == "error":
+						prints.prints("error", space[1])
+						return space
+					prints.prints("info", f"Disk space check: {space[1]}")
+					# 后台预先解析 DNS 并建立到各下载源的连接，与任务图的启动并行
+					download.prewarm([
+						_assetsIndex["url"],
+						client["url"] if client else None,
+						next(iter(library_url), None),
+						self.config["source_link"][self.config["launcher"]["source_link_used"]]["assets"],
+					], self.config)
+					# 启动所需的文件（资源索引、客户端、依赖库、natives）为关键任务，优先执行；资源对象在后台以低优先级下载
+					started = time.monotonic()
+					self._set_install(game_rename, state="downloading", launchable=False, error=None, launchable_after=None, done=threading.Event(),
+						assets_total=0, assets_done=0, assets_failed=0, assets_error=None, assets_feed=None,
+						game_path=game_path, install_state=install_state, previous_state=previous_state, old_objects=old_objects)
+					scheduler = download.Scheduler(self.threads)
+					deep_verify = self.config["launcher"].get("deep_verify", False)
+					critical = []
+					try:
+						index_job = None
+						if _assetsIndex["url"] not in unchanged:
+							index_job = scheduler.fetch(_assetsIndex["url"], index_info, deep_verify=deep_verify, priority=download.CRITICAL)
+							critical.append(index_job)
+						critical.append(scheduler.task(self._queue_assets, scheduler, assetsJsonSavePath, game_path, game_rename, after=[index_job], priority=download.CRITICAL))
+						# 客户端与依赖库按大小排序后提交，大文件先开始，避免最后只剩它们在下载
+						for file_url, save_info in download.order_jobs(files, self.threads, self.config):
+							if file_url not in unchanged:
+								critical.append(scheduler.fetch(file_url, save_info, deep_verify=deep_verify, priority=download.CRITICAL))
+						for native_url, save_info in natives_url.items():
+							if native_url in unchanged:
+								continue
+							native_job = scheduler.fetch(native_url, save_info, deep_verify=deep_verify, priority=download.CRITICAL)
+							critical.append(native_job)
+							critical.append(scheduler.task(self._extract_libraries, save_info["save"], natives_dir, save_info.get("sha1"), game_path / "cache" / "natives", after=[native_job], priority=download.CRITICAL))
+						concurrent.futures.wait(critical)
+					except BaseException:
+						scheduler.close()
+						raise
+					failed = self._failed_jobs(critical)
+					self._touch_libraries_stamp(game_path)
+					if not failed:
+						self._set_install(game_rename, state="launchable", launchable=True, launchable_after=time.monotonic() - started)
+						prints.prints("info", f"{game_rename} is launchable after {time.monotonic() - started:.2f}s, {self._installs[game_rename]['assets_total']} asset objects queued")
+						if self.config["launcher"].get("background_assets", False):
+							threading.Thread(target=self._finish_background, args=(game_rename, scheduler, claim), name=f"assets-{game_rename}", daemon=True).start()
+							claim["background"] = True
+							return ["success", f"{game_rename} is launchable, assets are downloading in the background"]
+					return self._finish_install(game_rename, scheduler, failed)
 				return ["error",f"Download Failure: {_version_json}"]
 		# 如果循环结束仍未找到对应版本
 		prints.prints("error",f"No game version found: {game_version}")
 		return ["error",f"No game version found: {game_version}"]
+	def _library_files(self, _game_json, game_path):
+		"""版本JSON中的依赖库与当前系统的 natives，返回 ({url: info}, {url: info})；下载时目录由 download 自动创建"""
+		game_path = pathlib.Path(game_path)
+		library_url = {}
+		natives_url = {}
+		# Normalize OS key for natives mapping
+		current_os_key = self.system_type
+		if current_os_key == "darwin":
+			current_os_key = "osx"
+		# Collect library artifacts and native classifiers for download first
+		for library in _game_json.get("libraries", []):
+			downloads = library.get("downloads", {})
+			artifact = downloads.get("artifact")
+			if artifact:
+				lib_artifact_path = artifact.get("path")
+				lib_artifact_url = artifact.get("url")
+				# 替换链接的默认源为bmclapi源
+				if self.config["launcher"]["source_link_used"] != "mojang" and lib_artifact_url:
+					lib_artifact_url = lib_artifact_url.replace("https://libraries.minecraft.net/",self.config["source_link"][self.config["launcher"]["source_link_used"]]["libraries"])
+				if lib_artifact_url and lib_artifact_path:
+					library_url[lib_artifact_url] = {"save": game_path / "libraries" / lib_artifact_path,
+						"size": artifact.get("size"),
+						"sha1": artifact.get("sha1")}
+			# Handle native classifiers
+			if "natives" in library and "classifiers" in downloads:
+				classifier_key = library["natives"].get(current_os_key)
+				if classifier_key:
+					classifier = downloads["classifiers"].get(classifier_key)
+					if classifier:
+						native_path = classifier.get("path")
+						native_url = classifier.get("url")
+						if self.config["launcher"]["source_link_used"] != "mojang" and native_url:
+							native_url = native_url.replace("https://libraries.minecraft.net/", self.config["source_link"][self.config["launcher"]["source_link_used"]]["libraries"])
+						if native_url and native_path:
+							natives_url[native_url] = {"save": game_path / "libraries" / native_path,
+								"size": classifier.get("size"),
+								"sha1": classifier.get("sha1")}
+		return library_url, natives_url
+	def verify(self, game_rename=None, game_path=None, repair=True, deep_verify=True):
+		"""校验已安装版本的完整性，并只重新下载缺失或损坏的文件
+
+		检查客户端、依赖库、natives、资源索引与资源对象；game_rename 为 None 时检查 versions 下的全部版本
+		（inheritsFrom 的父版本一并检查）。文件在 verify_threads 个线程中并行计算 SHA1，
+		deep_verify 为 False 时状态未变化的文件直接采用校验索引中的结果。
+		返回 ["success"/"error", 报告]，报告可直接 JSON 序列化：
+		versions（各版本的读取结果）, checked, ok, bytes_hashed, seconds, damaged（损坏/缺失的文件条目）,
+		repaired（已修复的路径）, repair_failed。
+		正在安装或校验的版本不会被检查，其 versions 条目为 "error: installation in progress"。
+		"""
+		claims = {}
+		try:
+			return self._verify(game_rename, game_path, repair, deep_verify, claims)
+		finally:
+			for name, claim in claims.items():
+				self._release(name, claim)
+	def _verify(self, game_rename, game_path, repair, deep_verify, claims):
+		if game_path is None:
+			game_path = self.game_path
+		game_path = pathlib.Path(game_path)
+		started = time.monotonic()
+		if game_rename is None:
+			try:
+				names = sorted(entry.name for entry in os.scandir(game_path / "versions") if entry.is_dir() and (pathlib.Path(entry.path) / f"{entry.name}.json").exists())
+			except FileNotFoundError:
+				names = []
+		else:
+			names = [game_rename]
+		report = {"versions": {}, "checked": 0, "ok": 0, "bytes_hashed": 0, "seconds": 0.0, "damaged": [], "repaired": [], "repair_failed": []}
+		# 以保存路径为键：同一版本以不同名称安装时客户端 url 相同，但各有一份文件
+		files = {}
+		indexes = {}
+		natives_dirs = {}
+		while names:
+			name = names.pop(0)
+			if name in report["versions"]:
+				continue
+			claim = self._claim(name)
+			if claim is None:
+				report["versions"][name] = "error: installation in progress"
+				continue
+			claims[name] = claim
+			install_path = game_path / "versions" / name
+			try:
+				with open(install_path / f"{name}.json", "r", encoding="utf-8") as f:
+					_game_json = json.load(f)
+			except Exception as e:
+				report["versions"][name] = f"error: {e}"
+				continue
+			report["versions"][name] = "ok"
+			if _game_json.get("inheritsFrom"):
+				names.append(_game_json["inheritsFrom"])
+			client = _game_json.get("downloads", {}).get("client")
+			if client:
+				save_path = install_path / f"{name}.jar"
+				files[str(save_path)] = (client["url"], {"save": save_path, "size": client.get("size"), "sha1": client.get("sha1")})
+			library_url, natives_url = self._library_files(_game_json, game_path)
+			for file_url, info in {**library_url, **natives_url}.items():
+				files[str(info["save"])] = (file_url, info)
+			for info in natives_url.values():
+				natives_dirs.setdefault(str(info["save"]), []).append(install_path / f"{name}-natives")
+			asset_index = _game_json.get("assetIndex")
+			if asset_index and asset_index.get("url"):
+				save_path = game_path / "assets" / "indexes" / urllib.parse.urlparse(asset_index["url"]).path.split('/')[-1]
+				indexes[str(save_path)] = (asset_index["url"], {"save": save_path, "size": asset_index.get("size"), "sha1": asset_index.get("sha1")})
+		# 先校验（并修复）资源索引，资源对象的列表来自索引
+		damaged = self._verify_files(indexes, deep_verify, report)
+		if repair and damaged:
+			self._repair_files(damaged, report)
+		objects_dir = game_path / "assets" / "objects"
+		assets_link = self.config["source_link"][self.config["launcher"]["source_link_used"]]["assets"]
+		objects = {}
+		for _, info in indexes.values():
+			try:
+				with open(info["save"], "r") as f:
+					for obj in json.load(f)["objects"].values():
+						objects[obj["hash"]] = obj["size"]
+			except Exception:
+				continue
+		for temp_hash, size in objects.items():
+			save_path = objects_dir / temp_hash[:2] / temp_hash
+			files[str(save_path)] = (assets_link + temp_hash[:2] + "/" + temp_hash, {"save": save_path, "size": size, "sha1": temp_hash})
+		del objects
+		damaged = self._verify_files(files, deep_verify, report)
+		if repair and damaged:
+			for path in self._repair_files(damaged, report):
+				# 修复后的 natives 重新解压到引用它的版本
+				for natives_dir in natives_dirs.get(path, ()):
+					self._extract_libraries(files[path][1]["save"], natives_dir, files[path][1].get("sha1"), game_path / "cache" / "natives")
+		report["seconds"] = time.monotonic() - started
+		remaining = len(report["damaged"]) - len(report["repaired"]) if repair else len(report["damaged"])
+		prints.prints("info", f"Verified {report['checked']} files in {report['seconds']:.2f}s ({report['bytes_hashed'] / 1048576:.1f} MiB hashed): {len(report['damaged'])} damaged, {len(report['repaired'])} repaired")
+		if remaining or any(status != "ok" for status in report["versions"].values()):
+			return ["error", report]
+		return ["success", report]
+	def _verify_files(self, files, deep_verify, report):
+		"""并行校验 files（{保存路径: (url, info)}），把结果计入 report，返回需要修复的条目（格式相同）"""
+		damaged = {}
+		for entry in download.iter_verify(list(files.values()), None, deep_verify, self.config):
+			report["checked"] += 1
+			report["bytes_hashed"] += entry["hashed"]
+			if entry["status"] == "ok":
+				report["ok"] += 1
+			else:
+				prints.prints("warning", f"Damaged file ({entry['status']}): {entry['path']}")
+				report["damaged"].append(entry)
+				damaged[entry["path"]] = files[entry["path"]]
+		return damaged
+	def _repair_files(self, damaged, report):
+		"""重新下载 damaged 中的文件，返回修复成功的保存路径列表
+
+		同一 url 对应多个保存路径时分轮下载，每轮每个 url 只出现一次（download.main 按 url 回报结果）。
+		"""
+		repaired = []
+		# 与损坏文件硬链接在一起的共享仓库 blob 同样已损坏，不能再用于修复
+		for _, info in damaged.values():
+			download.drop_from_store(info["save"], info.get("sha1"), self.config)
+		rounds = []
+		for path, (url, info) in damaged.items():
+			for batch in rounds:
+				if url not in batch:
+					break
+			else:
+				batch = {}
+				rounds.append(batch)
+			batch[url] = (path, info)
+		for batch in rounds:
+			def on_result(url, result, batch=batch):
+				path = batch[url][0]
+				if result[0] == "success":
+					repaired.append(path)
+					report["repaired"].append(path)
+				else:
+					report["repair_failed"].append({"path": path, "error": str(result[1])})
+			download.main({url: info for url, (_, info) in batch.items()}, self.threads, False, on_result=on_result)
+		return repaired
+	def gc_store(self):
+		"""删除共享仓库（launcher.shared_store）中既没有安装记录引用、也没有硬链接的 blob"""
+		shared = download.get_store(self.config)
+		if shared is None:
+			return ["error", "shared_store is not configured"]
+		report = shared.gc()
+		prints.prints("info", f"Shared store GC: removed {report['removed']} blobs ({report['freed'] / 1048576:.1f} MiB), kept {report['kept']}")
+		return ["success", report]
+	def _failed_jobs(self, jobs):
+		failed = []
+		for job in jobs:
+			if job.exception() is not None:
+				failed.append(str(job.exception()))
+			elif isinstance(job.result(), list) and job.result()[0] == "error":
+				failed.append(str(job.result()[1]))
+		return failed
+	def _claim(self, game_rename):
+		"""占用 game_rename；同名版本正在安装或校验时返回 None"""
+		with self._installs_lock:
+			if game_rename in self._busy:
+				return None
+			claim = self._busy[game_rename] = {"background": False}
+			return claim
+	def _release(self, game_rename, claim):
+		with self._installs_lock:
+			if self._busy.get(game_rename) is claim:
+				del self._busy[game_rename]
+	def _finish_background(self, game_rename, scheduler, claim):
+		try:
+			self._finish_install(game_rename, scheduler)
+		finally:
+			self._release(game_rename, claim)
+	def _set_install(self, game_rename, **fields):
+		with self._installs_lock:
+			self._installs.setdefault(game_rename, {}).update(fields)
+	def _finish_install(self, game_rename, scheduler, failed=()):
+		"""等待剩余的资源对象下载完成并关闭任务图，记录最终状态；failed 为关键任务的失败信息"""
+		try:
+			scheduler.join()
+		finally:
+			scheduler.close()
+		download.report_timing()
+		pool = connections.stats()
+		prints.prints("info", f"Connection pool: {pool['handshakes']} connections opened for {pool['requests']} requests (reuse {pool['reuse']:.0%})")
+		shared = download.get_store(self.config)
+		if shared is not None:
+			counts = shared.stats()
+			prints.prints("info", f"Shared store: {counts['hits']} files reused, {counts['added']} added ({counts['hardlink']} hardlinks, {counts['reflink']} reflinks, {counts['copy']} copies)")
+		install = self._installs[game_rename]
+		failed = list(failed)
+		if install["assets_feed"] is not None and install["assets_feed"].exception() is not None:
+			failed.append(str(install["assets_feed"].exception()))
+		count = len(failed) + install["assets_failed"]
+		if install["assets_error"] is not None:
+			failed.append(install["assets_error"])
+		if count:
+			prints.prints("error", f"{count} install tasks failed for {game_rename}")
+			self._set_install(game_rename, state="error", error=failed[0])
+			result = ["error",f"{count} install tasks failed: {failed[0]}"]
+		else:
+			layout = self._materialize_assets(install["game_path"] / install["install_state"]["asset_index"], install["game_path"], install["game_path"] / "versions" / game_rename)
+			if layout[0] == "error":
+				self._set_install(game_rename, state="error", error=layout[1])
+				result = layout
+			else:
+				self._commit_install_state(game_rename)
+				self._set_install(game_rename, state="complete")
+				result = ["success",f"{game_rename} installation is complete"]
+		self._installs[game_rename]["done"].set()
+		return result
+	def _install_state(self, game_path, entries, index_info):
+		"""安装记录：各文件相对 game_path 的路径、大小与 sha1，以及资源索引的路径"""
+		files = {}
+		for info in list(entries.values()) + [index_info]:
+			files[pathlib.Path(os.path.relpath(info["save"], game_path)).as_posix()] = [info.get("size"), info.get("sha1")]
+		return {"files": files, "asset_index": pathlib.Path(os.path.relpath(index_info["save"], game_path)).as_posix()}
+	def _load_install_state(self, game_path, game_rename):
+		try:
+			with open(pathlib.Path(game_path) / "versions" / game_rename / "install_state.json", "r", encoding="utf-8") as f:
+				return json.load(f)
+		except Exception:
+			return {}
+	def _unchanged_files(self, game_path, previous_state, entries):
+		"""上次安装记录中大小与 sha1 相同、且磁盘上大小仍一致的文件的 url 集合"""
+		previous = previous_state.get("files", {})
+		unchanged = set()
+		for url, info in entries.items():
+			rel = pathlib.Path(os.path.relpath(info["save"], game_path)).as_posix()
+			if previous.get(rel) != [info.get("size"), info.get("sha1")]:
+				continue
+			try:
+				if info.get("size") is not None and os.path.getsize(info["save"]) != int(info["size"]):
+					continue
+			except OSError:
+				continue
+			unchanged.add(url)
+		return unchanged
+	def _describe_plan(self, previous_state, install_state, unchanged):
+		previous = previous_state.get("files", {})
+		current = install_state["files"]
+		added = sum(1 for rel in current if rel not in previous)
+		changed = sum(1 for rel, entry in current.items() if rel in previous and previous[rel] != entry)
+		removed = sum(1 for rel in previous if rel not in current)
+		return f"Install plan: {added} added, {changed} changed, {len(unchanged)} unchanged, {removed} removed"
+	def _index_objects(self, index_path):
+		"""资源索引引用的对象哈希集合，索引不可读时返回 None"""
+		try:
+			with open(index_path, "r") as f:
+				return {obj["hash"] for obj in json.load(f)["objects"].values()}
+		except Exception:
+			return None
+	def _commit_install_state(self, game_rename):
+		"""安装成功后保存安装记录，并回收旧记录中不再被任何版本引用的文件"""
+		install = self._installs[game_rename]
+		game_path = install["game_path"]
+		state = install["install_state"]
+		if self.config["launcher"].get("gc_orphans", True) and install["previous_state"]:
+			self._collect_orphans(game_rename, game_path, install["previous_state"], state, install["old_objects"])
+		state_path = game_path / "versions" / game_rename / "install_state.json"
+		try:
+			tmp_path = state_path.with_suffix(".json.tmp")
+			with open(tmp_path, "w", encoding="utf-8") as f:
+				json.dump(state, f)
+			os.replace(tmp_path, state_path)
+		except OSError as e:
+			prints.prints("warning", f"Failed to save install state: {e}")
+			return
+		shared = download.get_store(self.config)
+		if shared is not None:
+			# 在共享仓库中登记本版本引用的 sha1，reflink/复制放置的文件也不会被 gc_store 回收
+			objects = {sha1 for _, sha1 in state["files"].values() if sha1}
+			objects |= self._index_objects(game_path / state["asset_index"]) or set()
+			try:
+				shared.set_references(state_path, objects)
+			except OSError as e:
+				prints.prints("warning", f"Failed to register shared store references: {e}")
+	def _install_references(self, game_path, exclude):
+		"""除 exclude 外所有已安装版本引用的文件（相对路径集合）与资源对象（哈希集合）
+
+		存在无法读取的版本JSON时文件为 None，存在无法读取的索引时资源对象为 None，此时无法确定哪些文件不再被引用。
+		"""
+		files = set()
+		objects = set()
+		try:
+			names = [entry.name for entry in os.scandir(game_path / "versions") if entry.is_dir() and entry.name != exclude]
+		except FileNotFoundError:
+			names = []
+		for name in names:
+			install_path = game_path / "versions" / name
+			state = self._load_install_state(game_path, name)
+			if not state:
+				# 没有安装记录的旧版本：按其版本JSON计算引用
+				try:
+					with open(install_path / f"{name}.json", "r", encoding="utf-8") as f:
+						_game_json = json.load(f)
+				except FileNotFoundError:
+					# 没有版本JSON的目录不是已安装的版本
+					continue
+				except Exception as e:
+					prints.prints("warning", f"Unable to read {name}.json: {e}")
+					return None, None
+				entries = {}
+				client = _game_json.get("downloads", {}).get("client")
+				if client:
+					entries[client["url"]] = {"save": install_path / f"{name}.jar"}
+				for part in self._library_files(_game_json, game_path):
+					entries.update(part)
+				asset_index = _game_json.get("assetIndex") or {}
+				index_path = game_path / "assets" / "indexes" / urllib.parse.urlparse(asset_index.get("url", "")).path.split('/')[-1]
+				state = self._install_state(game_path, entries, {"save": index_path})
+			files.update(state.get("files", {}))
+			if objects is not None and state.get("asset_index"):
+				index_objects = self._index_objects(game_path / state["asset_index"])
+				objects = objects | index_objects if index_objects is not None else None
+		return files, objects
+	def _collect_orphans(self, game_rename, game_path, previous_state, state, old_objects):
+		"""删除上次安装引用、本次不再引用且其他版本也未引用的文件与资源对象"""
+		removed = [rel for rel in previous_state.get("files", {}) if rel not in state["files"]]
+		if not removed and old_objects is None:
+			return
+		referenced, referenced_objects = self._install_references(game_path, game_rename)
+		if referenced is None:
+			prints.prints("warning", "Skipping orphaned file cleanup: an installed version json is unreadable")
+			return
+		orphans = [game_path / rel for rel in removed if rel not in referenced]
+		if old_objects is not None:
+			new_objects = self._index_objects(game_path / state["asset_index"])
+			if new_objects is None or referenced_objects is None:
+				prints.prints("warning", "Skipping asset object cleanup: an installed asset index is unreadable")
+			else:
+				orphans.extend(game_path / "assets" / "objects" / h[:2] / h for h in old_objects - new_objects - referenced_objects)
+		verify_index = download.get_verify_index(self.config)
+		count = 0
+		freed = 0
+		for path in orphans:
+			try:
+				freed += os.path.getsize(path)
+				os.remove(path)
+				verify_index.forget(path)
+				count += 1
+			except FileNotFoundError:
+				pass
+			except OSError as e:
+				prints.prints("warning", f"Failed to remove orphaned file {path}: {e}")
+		verify_index.save()
+		if count:
+			prints.prints("info", f"Removed {count} orphaned files ({freed / 1048576:.1f} MiB) no longer used by {game_rename}")
+	def install_status(self, game_rename):
+		"""download() 的安装进度
+
+		state: downloading（关键文件下载中）/ launchable（可以启动，资源对象仍在下载）/ complete / error；
+		background_assets 开启时 download() 在 launchable 时即返回，之后可轮询此方法或用 wait_install() 等待。
+		"""
+		with self._installs_lock:
+			install = self._installs.get(game_rename)
+			if install is None:
+				return {"state": "unknown"}
+			return {key: install[key] for key in ("state", "launchable", "launchable_after", "error", "assets_total", "assets_done", "assets_failed")}
+	def wait_install(self, game_rename, timeout=None):
+		"""等待 game_rename 的后台资源下载结束，返回 install_status()"""
+		install = self._installs.get(game_rename)
+		if install is not None:
+			install["done"].wait(timeout)
+		return self.install_status(game_rename)
 	def _Createfolders(self,game_path,game_rename):
 		install_path = game_path / "versions" / game_rename
 		try:
@@ -144,33 +669,179 @@ class core:
 		except Exception as e:
 			prints.prints("error",e)
 			return ["error",e]
-	def download_assets(self,assets_json):
-		assets_json = json.loads(open(assets_json,"r").read())["objects"]
-		assets_download = {}
+	def _scan_asset_objects(self, objects_dir):
+		"""扫描 assets/objects 下的哈希前缀目录，返回 (已存在对象哈希集合, 已存在前缀集合)
+
+		启用 persist_asset_index 时，目录 mtime 未变化的前缀直接复用 .index.json 中的列表。
+		"""
+		persist = self.config["launcher"].get("persist_asset_index", True)
+		index_path = os.path.join(objects_dir, ".index.json")
+		cached = {}
+		if persist:
+			try:
+				with open(index_path, "r", encoding="utf-8") as f:
+					cached = json.load(f)
+			except Exception:
+				cached = {}
+		present = set()
+		prefixes = set()
+		listing = {}
+		try:
+			with os.scandir(objects_dir) as it:
+				for prefix in it:
+					if len(prefix.name) != 2 or not prefix.is_dir():
+						continue
+					prefixes.add(prefix.name)
+					mtime_ns = prefix.stat().st_mtime_ns
+					entry = cached.get(prefix.name)
+					if entry and entry[0] == mtime_ns:
+						names = entry[1]
+					else:
+						with os.scandir(prefix.path) as objects:
+							names = [obj.name for obj in objects if obj.is_file()]
+					listing[prefix.name] = [mtime_ns, names]
+					present.update(names)
+		except FileNotFoundError:
+			return present, prefixes
+		if persist and listing != cached:
+			try:
+				tmp_path = index_path + ".tmp"
+				with open(tmp_path, "w", encoding="utf-8") as f:
+					json.dump(listing, f)
+				os.replace(tmp_path, index_path)
+			except Exception as e:
+				prints.prints("warning", f"Failed to save asset index cache: {e}")
+		return present, prefixes
+	def _missing_asset_bytes(self, asset_index, index_path, game_path):
+		"""缺失资源对象的总字节数；本地还没有资源索引时按版本JSON中的 totalSize 估计"""
+		try:
+			with open(index_path, "r") as f:
+				objects = json.load(f)["objects"]
+		except Exception:
+			return int(asset_index.get("totalSize") or 0) + int(asset_index.get("size") or 0)
+		wanted = {obj["hash"]: obj["size"] for obj in objects.values()}
+		present, _ = self._scan_asset_objects(pathlib.Path(game_path) / "assets" / "objects")
+		return sum(wanted[h] for h in wanted.keys() - present)
+	def _plan_assets(self,assets_json,game_path,on_plan=None):
+		"""按需逐个产出缺失资源对象的下载任务 (url, info)，可直接传给 download.main；on_plan(缺失数量) 在产出第一个任务前调用"""
+		with open(assets_json, "r") as f:
+			assets_json = json.load(f)["objects"]
+		objects_dir = pathlib.Path(game_path) / "assets" / "objects"
 		assets_download_link = self.config["source_link"][self.config["launcher"]["source_link_used"]]["assets"]
+		# 一次扫描得到已存在的对象，缺失对象由集合差得到
+		wanted = {}
 		for i in assets_json:
-			temp_hash = assets_json[i]["hash"]
-			_size = assets_json[i]["size"]
-			_save_path = pathlib.Path(self.game_path )/ "assets" / "objects" / temp_hash[:2] / temp_hash
-			if not os.path.exists(_save_path):
-				os.makedirs(os.path.dirname(_save_path),exist_ok=True)
-				assets_download[assets_download_link+temp_hash[:2]+"/"+temp_hash] = {"save":_save_path,"sha1":temp_hash,"size":_size}
-		download.main(assets_download,self.threads)
+			wanted[assets_json[i]["hash"]] = assets_json[i]["size"]
+		del assets_json
+		present, prefixes = self._scan_asset_objects(objects_dir)
+		missing = wanted.keys() - present
+		del present
+		if on_plan is not None:
+			on_plan(len(missing))
+		for temp_hash in missing:
+			prefix = temp_hash[:2]
+			if prefix not in prefixes:
+				os.makedirs(objects_dir / prefix, exist_ok=True)
+				prefixes.add(prefix)
+			yield assets_download_link+prefix+"/"+temp_hash, {"save":objects_dir / prefix / temp_hash,"sha1":temp_hash,"size":wanted[temp_hash]}
+	def _queue_assets(self,scheduler,assets_json,game_path,game_rename):
+		"""把缺失的资源对象以低优先级逐步交给 scheduler，同时在途的不超过 download_window 个；进度只记录计数"""
+		install = self._installs[game_rename]
+		def on_plan(total):
+			self._set_install(game_rename, assets_total=total)
+		def on_result(url, result):
+			with self._installs_lock:
+				install["assets_done"] += 1
+				if result[0] != "success":
+					install["assets_failed"] += 1
+					if install["assets_error"] is None:
+						install["assets_error"] = str(result[1])
+		jobs = download.order_jobs(self._plan_assets(assets_json, game_path, on_plan), self.threads, self.config)
+		feed = scheduler.feed(jobs, download.window_size(self.config, self.threads), False, priority=download.BACKGROUND, on_result=on_result)
+		self._set_install(game_rename, assets_feed=feed)
+	def download_assets(self,assets_json,game_path=None,game_dir=None):
+		"""下载资源索引 assets_json 中缺失的资源对象；旧版本索引还会展开到 virtual 或 game_dir/resources 目录"""
+		if game_path is None:
+			game_path = self.game_path
+		# 任务逐个生成、结果逐个回调，内存占用不随资源数量增长
+		failed = []
+		def on_result(url, result):
+			if result[0] != "success":
+				failed.append(url)
+		download.main(self._plan_assets(assets_json, game_path), self.threads, on_result=on_result)
+		if failed:
+			prints.prints("error", f"{len(failed)} assets failed to download")
+			return ["error", f"{len(failed)} assets failed to download: {failed[0]}"]
+		layout = self._materialize_assets(assets_json, game_path, game_dir)
+		if layout[0] == "error":
+			return layout
 		return ["success","Assets download ok"]
-	def _extract_libraries(self, zip_path, output_dir):
+	def _materialize_assets(self, index_path, game_path, game_dir=None):
+		"""按逻辑文件名把资源对象放到旧版本需要的目录结构中
+
+		资源索引带 virtual 时放到 assets/virtual/<索引名>，带 map_to_resources 时放到 game_dir/resources；
+		优先硬链接，失败时符号链接或复制（见 download.link_file），需要放置的文件在线程池中并行处理。
+		已就位的文件只比较一次 stat，布局完整时几乎没有开销。
+		返回 ["success", {"layout": "virtual"/"resources"/None, "path", "placed", "missing"}]。
+		"""
+		try:
+			with open(index_path, "r") as f:
+				index = json.load(f)
+		except Exception as e:
+			return ["error", f"Unable to read asset index {index_path}: {e}"]
+		report = {"layout": None, "path": None, "placed": 0, "missing": 0}
+		if index.get("map_to_resources") and game_dir is not None:
+			report["layout"], target = "resources", pathlib.Path(game_dir) / "resources"
+		elif index.get("virtual"):
+			report["layout"], target = "virtual", pathlib.Path(game_path) / "assets" / "virtual" / pathlib.Path(index_path).stem
+		else:
+			return ["success", report]
+		root = os.path.abspath(target)
+		report["path"] = root
+		objects_dir = pathlib.Path(game_path) / "assets" / "objects"
+		pending = []
+		for name, obj in index.get("objects", {}).items():
+			dst = os.path.abspath(os.path.join(root, name))
+			# 文件名不能跳出目标目录
+			if not dst.startswith(root + os.sep):
+				continue
+			try:
+				if os.stat(dst).st_size == obj["size"]:
+					continue
+			except OSError:
+				pass
+			src = objects_dir / obj["hash"][:2] / obj["hash"]
+			if not src.exists():
+				report["missing"] += 1
+				continue
+			pending.append((src, dst))
+		if pending:
+			try:
+				with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(32, self.threads))) as executor:
+					for _ in executor.map(lambda job: download.link_file(*job), pending):
+						report["placed"] += 1
+			except OSError as e:
+				prints.prints("error", f"Failed to lay out assets in {root}: {e}")
+				return ["error", f"Failed to lay out assets in {root}: {e}"]
+			prints.prints("info", f"Laid out {report['placed']} assets in {root} ({report['missing']} objects missing)")
+		return ["success", report]
+	def _extract_libraries(self, zip_path, output_dir, sha1=None, cache_dir=None):
+	    """解压 natives 到 output_dir
+
+	    提供 natives jar 的 sha1 与 cache_dir 时，每个 jar 只解压一次到 cache_dir/<sha1>，
+	    各版本的 natives 目录通过硬链接（失败时符号链接/复制）引用缓存中的文件。
+	    """
 	    try:
+	        if sha1 and cache_dir is not None:
+	            source_dir = self._extract_natives_cached(zip_path, pathlib.Path(cache_dir), sha1)
+	            os.makedirs(output_dir, exist_ok=True)
+	            with open(source_dir / ".files.json", "r", encoding="utf-8") as f:
+	                names = json.load(f)
+	            for name in names:
+	                download.link_file(source_dir / name, pathlib.Path(output_dir) / name)
+	            return ["success", f"Extract ok: {zip_path}"]
 	        prints.prints("info", f"Extracting library: {zip_path} to {output_dir}")
-	        with zipfile.ZipFile(zip_path, "r") as zf:
-	            for member in zf.infolist():
-	                filename = member.filename
-	                # 严格匹配三种目标文件类型
-	                if filename.endswith((".dylib", ".dll", ".so")):
-	                    # 直接使用文件名（去除路径部分）
-	                    base_filename = os.path.basename(filename)
-	                    target_path = os.path.join(output_dir, base_filename)
-	                    os.makedirs(os.path.dirname(target_path), exist_ok=True)
-	                    with zf.open(member) as source, open(target_path, 'wb') as dest:
-	                        dest.write(source.read())
+	        self._extract_natives_to(zip_path, output_dir)
 	        prints.prints("success", f"Extract ok: {zip_path}")
 	        return ["success", f"Extract ok: {zip_path}"]
 	    except FileNotFoundError as e:
@@ -185,96 +856,222 @@ class core:
 	    except Exception as e:
 	        prints.prints("error", e)
 	        return ["error", e]
+	def _extract_natives_to(self, zip_path, output_dir):
+	    """流式解压 jar 中的 .dylib/.dll/.so 到 output_dir，返回解压出的文件名列表"""
+	    names = []
+	    with zipfile.ZipFile(zip_path, "r") as zf:
+	        for member in zf.infolist():
+	            filename = member.filename
+	            # 严格匹配三种目标文件类型
+	            if filename.endswith((".dylib", ".dll", ".so")):
+	                # 直接使用文件名（去除路径部分）
+	                base_filename = os.path.basename(filename)
+	                target_path = os.path.join(output_dir, base_filename)
+	                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+	                with zf.open(member) as source, open(target_path, 'wb') as dest:
+	                    shutil.copyfileobj(source, dest, 1024 * 1024)
+	                names.append(base_filename)
+	    return names
+	def _extract_natives_cached(self, zip_path, cache_dir, sha1):
+	    """按 natives jar 的 sha1 解压到共享缓存，已解压过则直接返回缓存目录"""
+	    target = cache_dir / sha1
+	    if (target / ".files.json").exists():
+	        return target
+	    prints.prints("info", f"Extracting library: {zip_path} to {target}")
+	    tmp_dir = cache_dir / f"{sha1}.tmp-{os.getpid()}-{threading.get_ident()}"
+	    shutil.rmtree(tmp_dir, ignore_errors=True)
+	    try:
+	        names = self._extract_natives_to(zip_path, tmp_dir)
+	        os.makedirs(tmp_dir, exist_ok=True)
+	        with open(tmp_dir / ".files.json", "w", encoding="utf-8") as f:
+	            json.dump(names, f)
+	        try:
+	            os.replace(tmp_dir, target)
+	        except OSError:
+	            # 其他线程/进程已完成同一 jar 的解压，或残留了不完整的目录
+	            if not (target / ".files.json").exists():
+	                shutil.rmtree(target, ignore_errors=True)
+	                os.replace(tmp_dir, target)
+	    finally:
+	        # 解压失败或已由其他线程/进程完成时删除临时目录；成功改名后它已不存在
+	        shutil.rmtree(tmp_dir, ignore_errors=True)
+	    prints.prints("success", f"Extract ok: {zip_path}")
+	    return target
+	def _sweep_natives_staging(self, cache_dir, max_age=3600):
+	    """删除 natives 缓存中进程崩溃等情况残留的临时解压目录（超过 max_age 秒未修改的 <sha1>.tmp-*）"""
+	    now = time.time()
+	    try:
+	        entries = list(os.scandir(cache_dir))
+	    except OSError:
+	        return
+	    for entry in entries:
+	        try:
+	            if ".tmp-" in entry.name and entry.is_dir() and now - entry.stat().st_mtime > max_age:
+	                shutil.rmtree(entry.path, ignore_errors=True)
+	        except OSError:
+	            pass
+	def _library_allowed(self, lib, current_os):
+		"""按库的 rules 判断当前系统是否需要该库"""
+		for rule in lib.get("rules", []):
+			os_name = rule.get("os", {}).get("name", "")
+			if os_name:
+				if os_name == current_os:
+					return rule.get("action") != "disallow"
+				# 规则针对其他系统，跳过
+				if rule.get("action") == "allow":
+					return False
+		return True
+	def _touch_libraries_stamp(self, game_path):
+		"""libraries 目录内容变化后更新时间戳，使已缓存的启动计划失效"""
+		stamp = pathlib.Path(game_path) / "libraries" / ".install_stamp"
+		try:
+			os.makedirs(stamp.parent, exist_ok=True)
+			with open(stamp, "a"):
+				pass
+			os.utime(stamp)
+		except OSError as e:
+			prints.prints("warning", f"Failed to update {stamp}: {e}")
+	def _launch_plan_key(self, game_json_bytes):
+		try:
+			libraries_stamp = os.stat(pathlib.Path(self.game_path) / "libraries" / ".install_stamp").st_mtime_ns
+		except OSError:
+			libraries_stamp = None
+		return {
+			# 计划格式变化时递增，使旧格式的计划失效
+			"format": 2,
+			"version_sha1": hashlib.sha1(game_json_bytes).hexdigest(),
+			"os": self.system_type,
+			"arch": platform.machine(),
+			"game_path": os.path.abspath(self.game_path),
+			"libraries": libraries_stamp,
+		}
+	def _launch_plan(self, game_name):
+		"""解析版本JSON得到启动计划（类路径、natives目录、主类、资源索引、日志配置）
+
+		计划保存在 versions/<name>/launch_plan.json，以版本JSON的sha1、系统/架构与 libraries
+		时间戳为键；键不变且客户端JAR与日志配置仍在磁盘上时直接复用，跳过规则计算、库文件检查与日志配置下载。
+		"""
+		_game_version_path = pathlib.Path(self.game_path) / "versions" / game_name
+		game_json_path = _game_version_path / f"{game_name}.json"
+		plan_path = _game_version_path / "launch_plan.json"
+		try:
+			with open(game_json_path, "rb") as f:
+				game_json_bytes = f.read()
+		except OSError:
+			return ["error", f"Game profile json missing: {game_json_path}"]
+		key = self._launch_plan_key(game_json_bytes)
+		try:
+			with open(plan_path, "r", encoding="utf-8") as f:
+				plan = json.load(f)
+			if plan.get("key") == key and all(os.path.exists(path) for path in (plan.get("client_jar"), plan.get("log_config")) if path):
+				return ["success", plan]
+		except Exception:
+			pass
+		_game_json = json.loads(game_json_bytes)
+		complete = True
+		current_os = self.system_type
+		if current_os == "darwin":
+			current_os = "osx"
+		class_path_parts = []
+		for lib in _game_json.get("libraries", []):
+			if not self._library_allowed(lib, current_os):
+				continue
+			if "downloads" in lib and "artifact" in lib["downloads"]:
+				lib_path = pathlib.Path(self.game_path) / "libraries" / lib["downloads"]["artifact"]["path"]
+				if lib_path.exists():
+					class_path_parts.append(str(lib_path))
+				else:
+					prints.prints("warning", f"Library not found: {lib_path}")
+					complete = False
+		# 主游戏JAR不存在时尝试下载
+		main_jar = _game_version_path / f"{game_name}.jar"
+		if not main_jar.exists() and "downloads" in _game_json and "client" in _game_json["downloads"]:
+			client = _game_json["downloads"]["client"]
+			if download.main({client["url"]: {"save": main_jar, "size": client.get("size"), "sha1": client.get("sha1")}}, 1, True)[0][0] != "success":
+				complete = False
+		class_path_parts.append(str(main_jar))
+		# 日志配置（下载并按sha1校验）
+		log_config_path = None
+		log_file = (_game_json.get("logging", {}).get("client") or {}).get("file") or {}
+		if log_file.get("id") and log_file.get("url"):
+			log_config_path = _game_version_path / log_file["id"]
+			result = download.main({log_file["url"]: {"save": log_config_path, "size": log_file.get("size"), "sha1": log_file.get("sha1")}}, 1, True)[0]
+			if result[0] != "success":
+				return ["error", f"Failed to fetch logging config {log_config_path}: {result[1]}"]
+		plan = {
+			"key": key,
+			"classpath": class_path_parts,
+			"natives_dir": str(_game_version_path / f"{game_name}-natives"),
+			"main_class": _game_json["mainClass"],
+			"asset_index": _game_json["assetIndex"]["id"],
+			"log_config": str(log_config_path) if log_config_path is not None else None,
+			"client_jar": str(main_jar),
+			"assets": None,
+			"complete": complete,
+		}
+		# 库不完整时不缓存，安装补全后重新解析
+		if complete:
+			self._save_launch_plan(plan_path, plan)
+		return ["success", plan]
+	def _save_launch_plan(self, plan_path, plan):
+		try:
+			tmp_path = plan_path.with_suffix(".json.tmp")
+			with open(tmp_path, "w", encoding="utf-8") as f:
+				json.dump(plan, f)
+			os.replace(tmp_path, plan_path)
+		except OSError as e:
+			prints.prints("warning", f"Failed to save launch plan: {e}")
+	def _launch_layout(self, game_name, plan):
+		"""旧版本资源索引的目录布局（见 _materialize_assets），结果记在启动计划中
+
+		资源索引的 sha1 与上次布局时相同且目标目录仍存在时直接复用，不再逐个检查资源文件。
+		返回 {"layout", "path"}，layout 为 None 表示不需要布局；无法读取索引或布局失败时返回 None。
+		"""
+		game_path = pathlib.Path(self.game_path)
+		_game_version_path = game_path / "versions" / game_name
+		index_path = game_path / "assets" / "indexes" / f"{plan['asset_index']}.json"
+		try:
+			index_sha1 = download.get_sha1(index_path)
+		except OSError:
+			return None
+		cached = plan.get("assets")
+		if cached and cached["index_sha1"] == index_sha1 and (cached["layout"] is None or os.path.isdir(cached["path"])):
+			return cached
+		layout = self._materialize_assets(index_path, game_path, _game_version_path)
+		if layout[0] == "error":
+			return None
+		report = layout[1]
+		assets = {"index_sha1": index_sha1, "layout": report["layout"], "path": report["path"]}
+		# 缺少资源对象时不记录，下次启动重新布局
+		if not report["missing"]:
+			plan["assets"] = assets
+			if plan.get("complete"):
+				self._save_launch_plan(_game_version_path / "launch_plan.json", plan)
+		return assets
 	def runMC(self):
 	    game_name = input("version name:")
 	    _game_version_path = pathlib.Path(self.game_path) / "versions" / game_name
-	    print(findjava.main())
-	    java_path = findjava.main()[int(input("Select:"))][0]
-	    # 加载游戏JSON配置
-	    game_json_path = _game_version_path / f"{game_name}.json"
-	    with open(game_json_path, "r") as f:
-	        _game_json = json.load(f)
-	    
-	    # 1. 构建正确的类路径
-	    class_path_parts = []
-	    
-	    # 获取当前系统类型（处理Mac的特殊情况）
-	    current_os = self.system_type
-	    if current_os == "darwin":
-	        current_os = "osx"
-	    
-	    for lib in _game_json.get("libraries", []):
-	        # 处理库规则
-	        rules = lib.get("rules", [])
-	        include_lib = True
-	        
-	        if rules:
-	            for rule in rules:
-	                os_condition = rule.get("os", {})
-	                os_name = os_condition.get("name", "")
-	                
-	                if os_name:
-	                    # 检查规则是否匹配当前系统
-	                    if os_name == current_os:
-	                        if rule.get("action") == "disallow":
-	                            include_lib = False
-	                        break
-	                    else:
-	                        # 规则针对其他系统，跳过
-	                        if rule.get("action") == "allow":
-	                            include_lib = False
-	                        continue
-	        
-	        # 如果库应该包含且是普通库（非原生库）
-	        if include_lib and "natives" not in lib:
-	            if "downloads" in lib and "artifact" in lib["downloads"]:
-	                lib_path = pathlib.Path(self.game_path) / "libraries" / lib["downloads"]["artifact"]["path"]
-	                if lib_path.exists():
-	                    class_path_parts.append(str(lib_path))
-	                else:
-	                    prints.prints("warning", f"Library not found: {lib_path}")
-	    
-	    # 添加主游戏JAR
-	    main_jar = _game_version_path / f"{game_name}.jar"
-	    if not main_jar.exists():
-	        # 如果主JAR不存在，尝试下载
-	        if "downloads" in _game_json and "client" in _game_json["downloads"]:
-	            client_url = _game_json["downloads"]["client"]["url"]
-	            download.main({client_url: {"save": main_jar}}, 1, True)
-	    
-	    class_path_parts.append(str(main_jar))
-	    
-	    # 构建类路径字符串
+	    java_list = findjava.main()
+	    print(java_list)
+	    java_path = java_list[int(input("Select:"))][0]
+	    # 1-3. 类路径、日志配置与natives目录来自缓存的启动计划
+	    plan = self._launch_plan(game_name)
+	    if plan[0] == "error":
+	        return plan
+	    plan = plan[1]
 	    class_path_separator = ";" if os.name == "nt" else ":"
-	    class_path = class_path_separator.join(class_path_parts)
-		
-	    # 2. 下载日志配置文件
-	    log_config_path = None
-	    log_sha1 = None
-	    if "logging" in _game_json and "client" in _game_json["logging"]:
-	        log_file = _game_json["logging"]["client"]["file"]
-	        log_id = log_file["id"]
-	        log_url = log_file["url"]
-	        log_sha1 = log_file.get("sha1")
-	        log_config_path = _game_version_path / log_id
-	        
-	        # 确保目录存在
-	        os.makedirs(_game_version_path, exist_ok=True)
-	        
-	        # 下载日志配置
-	        if not os.path.exists(log_config_path):
-	            download.main({log_url: {"save": log_config_path}}, 1, True)
-	        # 校验日志配置（如果提供了sha1）
-	        if log_sha1 is not None:
-	            if download.get_sha1(log_config_path) != log_sha1:
-	                return ["error",f"The {log_config_path}'s SHA1 fails the check"]
-	    # 3. 准备natives目录
-	    natives_dir = _game_version_path / f"{game_name}-natives"
+	    class_path = class_path_separator.join(plan["classpath"])
+	    log_config_path = plan["log_config"]
+	    natives_dir = pathlib.Path(plan["natives_dir"])
 	    os.makedirs(natives_dir, exist_ok=True)
 	    
 	    # 4. 构建启动命令（使用安全的列表形式，不使用shell=True）
 	    assets_dir = pathlib.Path(self.game_path) / "assets" / "objects"
-	    asset_index_id = _game_json["assetIndex"]["id"]
+	    asset_index_id = plan["asset_index"]
+	    # 旧版本资源索引需要按文件名展开的目录结构
+	    layout = self._launch_layout(game_name, plan)
+	    if layout is not None and layout["layout"] == "virtual":
+	        assets_dir = pathlib.Path(layout["path"])
 	    classpath_file = _game_version_path / "classpath.txt"
 	    with open(classpath_file, "w", encoding="utf-8") as f:
 	    	f.write(class_path)
@@ -304,7 +1101,7 @@ class core:
 	        f"-Dio.netty.native.workdir={natives_dir}",
 	        "-cp",
 	        class_path,
-	        _game_json["mainClass"],
+	        plan["main_class"],
 	        "--version",
 	        game_name,
 	        "--gameDir",
@@ -342,60 +1139,23 @@ class core:
 	            java_path = found[0][0]
 	        else:
 	            java_path = "java"
-	    # Load JSON
-	    game_json_path = _game_version_path / f"{game_name}.json"
-	    if not game_json_path.exists():
-	        return ["error", f"Game profile json missing: {game_json_path}"]
-	    with open(game_json_path, "r") as f:
-	        _game_json = json.load(f)
-	    # Classpath
-	    class_path_parts = []
-	    current_os = self.system_type
-	    if current_os == "darwin":
-	        current_os = "osx"
-	    for lib in _game_json.get("libraries", []):
-	        rules = lib.get("rules", [])
-	        include_lib = True
-	        if rules:
-	            for rule in rules:
-	                os_condition = rule.get("os", {})
-	                os_name = os_condition.get("name", "")
-	                if os_name:
-	                    if os_name == current_os:
-	                        if rule.get("action") == "disallow":
-	                            include_lib = False
-	                        break
-	                    else:
-	                        if rule.get("action") == "allow":
-	                            include_lib = False
-	                        continue
-	        if include_lib and "downloads" in lib and "artifact" in lib["downloads"]:
-	            lib_path = pathlib.Path(self.game_path) / "libraries" / lib["downloads"]["artifact"]["path"]
-	            if lib_path.exists():
-	                class_path_parts.append(str(lib_path))
-	    main_jar = _game_version_path / f"{game_name}.jar"
-	    if not main_jar.exists() and "downloads" in _game_json and "client" in _game_json["downloads"]:
-	        client_url = _game_json["downloads"]["client"]["url"]
-	        download.main({client_url: {"save": main_jar}}, 1, True)
-	    class_path_parts.append(str(main_jar))
+	    # Classpath, logging config and natives dir come from the cached launch plan
+	    plan = self._launch_plan(game_name)
+	    if plan[0] == "error":
+	        return plan
+	    plan = plan[1]
 	    class_path_separator = ";" if os.name == "nt" else ":"
-	    class_path = class_path_separator.join(class_path_parts)
-	    # Logging config
-	    log_config_path = None
-	    if "logging" in _game_json and "client" in _game_json["logging"]:
-	        log_file = _game_json["logging"]["client"].get("file") or {}
-	        log_id = log_file.get("id")
-	        log_url = log_file.get("url")
-	        if log_id and log_url:
-	            log_config_path = _game_version_path / log_id
-	            if not os.path.exists(log_config_path):
-	                download.main({log_url: {"save": log_config_path}}, 1, True)
-	    # Natives dir
-	    natives_dir = _game_version_path / f"{game_name}-natives"
+	    class_path = class_path_separator.join(plan["classpath"])
+	    log_config_path = plan["log_config"]
+	    natives_dir = pathlib.Path(plan["natives_dir"])
 	    os.makedirs(natives_dir, exist_ok=True)
 	    # Build command
 	    assets_dir = pathlib.Path(self.game_path) / "assets"
-	    asset_index_id = _game_json["assetIndex"]["id"]
+	    asset_index_id = plan["asset_index"]
+	    # Legacy asset indexes need their objects laid out by file name
+	    layout = self._launch_layout(game_name, plan)
+	    if layout is not None and layout["layout"] == "virtual":
+	        assets_dir = pathlib.Path(layout["path"])
 	    command = [
 	        java_path,
 	        "-Xmx2G",
@@ -411,7 +1171,7 @@ class core:
 	        f"-Dio.netty.native.workdir={natives_dir}",
 	        "-cp",
 	        class_path,
-	        _game_json["mainClass"],
+	        plan["main_class"],
 	        "--version",
 	        game_name,
 	        "--gameDir",
@@ -1,75 +1,1554 @@
 import requests
 import prints
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 import os
+import errno
 import hashlib
+import shutil
+import json
 import time
+import heapq
+import queue
+import itertools
+import datetime
+import email.utils
 from config_loader import load_config
 import threading
-from requests.adapters import HTTPAdapter
+import urllib.parse
+from collections import deque
+from collections.abc import Mapping
+import mirrors
+import connections
+import store
 try:
     from urllib3.util.retry import Retry
 except Exception:
     Retry = None
 
+# 只在连接建立阶段快速重试；状态码与读取失败交给调用方的延迟重试与熔断器，避免嵌套重试占住线程
+_RETRY = Retry(total=None, connect=2, read=0, status=0, other=0, backoff_factor=0.2) if Retry is not None else 0
+
 _TOML_CONFIG = None
-_thread_local = threading.local()
+_VERIFY_INDEX = None
+_verify_index_lock = threading.Lock()
+
+
+# 计算 SHA1 时每次读取的字节数；hashlib 处理大块数据时释放 GIL，多个线程可以并行校验
+_HASH_CHUNK = 1024 * 1024
 
 
-def get_sha1(file_path):
-    """计算文件的SHA1哈希值"""
+def get_sha1(file_path, limiter=None):
+    """计算文件的SHA1哈希值；limiter 为 TokenBucket 时按其速率限制读盘"""
     #prints.prints("info",f"Verify SHA1 of {file_path}")
     sha1_hash = hashlib.sha1()
-    with open(file_path, 'rb') as f:
-        while chunk := f.read(4096):
-            sha1_hash.update(chunk)
+    buffer = bytearray(_HASH_CHUNK)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while n := f.readinto(buffer):
+            sha1_hash.update(view[:n])
+            if limiter is not None:
+                delay = limiter.reserve(n)
+                if delay > 0:
+                    time.sleep(delay)
     return sha1_hash.hexdigest()
 
-def _get_session(timeout):
-    sess = getattr(_thread_local, "session", None)
-    if sess is not None:
-        return sess
-    sess = requests.Session()
-    # Configure HTTPAdapter for connection pooling
-    adapter_kwargs = {"pool_connections": 50, "pool_maxsize": 100}
-    if Retry is not None:
-        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retry, **adapter_kwargs)
+class VerifyIndex:
+    """已校验文件索引：以 (路径, 大小, mtime_ns, inode) 记录最近一次校验通过的 SHA1"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except Exception:
+            self.entries = {}
+
+    @staticmethod
+    def _key(file_path):
+        return os.path.abspath(file_path)
+
+    @staticmethod
+    def _stamp(st):
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def lookup(self, file_path, st=None):
+        """文件状态未变化时返回记录的 SHA1，否则返回 None"""
+        try:
+            st = st or os.stat(file_path)
+        except OSError:
+            return None
+        with self.lock:
+            entry = self.entries.get(self._key(file_path))
+        if entry and entry[:3] == self._stamp(st):
+            return entry[3]
+        return None
+
+    def record(self, file_path, sha1, st=None):
+        try:
+            st = st or os.stat(file_path)
+        except OSError:
+            return
+        with self.lock:
+            self.entries[self._key(file_path)] = self._stamp(st) + [sha1]
+            self.dirty = True
+
+    def forget(self, file_path):
+        with self.lock:
+            if self.entries.pop(self._key(file_path), None) is not None:
+                self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.entries)
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            prints.prints("warning", f"Failed to save verify index {self.path}: {e}")
+
+
+# 没有订阅者取走时 started/finished 最多保留的条数，避免长队列下无限增长
+_EVENT_LIMIT = 1024
+
+
+class Progress:
+    """下载进度汇总与订阅
+
+    工作线程只在锁内更新计数器；后台线程按 interval 秒合并一次，向订阅者推送快照，
+    因此订阅者的耗时不会拖慢传输循环。快照字段：
+    files_total/files_done/files_failed/files_active, bytes_total/bytes_done/bytes_received,
+    rate（字节/秒，指数平滑）, eta（秒，按已知 size 估算）, retries, stalled（距最近收到数据的秒数）,
+    started/finished（自上次推送以来开始/结束的 URL，无人取走时只保留最近 _EVENT_LIMIT 条）。
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self._thread = None
+        self._jobs = {}
+        self._next_token = 0
+        self._reset()
+
+    def _reset(self):
+        self.files_total = self.files_done = self.files_failed = 0
+        self.bytes_total = self.bytes_done = self.bytes_received = 0
+        self.retries = 0
+        self.rate = 0.0
+        self.started = deque(maxlen=_EVENT_LIMIT)
+        self.finished = deque(maxlen=_EVENT_LIMIT)
+        self.first_start = self.last_start = self.last_finish = None
+        self.last_data = time.monotonic()
+        self._last_sample = (time.monotonic(), 0)
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers.append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._emit_loop, name="download-progress", daemon=True)
+                self._thread.start()
+        return callback
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def begin(self):
+        """新一批下载开始；上一批已全部结束时清零计数"""
+        with self.lock:
+            if not self._jobs and self.files_done + self.files_failed >= self.files_total:
+                self._reset()
+
+    def expect(self, size):
+        with self.lock:
+            self.files_total += 1
+            if size:
+                self.bytes_total += int(size)
+
+    def start(self, url, size):
+        with self.lock:
+            self._next_token += 1
+            self._jobs[self._next_token] = [size, 0]
+            self.started.append(url)
+            self.last_start = time.monotonic()
+            if self.first_start is None:
+                self.first_start = self.last_start
+            return self._next_token
+
+    def advance(self, token, n):
+        with self.lock:
+            self.bytes_received += n
+            self.last_data = time.monotonic()
+            job = self._jobs.get(token)
+            if job is not None:
+                job[1] += n
+
+    def seek(self, token, position):
+        """重置某个任务已完成的字节数（续传从 position 开始，或从头重来）"""
+        with self.lock:
+            job = self._jobs.get(token)
+            if job is not None:
+                job[1] = position
+
+    def retry(self, token):
+        with self.lock:
+            self.retries += 1
+
+    def finish(self, url, ok, token=None, size=None):
+        with self.lock:
+            job = self._jobs.pop(token, None)
+            if job is not None:
+                size = job[0] if job[0] is not None else job[1]
+            if ok:
+                self.files_done += 1
+                self.bytes_done += int(size or 0)
+            else:
+                self.files_failed += 1
+            self.finished.append([url, ok])
+            self.last_finish = time.monotonic()
+
+    def timing(self):
+        """本批下载的总耗时 makespan，以及最后一个任务开始后到全部结束的尾部耗时 tail（秒）
+
+        tail 期间已没有新任务可派发，空闲的工作线程只能等待尚未完成的大文件；按大小排序的目标就是缩短它。
+        """
+        with self.lock:
+            if self.first_start is None or self.last_finish is None:
+                return {"makespan": 0.0, "tail": 0.0}
+            return {
+                "makespan": max(0.0, self.last_finish - self.first_start),
+                "tail": max(0.0, self.last_finish - self.last_start),
+            }
+
+    def snapshot(self):
+        with self.lock:
+            now = time.monotonic()
+            last_time, last_received = self._last_sample
+            elapsed = now - last_time
+            if elapsed > 0:
+                current = (self.bytes_received - last_received) / elapsed
+                self.rate = current if not self.rate else 0.3 * current + 0.7 * self.rate
+                self._last_sample = (now, self.bytes_received)
+            bytes_done = self.bytes_done + sum(job[1] for job in self._jobs.values())
+            remaining = max(0, self.bytes_total - bytes_done)
+            snapshot = {
+                "files_total": self.files_total,
+                "files_done": self.files_done,
+                "files_failed": self.files_failed,
+                "files_active": len(self._jobs),
+                "bytes_total": self.bytes_total,
+                "bytes_done": bytes_done,
+                "bytes_received": self.bytes_received,
+                "rate": self.rate,
+                "eta": remaining / self.rate if self.rate > 0 else None,
+                "retries": self.retries,
+                "stalled": now - self.last_data if self._jobs else 0.0,
+                "started": list(self.started),
+                "finished": list(self.finished),
+            }
+            self.started.clear()
+            self.finished.clear()
+            return snapshot
+
+    def _emit_loop(self):
+        last_key = None
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                subscribers = list(self.subscribers)
+                key = (self.files_done, self.files_failed, self.bytes_received, len(self._jobs))
+            if not subscribers or (key == last_key and not key[3]):
+                continue
+            last_key = key
+            snapshot = self.snapshot()
+            for callback in subscribers:
+                try:
+                    callback(snapshot)
+                except Exception as e:
+                    prints.prints("warning", f"Progress subscriber failed: {e}")
+
+
+progress = Progress()
+
+
+class HostGate:
+    """单个主机的 AIMD 并发窗口
+
+    成功传输时窗口按 1/limit 加性增长；出错（含超时）时减半，且每秒最多减一次；
+    首字节延迟明显高于该主机观测到的最低延迟时视为拥塞，小幅收缩；
+    每个统计周期比较主机总吞吐，窗口变大而吞吐下降时退回上一周期的窗口。
+    """
+
+    PERIOD = 1.0
+
+    def __init__(self, host, ceiling, initial, adaptive=True, slots=None):
+        self.host = host
+        self.slots = slots
+        self.ceiling = max(1, ceiling)
+        self.limit = float(min(self.ceiling, max(1, initial))) if adaptive else float(self.ceiling)
+        self.adaptive = adaptive
+        self.active = 0
+        self.cond = threading.Condition()
+        self.latency = None
+        self.base_latency = None
+        self.last_decrease = 0.0
+        self.period_start = time.monotonic()
+        self.period_bytes = 0
+        self.throughput = 0.0
+        self.prev_period = (0.0, self.limit)
+        self.waiters = deque()
+
+    def try_acquire(self, waiter=None):
+        """不等待地占用一个窗口；窗口已满时返回 False
+
+        给出 waiter 时按先来先到排队：窗口空出时直接把窗口（及全局连接数）转交给它，再调用 waiter()，
+        此时调用方已经持有窗口，用完后 release()，不用时 give_back()。每空出一个窗口只唤醒一个 waiter。
+        """
+        with self.cond:
+            if self.active >= int(self.limit) or self.waiters:
+                if waiter is not None:
+                    self.waiters.append(waiter)
+                return False
+            # 全局连接数上限
+            if self.slots is not None and not self.slots.acquire(blocking=False, waiter=(self, waiter) if waiter is not None else None):
+                return False
+            self.active += 1
+            return True
+
+    def acquire(self):
+        with self.cond:
+            while self.active >= int(self.limit):
+                self.cond.wait()
+            self.active += 1
+        if self.slots is not None:
+            self.slots.acquire()
+
+    def release(self, ok, nbytes=0, ttfb=None):
+        self._free(True, ok, nbytes, ttfb)
+
+    def give_back(self):
+        """归还没有用来发请求的窗口（如被唤醒后不再需要），不计入 AIMD 统计"""
+        self._free(False)
+
+    def _free(self, adjust, ok=True, nbytes=0, ttfb=None):
+        with self.cond:
+            self.active -= 1
+            if adjust and self.adaptive:
+                self._adjust(ok, nbytes, ttfb)
+            self.cond.notify_all()
+            granted, slot_left = self._grant(True)
+        if slot_left and self.slots is not None:
+            self.slots.release()
+        # 在锁外调用，被唤醒方已经持有窗口
+        for waiter in granted:
+            waiter()
+
+    def _grant(self, own_slot):
+        """持有 cond 时调用：把空出的窗口按先来先到交给排队的 waiter，返回 (被授予的 waiter, own_slot 是否仍未转交)
+
+        own_slot 为 True 表示调用方手里有一个刚释放、可以直接转交的全局连接。
+        """
+        granted = []
+        while self.waiters and self.active < int(self.limit):
+            if own_slot:
+                own_slot = False
+            elif self.slots is not None and not self.slots.acquire(blocking=False, waiter=(self, self.waiters[0])):
+                # 全局连接数已满：队首改到全局队列排队，由其他主机释放连接时转交
+                self.waiters.popleft()
+                continue
+            self.active += 1
+            granted.append(self.waiters.popleft())
+        return granted, own_slot
+
+    def _adjust(self, ok, nbytes, ttfb):
+        now = time.monotonic()
+        self.period_bytes += nbytes
+        if now - self.period_start >= self.PERIOD:
+            throughput = self.period_bytes / (now - self.period_start)
+            prev_throughput, prev_limit = self.prev_period
+            if prev_limit < self.limit and throughput < 0.9 * prev_throughput:
+                # 窗口变大反而吞吐下降，退回
+                self.limit = prev_limit
+            self.prev_period = (throughput, self.limit)
+            self.throughput = throughput
+            self.period_start = now
+            self.period_bytes = 0
+        if not ok:
+            if now - self.last_decrease >= 1.0:
+                self.limit = max(1.0, self.limit / 2)
+                self.last_decrease = now
+                prints.prints("debug", f"Concurrency for {self.host} reduced to {int(self.limit)}")
+            return
+        if ttfb is not None:
+            self.latency = ttfb if self.latency is None else 0.2 * ttfb + 0.8 * self.latency
+            self.base_latency = ttfb if self.base_latency is None else min(self.base_latency, ttfb)
+            if self.latency > 3 * self.base_latency + 0.05 and now - self.last_decrease >= 1.0:
+                self.limit = max(1.0, self.limit * 0.85)
+                self.last_decrease = now
+                return
+        self.limit = min(float(self.ceiling), self.limit + 1.0 / self.limit)
+
+    def stats(self):
+        with self.cond:
+            return {
+                "limit": int(self.limit),
+                "active": self.active,
+                "throughput": self.throughput,
+                "latency": self.latency,
+            }
+
+
+class ConnectionSlots:
+    """所有主机共用的连接数上限
+
+    不等待的 acquire 失败时可以登记 (gate, waiter)，按先来先到排队；连接空出时直接转交给队首，
+    并同时为它占用 gate 的窗口后调用 waiter()（见 HostGate.try_acquire）。
+    """
+
+    def __init__(self, limit):
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.lock = threading.Lock()
+        self.waiters = deque()
+
+    def acquire(self, blocking=True, waiter=None):
+        if self.semaphore.acquire(blocking=blocking):
+            return True
+        with self.lock:
+            # 持锁再试一次：release 在登记之前发生时不会错过
+            if self.semaphore.acquire(blocking=False):
+                return True
+            if waiter is not None:
+                self.waiters.append(waiter)
+        return False
+
+    def release(self):
+        while True:
+            with self.lock:
+                if not self.waiters:
+                    self.semaphore.release()
+                    return
+                gate, waiter = self.waiters.popleft()
+            with gate.cond:
+                granted = gate.active < int(gate.limit)
+                if granted:
+                    gate.active += 1
+                else:
+                    # 该主机的窗口在排队期间已满，改为排在其窗口队列的最前面，连接交给下一个
+                    gate.waiters.appendleft(waiter)
+            if granted:
+                waiter()
+                return
+
+
+class ConcurrencyController:
+    """按主机维护 HostGate；download_threads 等配置值只作为并发上限
+
+    max_connections_per_host 进一步限制每个主机的窗口上限，max_connections 限制所有主机的连接总数（0 为不限制）。
+    """
+
+    def __init__(self, ceiling, initial=8, adaptive=True, per_host_cap=0, global_cap=0):
+        self.ceiling = min(ceiling, per_host_cap) if per_host_cap else ceiling
+        self.initial = initial
+        self.adaptive = adaptive
+        self.slots = ConnectionSlots(global_cap) if global_cap else None
+        self.gates = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, ceiling):
+        launcher = config["launcher"]
+        return cls(
+            ceiling,
+            launcher.get("download_initial_concurrency", 8),
+            launcher.get("adaptive_concurrency", True),
+            launcher.get("max_connections_per_host", 0),
+            launcher.get("max_connections", 0),
+        )
+
+    def gate(self, url):
+        host = urllib.parse.urlparse(url).netloc
+        with self.lock:
+            gate = self.gates.get(host)
+            if gate is None:
+                gate = self.gates[host] = HostGate(host, self.ceiling, self.initial, self.adaptive, self.slots)
+            return gate
+
+    def stats(self):
+        with self.lock:
+            gates = dict(self.gates)
+        return {host: gate.stats() for host, gate in gates.items()}
+
+
+_CONTROLLER = None
+
+
+def get_controller(config=None):
+    global _CONTROLLER
+    if _CONTROLLER is None:
+        with _verify_index_lock:
+            if _CONTROLLER is None:
+                config = config or _config()
+                _CONTROLLER = ConcurrencyController.from_config(config, config["launcher"]["download_threads"])
+    return _CONTROLLER
+
+
+class TokenBucket:
+    """令牌桶：rate 字节/秒，允许透支，透支部分由调用方按返回的等待时间补齐"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.burst = max(65536.0, self.rate / 4)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, n):
+        """取走 n 个令牌，返回需要等待的秒数"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= n
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class BandwidthLimiter:
+    """所有下载线程共享的带宽限制：全局与每主机两级令牌桶（0 为不限制）"""
+
+    def __init__(self, global_rate=0, host_rate=0):
+        self.global_bucket = TokenBucket(global_rate) if global_rate else None
+        self.host_rate = host_rate
+        self.host_buckets = {}
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.global_bucket is not None or bool(self.host_rate)
+
+    def reserve(self, url, n):
+        """记录 url 所在主机收到的 n 字节，返回需要等待的秒数"""
+        delay = 0.0
+        if self.global_bucket is not None:
+            delay = self.global_bucket.reserve(n)
+        if self.host_rate:
+            host = urllib.parse.urlparse(url).netloc
+            with self.lock:
+                bucket = self.host_buckets.get(host)
+                if bucket is None:
+                    bucket = self.host_buckets[host] = TokenBucket(self.host_rate)
+            delay = max(delay, bucket.reserve(n))
+        return delay
+
+    def throttle(self, url, n):
+        delay = self.reserve(url, n)
+        if delay > 0:
+            time.sleep(delay)
+
+
+_LIMITER = None
+
+
+def get_limiter(config=None):
+    global _LIMITER
+    if _LIMITER is None:
+        with _verify_index_lock:
+            if _LIMITER is None:
+                launcher = (config or _config())["launcher"]
+                _LIMITER = BandwidthLimiter(
+                    launcher.get("max_download_speed", 0),
+                    launcher.get("max_host_download_speed", 0),
+                )
+    return _LIMITER
+
+
+_STORE = None
+_store_loaded = False
+
+
+def get_store(config=None):
+    """launcher.shared_store 指定的共享内容仓库（见 store.ContentStore），未配置时返回 None"""
+    global _STORE, _store_loaded
+    if not _store_loaded:
+        with _verify_index_lock:
+            if not _store_loaded:
+                root = (config or _config())["launcher"].get("shared_store", "")
+                _STORE = store.ContentStore(root, VerifyIndex(os.path.join(root, "verified.json")), get_sha1) if root else None
+                _store_loaded = True
+    return _STORE
+
+
+def from_store(save_path, size, sha1, config):
+    """共享仓库中已有 sha1 对应的文件时直接放到 save_path，返回 True 表示无需下载
+
+    仓库在放置前校验 blob 的 SHA1；只有硬链接得到的 save_path 与校验过的 blob 是同一个文件，才计入校验索引。
+    """
+    shared = get_store(config)
+    if shared is None or sha1 is None:
+        return False
+    try:
+        method = shared.materialize(sha1, size, save_path)
+    except OSError as e:
+        prints.prints("warning", f"Failed to take {save_path} from the shared store: {e}")
+        return False
+    if method is None:
+        return False
+    if method == "hardlink":
+        get_verify_index(config).record(save_path, sha1)
     else:
-        adapter = HTTPAdapter(**adapter_kwargs)
-    sess.mount('http://', adapter)
-    sess.mount('https://', adapter)
-    _thread_local.session = sess
-    return sess
+        get_verify_index(config).forget(save_path)
+    return True
 
-def download(url, save_path, size, sha1, PassCheck, config):
-    max_retries = config["launcher"]["download_max_retries"]
-    timeout = config["launcher"]["download_time_out"]
 
-    # 预先存在校验
-    if os.path.exists(save_path) and PassCheck:
+def to_store(save_path, sha1, config):
+    """把下载并校验通过的文件收入共享仓库"""
+    shared = get_store(config)
+    if shared is None or sha1 is None:
+        return
+    try:
+        shared.add(save_path, sha1)
+    except OSError as e:
+        prints.prints("warning", f"Failed to add {save_path} to the shared store: {e}")
+        return
+    # save_path 可能已换成仓库中的 blob（内容同样校验过），按新的 inode 重新记录
+    get_verify_index(config).record(save_path, sha1)
+
+
+def save_indexes(config=None):
+    """保存校验索引与共享仓库的 blob 校验索引"""
+    get_verify_index(config).save()
+    shared = get_store(config)
+    if shared is not None:
+        shared.save()
+
+
+def drop_from_store(save_path, sha1, config):
+    """save_path 已损坏时，若它与仓库中的 blob 是同一个文件（硬链接），blob 一并作废"""
+    shared = get_store(config)
+    if shared is not None and sha1 is not None:
+        shared.discard(sha1, save_path)
+
+
+class GateFull(Exception):
+    """来源主机的并发窗口已满；已登记 waiter，窗口空出时由它重新提交本次尝试"""
+
+
+class HTTPStatusError(IOError):
+    """带状态码与 Retry-After（秒）的 HTTP 错误，用于区分主机故障与请求本身的问题"""
+
+    def __init__(self, url, status, retry_after=None):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Retry-After 可以是秒数或 HTTP 日期，返回需要等待的秒数，无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def is_server_failure(e):
+    """5xx/429、连接错误与超时视为主机故障，计入熔断器"""
+    if isinstance(e, HTTPStatusError):
+        return e.status >= 500 or e.status == 429
+    return isinstance(e, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError))
+
+
+def retry_delay(attempt, e=None):
+    """指数退避，最多10秒；服务器给出 Retry-After 时至少等待该时长"""
+    delay = min(2 ** attempt, 10)
+    retry_after = getattr(e, "retry_after", None)
+    return max(delay, retry_after) if retry_after is not None else delay
+
+
+class CircuitBreaker:
+    """单个主机的熔断器
+
+    连续 threshold 次主机故障后打开（响应带 Retry-After 时立即打开并按其时长冷却），
+    冷却期内不再向该主机发请求；冷却结束后只放行一个探测请求，成功则关闭，失败则以加倍的冷却时间重新打开。
+    """
+
+    def __init__(self, host, threshold=5, cooldown=5.0, max_cooldown=120.0):
+        self.host = host
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def wait_time(self):
+        """返回发请求前需要等待的秒数，0 表示可以立即发出"""
+        with self.lock:
+            if self.state == "closed":
+                return 0.0
+            now = time.monotonic()
+            if self.state == "open":
+                if now < self.open_until:
+                    return self.open_until - now
+                self.state = "half_open"
+                self.probing = False
+            if self.probing:
+                return 0.5
+            self.probing = True
+            return 0.0
+
+    def cancel_probe(self):
+        """wait_time() 放行的探测请求最终没有发出时调用，让之后的请求重新获得探测机会"""
+        with self.lock:
+            if self.state == "half_open":
+                self.probing = False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != "closed":
+                prints.prints("info", f"Host {self.host} recovered, resuming downloads")
+            self.state = "closed"
+            self.failures = 0
+            self.trips = 0
+            self.probing = False
+
+    def record_failure(self, retry_after=None):
+        with self.lock:
+            self.failures += 1
+            now = time.monotonic()
+            if self.state == "open":
+                # 冷却期内返回的其他失败请求只可能延长冷却
+                if retry_after is not None:
+                    self.open_until = max(self.open_until, now + min(retry_after, self.max_cooldown))
+                return
+            if self.state == "closed" and retry_after is None and self.failures < self.threshold:
+                return
+            if retry_after is None:
+                retry_after = self.cooldown * 2 ** self.trips
+            delay = min(retry_after, self.max_cooldown)
+            self.trips += 1
+            self.state = "open"
+            self.open_until = now + delay
+            self.probing = False
+        prints.prints("warning", f"Host {self.host} is failing, pausing requests for {delay:.1f}s")
+
+    def stats(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "trips": self.trips,
+                "retry_in": max(0.0, self.open_until - time.monotonic()) if self.state == "open" else 0.0,
+            }
+
+
+_BREAKERS = {}
+
+
+def get_breaker(url, config=None):
+    host = urllib.parse.urlparse(url).netloc
+    breaker = _BREAKERS.get(host)
+    if breaker is None:
+        with _verify_index_lock:
+            breaker = _BREAKERS.get(host)
+            if breaker is None:
+                launcher = (config or _config())["launcher"]
+                breaker = _BREAKERS[host] = CircuitBreaker(
+                    host,
+                    launcher.get("breaker_threshold", 5),
+                    launcher.get("breaker_cooldown", 5),
+                )
+    return breaker
+
+
+_MIRRORS = None
+
+
+def get_mirrors(config=None):
+    global _MIRRORS
+    if _MIRRORS is None:
+        with _verify_index_lock:
+            if _MIRRORS is None:
+                config = config or _config()
+                _MIRRORS = mirrors.MirrorSet(config["source_link"], config["launcher"].get("source_link_used"))
+    return _MIRRORS
+
+
+def rank_sources(url, size=None, config=None):
+    """url 在各镜像上的等价地址，按实时评分从快到慢排序（关闭 mirror_failover 时只有 url 本身）"""
+    config = config or _config()
+    if not config["launcher"].get("mirror_failover", True):
+        return [url]
+    mirror_set = get_mirrors(config)
+    return mirror_set.rank(mirror_set.candidates(url), size)
+
+
+def prewarm(urls, config=None):
+    """为 urls 在当前评分最高的镜像上预先建立连接（见 connections.prewarm）"""
+    config = config or _config()
+    return connections.prewarm([rank_sources(url, None, config)[0] for url in urls if url])
+
+
+def record_source(source, config, e=None, ttfb=None, nbytes=0, seconds=0.0):
+    """把一次请求的结果计入来源主机的熔断器与镜像评分"""
+    breaker = get_breaker(source, config)
+    if e is not None and is_server_failure(e):
+        breaker.record_failure(getattr(e, "retry_after", None))
+    else:
+        # 主机有响应（含 4xx、校验失败），熔断器视为正常
+        breaker.record_success()
+    get_mirrors(config).record(source, e is None, ttfb, nbytes, seconds)
+
+
+def _status_error(source, response):
+    return HTTPStatusError(source, response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+
+
+_HEDGE_EXECUTOR = None
+
+
+def _hedge_executor(config):
+    global _HEDGE_EXECUTOR
+    if _HEDGE_EXECUTOR is None:
+        with _verify_index_lock:
+            if _HEDGE_EXECUTOR is None:
+                _HEDGE_EXECUTOR = ThreadPoolExecutor(
+                    max_workers=2 * max(1, config["launcher"]["download_threads"]), thread_name_prefix="download-hedge"
+                )
+    return _HEDGE_EXECUTOR
+
+
+def _open_source(sources, headers, config, timeout, hedge=False, park=None, held=None):
+    """依次向 sources 发起流式请求，返回第一个成功的 (response, source, gate, ttfb)，返回时 gate 仍被占用
+
+    某个源请求失败或返回错误状态时立即换下一个源；hedge 为 True 时相邻两个源之间使用对冲请求（见 _open_hedged）。
+    全部失败时返回最后一个错误响应，或抛出最后一个异常。
+    held 为已经为 sources[0] 占用的 gate。给出 park 时不在 gate 上阻塞：窗口已满时以 park(gate) 返回的回调排队
+    并抛出 GateFull，窗口转交过来时回调被调用（见 HostGate.try_acquire）。
+    """
+    error = None
+    index = 0
+    while index < len(sources):
+        primary = sources[index]
+        if index == 0 and held is not None:
+            gate = held
+        else:
+            gate = get_controller(config).gate(primary)
+            if park is None:
+                gate.acquire()
+            elif not gate.try_acquire(park(gate)):
+                raise GateFull(primary)
+        if hedge and index + 1 < len(sources):
+            try:
+                result = _open_hedged(primary, sources[index + 1], gate, headers, config, timeout)
+            except Exception as e:
+                index += 2
+                error = e
+                continue
+            if result is None:
+                # primary 很快失败，下一轮直接请求 backup
+                index += 1
+                continue
+            index += 2
+        else:
+            index += 1
+            started = time.monotonic()
+            try:
+                response = _get_session(timeout).get(primary, timeout=timeout, stream=True, headers=headers)
+            except Exception as e:
+                gate.release(False)
+                record_source(primary, config, e)
+                error = e
+                continue
+            result = (response, primary, gate, time.monotonic() - started)
+        status = result[0].status_code
+        # 416 与 .part 的状态有关，交给调用方处理
+        if status < 400 or status == 416 or index >= len(sources):
+            return result
+        _discard_response(*result, config)
+    raise error
+
+
+def _open_hedged(primary, backup, gate, headers, config, timeout):
+    """向 primary 发起请求；其首字节延迟分位数内没有返回响应头时，再向 backup 发起对冲请求
+
+    使用先返回的成功响应，另一个请求在返回后关闭；两个都失败时返回第一个错误响应或抛出最后一个异常。
+    primary 在对冲之前就已失败时释放其 gate 并返回 None，由调用方改用 backup。
+    对冲请求只在 backup 有空闲窗口时发出，持有一个 gate 时从不阻塞等待另一个，避免互相等待。
+    """
+    launcher = config["launcher"]
+    delay = get_mirrors(config).hedge_delay(primary, launcher.get("hedge_percentile", 95), launcher.get("hedge_min_delay", 0.25))
+    executor = _hedge_executor(config)
+
+    def request(source):
+        started = time.monotonic()
+        response = _get_session(timeout).get(source, timeout=timeout, stream=True, headers=headers)
+        return response, time.monotonic() - started
+
+    futures = {executor.submit(request, primary): primary}
+    gates = {primary: gate}
+    done, _ = wait(futures, timeout=delay)
+    if done:
+        future = next(iter(done))
+        if _succeeded(future):
+            response, ttfb = future.result()
+            return response, primary, gate, ttfb
+        _discard_hedge(future, primary, gate, config)
+        return None
+    backup_gate = get_controller(config).gate(backup)
+    if backup_gate.try_acquire():
+        gates[backup] = backup_gate
+        futures[executor.submit(request, backup)] = backup
+        prints.prints("debug", f"Hedging {primary} with {backup} after {delay:.2f}s")
+
+    winner = None
+    fallback = None
+    error = None
+    pending = set(futures)
+    while pending and winner is None:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            source = futures[future]
+            try:
+                response, ttfb = future.result()
+            except Exception as e:
+                gates.pop(source).release(False)
+                record_source(source, config, e)
+                error = e
+                continue
+            if response.status_code < 400:
+                winner = (response, source, gates.pop(source), ttfb)
+            elif fallback is None:
+                fallback = (response, source, gates.pop(source), ttfb)
+            else:
+                _discard_response(response, source, gates.pop(source), ttfb, config)
+    for future in pending:
+        source = futures[future]
+        future.add_done_callback(lambda f, source=source, gate=gates.pop(source): _discard_hedge(f, source, gate, config))
+    if winner is not None:
+        if fallback is not None:
+            _discard_response(*fallback, config)
+        return winner
+    if fallback is not None:
+        return fallback
+    raise error
+
+
+def _succeeded(future):
+    return future.exception() is None and future.result()[0].status_code < 400
+
+
+def _discard_response(response, source, gate, ttfb, config):
+    """关闭落选或出错的响应并释放其 gate；参数顺序与 _open_source 返回的元组一致，首字节延迟同样计入评分"""
+    response.close()
+    status = response.status_code
+    gate.release(status < 400 or (status < 500 and status != 429), 0, ttfb)
+    record_source(source, config, _status_error(source, response) if status >= 400 else None, ttfb)
+
+
+def _discard_hedge(future, source, gate, config):
+    try:
+        response, ttfb = future.result()
+    except Exception as e:
+        gate.release(False)
+        record_source(source, config, e)
+        return
+    _discard_response(response, source, gate, ttfb, config)
+
+
+def get_verify_index(config=None):
+    global _VERIFY_INDEX
+    if _VERIFY_INDEX is not None:
+        return _VERIFY_INDEX
+    with _verify_index_lock:
+        if _VERIFY_INDEX is None:
+            config = config or load_config()
+            cache_path = config["launcher"].get("cache_path", "cache/")
+            _VERIFY_INDEX = VerifyIndex(os.path.join(cache_path, "verified.json"))
+    return _VERIFY_INDEX
+
+
+def _get_session(timeout):
+    # 各线程的 Session 共用 connections 模块中的进程级连接池
+    return connections.get_session("download", _RETRY)
+
+
+def load_part(part_path, url, size, sha1, source=None):
+    """读取 .part 续传状态，返回 (已下载字节数, 已含这些字节的 hasher, If-Range 校验值)
+
+    source 为本次请求的镜像地址；与 .part 来自不同镜像时不使用 If-Range，只依靠 SHA1 端到端校验。
+    """
+    meta_path = part_path + ".meta"
+    meta = {}
+    offset = 0
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("url") == url and meta.get("size") == size and meta.get("sha1") == sha1:
+            offset = os.path.getsize(part_path)
+    except Exception:
+        meta = {}
+    etag = meta.get("etag")
+    # 弱 ETag 不能用于 If-Range
+    validator = etag if etag and not etag.startswith("W/") else meta.get("last_modified")
+    if source is not None and meta.get("source", url) != source:
+        validator = None
+    # 既无校验值也无 SHA1 时无法确认续传内容一致，放弃续传
+    if (size is not None and offset > int(size)) or (not validator and sha1 is None):
+        offset = 0
+    hasher = hashlib.sha1() if sha1 else None
+    if offset and hasher:
+        try:
+            with open(part_path, "rb") as f:
+                remaining = offset
+                while remaining and (chunk := f.read(min(remaining, 1024 * 1024))):
+                    hasher.update(chunk)
+                    remaining -= len(chunk)
+        except OSError:
+            offset = 0
+            hasher = hashlib.sha1()
+    # 预分配的 .part 在进程被强制结束时保持完整长度，尾部可能是未写入的空洞，只有整体校验通过才能沿用
+    if meta.get("preallocated") and size is not None and offset >= int(size) and (hasher is None or hasher.hexdigest() != sha1):
+        offset = 0
+        hasher = hashlib.sha1() if sha1 else None
+    return offset, hasher, validator
+
+
+def save_part_meta(part_path, url, size, sha1, headers, source=None, preallocated=False):
+    try:
+        with open(part_path + ".meta", "w", encoding="utf-8") as f:
+            json.dump({
+                "url": url,
+                "source": source or url,
+                "size": size,
+                "sha1": sha1,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "preallocated": preallocated,
+            }, f)
+    except Exception:
+        pass
+
+
+def should_preallocate(size, config):
+    return size is not None and int(size) >= config["launcher"].get("preallocate_min_size", 1048576)
+
+
+def preallocate(f, size):
+    """为文件预留 size 字节：优先 posix_fallocate（真正分配磁盘块，空间不足时立即失败），文件系统不支持时只扩展长度"""
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise
+    f.truncate(size)
+
+
+def open_part(part_path, offset, size, config):
+    """打开 .part 准备从 offset 处顺序写入；从头下载且大小已知的大文件先预分配空间"""
+    if offset:
+        return open(part_path, "ab")
+    f = open(part_path, "wb")
+    if should_preallocate(size, config):
+        try:
+            preallocate(f, int(size))
+        except BaseException:
+            f.close()
+            raise
+    return f
+
+
+def close_part(f):
+    """关闭 .part；预分配后传输中断、未写满时截断到实际写入的位置，续传偏移仍由文件长度决定"""
+    try:
+        position = f.tell()
+        if os.fstat(f.fileno()).st_size > position:
+            f.truncate(position)
+    finally:
+        f.close()
+
+
+def range_headers(offset, validator):
+    if not offset:
+        return None
+    headers = {"Range": f"bytes={offset}-"}
+    if validator:
+        headers["If-Range"] = validator
+    return headers
+
+
+def is_resumed(status_code, headers, offset):
+    """响应是否是从 offset 开始的 206 分段"""
+    if status_code != 206:
+        return False
+    content_range = headers.get("Content-Range", "")
+    return content_range.startswith(f"bytes {offset}-")
+
+
+def discard_part(part_path):
+    for path in (part_path, part_path + ".meta"):
         try:
-            if (size is None or os.path.getsize(save_path) == size) and (sha1 is None or get_sha1(save_path) == sha1):
-                return ["success", f"Download complete: {url}"]
+            os.remove(path)
         except Exception:
-            # 如果读取失败，则继续重新下载
             pass
 
-    for attempt in range(max_retries + 1):
+
+def commit_part(part_path, save_path):
+    os.replace(part_path, save_path)
+    try:
+        os.remove(part_path + ".meta")
+    except Exception:
+        pass
+
+
+def missing_bytes(url_list):
+    """url_list 中尚需下载的字节数：目标文件不存在或大小不符的任务的 size 之和（已有的 .part 部分不重复计算）"""
+    total = 0
+    for _, info in iter_jobs(url_list):
+        size = info.get("size")
+        if not size:
+            continue
+        try:
+            if os.path.getsize(info["save"]) == int(size):
+                continue
+        except OSError:
+            pass
+        try:
+            total += int(size) - os.path.getsize(f"{info['save']}.part")
+        except OSError:
+            total += int(size)
+    return max(0, total)
+
+
+def check_free_space(path, required, config=None):
+    """磁盘空间预检：path 所在分区的可用空间至少为 required 字节再加 disk_reserve 余量"""
+    config = config or _config()
+    reserve = config["launcher"].get("disk_reserve", 268435456)
+    probe = os.path.abspath(path)
+    while not os.path.exists(probe) and os.path.dirname(probe) != probe:
+        probe = os.path.dirname(probe)
+    try:
+        free = shutil.disk_usage(probe).free
+    except OSError as e:
+        prints.prints("warning", f"Unable to check free space on {probe}: {e}")
+        return ["success", "Free space unknown"]
+    if required + reserve > free:
+        return ["error", f"Not enough disk space on {probe}: {required / 1048576:.1f} MiB needed (+{reserve / 1048576:.0f} MiB reserve), {free / 1048576:.1f} MiB free"]
+    return ["success", f"{free / 1048576:.1f} MiB free, {required / 1048576:.1f} MiB needed"]
+
+
+def link_file(src, dst):
+    """把 src 放到 dst：优先硬链接，其次符号链接，最后复制；dst 已是同一文件时不做任何事"""
+    try:
+        if os.path.samefile(src, dst):
+            return
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp_path = f"{dst}.link-{os.getpid()}-{threading.get_ident()}"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(src), tmp_path)
+        except OSError:
+            shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+def check_existing(save_path, size, sha1, deep_verify, verify_index):
+    """已存在的文件是否与期望的大小/SHA1 一致（文件状态未变化时直接采用索引中的 SHA1，deep_verify 强制重新计算）"""
+    try:
+        st = os.stat(save_path)
+        if size is None or st.st_size == size:
+            if sha1 is None:
+                return True
+            if not deep_verify and verify_index.lookup(save_path, st) == sha1:
+                return True
+            if get_sha1(save_path) == sha1:
+                verify_index.record(save_path, sha1, st)
+                return True
+        verify_index.forget(save_path)
+    except Exception:
+        # 如果读取失败，则继续重新下载
+        pass
+    return False
+
+
+def verify_file(url, info, deep_verify=True, verify_index=None, limiter=None):
+    """校验单个文件，返回报告条目
+
+    status: ok / missing / size（大小不符）/ sha1（内容损坏）/ error（无法读取）；
+    hashed 为本次实际读取计算的字节数（通过索引跳过时为 0）。
+    """
+    save_path, size, sha1 = info.get("save"), info.get("size"), info.get("sha1")
+    entry = {"url": url, "path": str(save_path), "size": size, "sha1": sha1, "status": "ok", "hashed": 0}
+    try:
+        st = os.stat(save_path)
+    except FileNotFoundError:
+        entry["status"] = "missing"
+        return entry
+    except OSError as e:
+        entry["status"], entry["error"] = "error", str(e)
+        return entry
+    if size is not None and st.st_size != int(size):
+        entry["status"], entry["actual"] = "size", st.st_size
+    elif sha1 is not None and (deep_verify or verify_index is None or verify_index.lookup(save_path, st) != sha1):
+        try:
+            actual = get_sha1(save_path, limiter)
+        except OSError as e:
+            entry["status"], entry["error"] = "error", str(e)
+            return entry
+        entry["hashed"] = st.st_size
+        if actual != sha1:
+            entry["status"], entry["actual"] = "sha1", actual
+        elif verify_index is not None:
+            verify_index.record(save_path, sha1, st)
+    if entry["status"] != "ok" and verify_index is not None:
+        verify_index.forget(save_path)
+    return entry
+
+
+def iter_verify(url_list, threads=None, deep_verify=True, config=None):
+    """在线程池中并行校验 url_list 中的文件，按完成顺序逐个产出 verify_file() 的报告条目
+
+    同时在途的任务不超过 4 * threads 个；verify_read_speed（字节/秒，0 为不限制）限制所有线程合计的读盘速度。
+    """
+    config = config or _config()
+    threads = threads or config["launcher"].get("verify_threads", 0) or os.cpu_count() or 4
+    rate = config["launcher"].get("verify_read_speed", 0)
+    limiter = TokenBucket(rate) if rate else None
+    verify_index = get_verify_index(config)
+    jobs = order_jobs(url_list, threads, config)
+    pending = set()
+    try:
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="verify") as executor:
+            for url, info in jobs:
+                pending.add(executor.submit(verify_file, url, info, deep_verify, verify_index, limiter))
+                if len(pending) >= 4 * threads:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            for future in as_completed(pending):
+                yield future.result()
+    finally:
+        verify_index.save()
+
+
+def _split_ranges(total, count):
+    """把 [0, total) 均分为最多 count 段，每段不小于 1 MiB"""
+    count = max(1, min(count, total // (1024 * 1024)))
+    step = -(-total // count)
+    return [[start, min(start + step, total) - 1] for start in range(0, total, step)]
+
+
+def _fetch_segment(url, part_path, segment, validator, config, gate, token=None):
+    """下载 [start, end] 分段写入预分配文件，gate 为已经为本段占用的窗口，结束时释放
+
+    失败时不在本线程等待重试，直接抛出，由调用方回退到单流下载（其重试由调度器延迟执行）。
+    """
+    timeout = config["launcher"]["download_time_out"]
+    start, end = segment
+    pos = start
+    ok = False
+    ttfb = None
+    try:
+        headers = {"Range": f"bytes={pos}-{end}"}
+        if validator:
+            headers["If-Range"] = validator
+        session = _get_session(timeout)
+        limiter = get_limiter(config)
+        started = time.monotonic()
+        with session.get(url, timeout=timeout, stream=True, headers=headers) as response:
+            ttfb = time.monotonic() - started
+            if response.status_code >= 400:
+                raise HTTPStatusError(url, response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+            if not is_resumed(response.status_code, response.headers, pos):
+                raise IOError(f"server ignored range {pos}-{end}")
+            with open(part_path, "r+b") as f:
+                f.seek(pos)
+                for chunk in response.iter_content(chunk_size=65536):
+                    if not chunk:
+                        continue
+                    chunk = chunk[:end + 1 - pos]
+                    f.write(chunk)
+                    pos += len(chunk)
+                    progress.advance(token, len(chunk))
+                    limiter.throttle(url, len(chunk))
+                    if pos > end:
+                        break
+        if pos <= end:
+            raise IOError(f"segment {start}-{end} ended at {pos}")
+        ok = True
+    except Exception as e:
+        if is_server_failure(e):
+            get_breaker(url, config).record_failure(getattr(e, "retry_after", None))
+        raise
+    finally:
+        gate.release(ok, pos - start, ttfb)
+
+
+def _take_windows(gate, count):
+    """不等待地在 gate 上最多占用 count 个窗口，返回占用的个数"""
+    taken = 0
+    while taken < count and gate.try_acquire():
+        taken += 1
+    return taken
+
+
+def download_segmented(url, save_path, size, sha1, config, token=None):
+    """已知大小不小于 segment_threshold 且服务器支持 Range 时，分 N 段并行下载到预分配文件
+
+    大小未知时不分段，避免为每个小文件多发一次 HEAD 请求。不适用时返回 None，由调用方回退到单流下载。
+    """
+    threshold = config["launcher"].get("segment_threshold", 0)
+    count = config["launcher"].get("segment_count", 1)
+    if not threshold or count < 2 or size is None or int(size) < threshold:
+        return None
+    timeout = config["launcher"]["download_time_out"]
+    part_path = f"{save_path}.part"
+    try:
+        session = _get_session(timeout)
+        head = session.head(url, timeout=timeout, allow_redirects=True)
+        head.raise_for_status()
+        total = int(head.headers.get("Content-Length", -1))
+        if head.headers.get("Accept-Ranges", "").lower() != "bytes" or total < threshold:
+            return None
+        if total != int(size):
+            return None
+        etag = head.headers.get("ETag")
+        validator = etag if etag and not etag.startswith("W/") else head.headers.get("Last-Modified")
+        final_url = head.url
+
+        # 分段数不超过主机当前空闲的窗口数，分段线程不在 gate 上等待；空闲窗口不足两个时直接单流下载
+        gate = get_controller(config).gate(final_url)
+        taken = _take_windows(gate, count)
+        segments = _split_ranges(total, taken) if taken >= 2 else []
+        for _ in range(taken - len(segments)):
+            gate.give_back()
+        if not segments:
+            return None
+        prints.prints("debug", f"Downloading: {final_url} to {save_path} Size: {total} ({len(segments)} segments)")
         try:
-            # 确保保存目录存在
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
+            discard_part(part_path)
+            with open(part_path, "wb") as f:
+                preallocate(f, total)
+        except BaseException:
+            for _ in segments:
+                gate.give_back()
+            raise
+        with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+            futures = [executor.submit(_fetch_segment, final_url, part_path, seg, validator, config, gate, token) for seg in segments]
+            for future in as_completed(futures):
+                future.result()
+
+        if sha1 is not None:
+            calculated_sha1 = get_sha1(part_path)
+            if calculated_sha1 != sha1:
+                prints.prints("warning", f"SHA1 mismatch for {url}: expected {sha1}, got {calculated_sha1}")
+                discard_part(part_path)
+                progress.seek(token, 0)
+                return ["error", f"sha1 mismatch: {url}"]
+        commit_part(part_path, save_path)
+        if sha1 is not None:
+            get_verify_index(config).record(save_path, sha1)
+            to_store(save_path, sha1, config)
+        return ["success", f"Download complete: {url}"]
+    except Exception as e:
+        prints.prints("warning", f"Segmented download failed, falling back to a single stream: {url} - {e}")
+        discard_part(part_path)
+        progress.seek(token, 0)
+        return ["error", f"Segmented download failed: {url} - {e}"]
+
+
+def download(url, save_path, size, sha1, PassCheck, config, deep_verify=False):
+    # 预先存在校验
+    if PassCheck and os.path.exists(save_path) and check_existing(save_path, size, sha1, deep_verify, get_verify_index(config)):
+        progress.finish(url, True, size=size)
+        return ["success", f"Download complete: {url}"]
+    if from_store(save_path, size, sha1, config):
+        progress.finish(url, True, size=size)
+        return ["success", f"Download complete: {url}"]
+
+    token = progress.start(url, size)
+    result = ["error", f"Max retries exceeded: {url}"]
+    try:
+        result = _download(url, save_path, size, sha1, config, token)
+    finally:
+        progress.finish(url, result[0] == "success", token)
+    return result
+
+
+def _download(url, save_path, size, sha1, config, token):
+    """同步下载：两次尝试之间在当前线程等待，供直接调用 download() 的场景使用"""
+    result = _download_segmented_first(url, save_path, size, sha1, config, token)
+    if result is not None:
+        return result
+    attempt = 0
+    while True:
+        kind, value = _run_attempt(url, save_path, size, sha1, config, token, attempt)
+        if kind == "done":
+            return value
+        if kind == "retry":
+            attempt += 1
+        time.sleep(value)
+
+
+def _download_segmented_first(url, save_path, size, sha1, config, token):
+    """大文件先从评分最高的镜像尝试分段并行下载，不适用或失败时返回 None 由调用方回退到单流下载
+
+    已有可续传的 .part 或该镜像处于熔断状态时直接跳过。
+    """
+    source = rank_sources(url, size, config)[0]
+    if os.path.exists(f"{save_path}.part.meta") or get_breaker(source, config).state != "closed":
+        return None
+    result = download_segmented(source, save_path, size, sha1, config, token)
+    if result is not None and result[0] == "success":
+        return ["success", f"Download complete: {url}"]
+    return None
+
+
+def pick_sources(url, size, config):
+    """为一次尝试选择镜像，返回 (sources, 需要等待的秒数)
+
+    按镜像评分排序，熔断中的镜像被跳过；排在第一个的镜像失败时同一次尝试内依次切换到其余镜像。
+    所有镜像都在熔断中时 sources 为 None。
+    """
+    ranked = rank_sources(url, size, config)
+    wait_for = None
+    for source in ranked:
+        delay = get_breaker(source, config).wait_time()
+        if delay == 0:
+            others = [other for other in ranked if other != source and get_breaker(other, config).state == "closed"]
+            return [source] + others, 0.0
+        wait_for = delay if wait_for is None else min(wait_for, delay)
+    return None, wait_for
+
+
+def _run_attempt(url, save_path, size, sha1, config, token, attempt, park=None, held=None):
+    """执行一次下载尝试，不在当前线程等待
+
+    返回 ("done", 结果)、("retry", 秒数)（消耗一次重试）、("wait", 秒数)（所有镜像都在熔断中，不计入重试次数）
+    或 ("gated", None)（来源主机的并发窗口已满，不计入重试次数）。
+    给出 park 时先在第一个来源的 gate 上占用窗口，之后才读取 .part 等；窗口已满时以 park(gate) 的回调排队（见 _open_source）。
+    held 为排队后转交过来的 gate，本次的第一个来源不在该主机上时归还。
+    """
+    sources, wait_for = pick_sources(url, size, config)
+    if sources is None:
+        if held is not None:
+            held.give_back()
+        return "wait", wait_for
+    gate = None
+    if park is not None:
+        gate = get_controller(config).gate(sources[0])
+        if held is not gate:
+            if held is not None:
+                held.give_back()
+            if not gate.try_acquire(park(gate)):
+                # 请求没有发出，pick_sources 放行的熔断探测留给之后的请求
+                get_breaker(sources[0], config).cancel_probe()
+                return "gated", None
+    max_retries = config["launcher"]["download_max_retries"]
+    try:
+        result = _attempt(url, save_path, size, sha1, config, token, attempt, sources, park, gate)
+    except GateFull:
+        return "gated", None
+    except Exception as e:
+        if attempt >= max_retries:
+            prints.prints("error", f"Download failed after {max_retries} attempts: {url} - {e}")
+            return "done", ["error", f"Max retries exceeded: {url} - {e}"]
+        if "timed out" in str(e):
+            error_type = "Timed out"
+        else:
+            error_type = "Error"
+        prints.prints("warning", f"{error_type}, retrying... (Attempt {attempt + 1}/{max_retries}) - {e}")
+        progress.retry(token)
+        return "retry", retry_delay(attempt, e)
+    return "done", result
+
+
+def _attempt(url, save_path, size, sha1, config, token, attempt, sources=None, park=None, held=None):
+    """从 sources（默认只有 url）执行一次传输，失败时抛出异常，由 _run_attempt 决定是否重试
 
-            # 流式下载并在写入时校验哈希
-            hasher = hashlib.sha1() if sha1 else None
-            bytes_written = 0
+    结果计入实际使用的镜像的熔断器与评分；内容始终按 url 对应的 size/sha1 校验。
+    park/held 见 _open_source；held 在没有发出请求时归还。
+    """
+    timeout = config["launcher"]["download_time_out"]
+    verify_index = get_verify_index(config)
+    part_path = f"{save_path}.part"
+    sources = sources or [url]
+    source = sources[0]
+
+    try:
+        # 确保保存目录存在
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+
+        # 从 .part 文件续传：已有字节重新计入哈希，保证端到端校验
+        offset, hasher, validator = load_part(part_path, url, size, sha1, source)
+        bytes_written = offset
+        progress.seek(token, offset)
+        if size is not None and offset >= int(size):
+            if held is not None:
+                held, gate = None, held
+                gate.give_back()
+            return _finish_part(url, save_path, part_path, size, sha1, bytes_written, hasher, verify_index, config)
+    except BaseException:
+        if held is not None:
+            held.give_back()
+        raise
 
-            session = _get_session(timeout)
-            with session.get(url, timeout=timeout, stream=True) as response:
-                response.raise_for_status()
-                prints.prints("info", f"Downloading: {url} to {save_path} Size: {size} (Attempt {attempt + 1})")
+    # 只有从头下载时才发对冲请求；续传到其他镜像时不带 If-Range，依靠 SHA1 校验
+    hedge = offset == 0 and config["launcher"].get("mirror_hedging", True)
+    started = time.monotonic()
+    response, source, gate, ttfb = _open_source(sources, range_headers(offset, validator), config, timeout, hedge, park, held)
+    limiter = get_limiter(config)
+    healthy = False
+    try:
+        try:
+            with response:
+                # 4xx（429 除外）是请求本身的问题，不作为拥塞信号
+                healthy = 400 <= response.status_code < 500 and response.status_code != 429
+                if response.status_code == 416:
+                    discard_part(part_path)
+                    raise IOError("range not satisfiable")
+                if response.status_code >= 400:
+                    raise _status_error(source, response)
+                if offset and not is_resumed(response.status_code, response.headers, offset):
+                    # 服务器未按 Range 返回（或文件已变化），从头开始
+                    offset = bytes_written = 0
+                    hasher = hashlib.sha1() if sha1 else None
+                    progress.seek(token, 0)
+                if offset:
+                    prints.prints("debug", f"Resuming: {source} to {save_path} from {offset} Size: {size} (Attempt {attempt + 1})")
+                else:
+                    save_part_meta(part_path, url, size, sha1, response.headers, source, should_preallocate(size, config))
+                    prints.prints("debug", f"Downloading: {source} to {save_path} Size: {size} (Attempt {attempt + 1})")
 
-                with open(save_path, "wb") as f:
+                f = open_part(part_path, offset, size, config)
+                try:
                     for chunk in response.iter_content(chunk_size=65536):
                         if not chunk:
                             continue
@@ -77,69 +1556,442 @@ def download(url, save_path, size, sha1, PassCheck, config):
                         bytes_written += len(chunk)
                         if hasher:
                             hasher.update(chunk)
+                        progress.advance(token, len(chunk))
+                        limiter.throttle(source, len(chunk))
+                finally:
+                    close_part(f)
+            healthy = True
+        finally:
+            gate.release(healthy, bytes_written - offset, ttfb)
+        result = _finish_part(url, save_path, part_path, size, sha1, bytes_written, hasher, verify_index, config)
+    except Exception as e:
+        record_source(source, config, e)
+        raise
+    record_source(source, config, None, ttfb, bytes_written - offset, time.monotonic() - started)
+    return result
+
+
+def _finish_part(url, save_path, part_path, size, sha1, bytes_written, hasher, verify_index, config=None):
+    """校验 .part 的大小与 SHA1 后替换为目标文件"""
+    # 大小校验（如果提供）
+    if size is not None and bytes_written != int(size):
+        prints.prints("warning", f"Size mismatch for {url}: expected {size}, got {bytes_written}")
+        discard_part(part_path)
+        raise IOError("size mismatch")
+
+    # 哈希校验（如果提供）
+    if sha1 is not None:
+        calculated_sha1 = hasher.hexdigest()
+        if calculated_sha1 != sha1:
+            prints.prints("warning", f"SHA1 mismatch for {url}: expected {sha1}, got {calculated_sha1}")
+            discard_part(part_path)
+            raise IOError("sha1 mismatch")
+
+    commit_part(part_path, save_path)
+    if sha1 is not None:
+        verify_index.record(save_path, sha1)
+        to_store(save_path, sha1, config)
+
+    return ["success", f"Download complete: {url}"]
+
+
+def main(url_list, threads=1, PassCheck=False, deep_verify=None, on_result=None):
+    """下载 url_list 中的文件
+
+    url_list 可以是 {url: info} 字典，也可以是产出 (url, info) 的迭代器/生成器；后者按需读取，
+    同时在途的任务不超过 download_window 个。默认返回结果列表（按完成顺序）；
+    给出 on_result(url, result) 时逐个回调，不再收集结果，返回 None。
+    """
+    results = [] if on_result is None else None
+    toml_config = _config()
+    if deep_verify is None:
+        deep_verify = toml_config["launcher"].get("deep_verify", False)
+    count = len(url_list) if isinstance(url_list, Mapping) else None
+    if count == 0:
+        return results
+
+    # 自动调整线程数
+    if count and toml_config["launcher"]["auto_set_thread"] and threads > count:
+        threads = count
+
+    def collect(url, result):
+        if on_result is None:
+            results.append(result)
+        else:
+            on_result(url, result)
+
+    # asyncio 后端（需要 aiohttp，不可用时回退到线程池）
+    if toml_config["launcher"].get("download_backend", "thread") == "asyncio":
+        import download_async
+        if download_async.aiohttp is not None:
+            concurrency = toml_config["launcher"].get("download_async_concurrency", threads)
+            if count and toml_config["launcher"]["auto_set_thread"]:
+                concurrency = min(concurrency, count)
+            download_async.main(order_jobs(url_list, concurrency, toml_config), concurrency, PassCheck, deep_verify, toml_config, collect)
+            report_timing()
+            return results
+        prints.prints("warning", "aiohttp is not installed, falling back to the thread download backend")
+
+    for url, result in iter_download(order_jobs(url_list, threads, toml_config), threads, PassCheck, deep_verify):
+        collect(url, result)
+    report_timing()
+    return results
+
+
+def report_timing():
+    """记录本批下载的总耗时与尾部耗时"""
+    timing = progress.timing()
+    if timing["makespan"] > 0:
+        prints.prints("info", f"Downloads finished in {timing['makespan']:.2f}s (tail {timing['tail']:.2f}s after the last job started)")
+    return timing
+
+
+def window_size(config, concurrency):
+    """同时在途的任务数上限：download_window，为 0 时取并发数的 4 倍"""
+    return config["launcher"].get("download_window", 0) or 4 * max(1, concurrency)
+
+
+def iter_jobs(url_list):
+    """把 {url: info} 字典或 (url, info) 的可迭代对象统一为 (url, info) 迭代器"""
+    return iter(url_list.items() if isinstance(url_list, Mapping) else url_list)
+
+
+def _job_size(job):
+    try:
+        return int(job[1].get("size") or 0)
+    except (TypeError, ValueError):
+        return 0
+
 
-            # 大小校验（如果提供）
-            if size is not None and bytes_written != int(size):
-                prints.prints("warning", f"Size mismatch for {url}: expected {size}, got {bytes_written}")
+def _lpt_order(batch, workers):
+    """最长任务优先（LPT）：大文件按大小从大到小排在最前，每个大文件后穿插若干小文件
+
+    穿插的数量使全部大文件都落在第一轮派发的 workers 个任务之内，大文件尽早开始，
+    其余工作线程同时处理受延迟限制的小文件；剩余小文件同样按从大到小的顺序排在后面。
+    """
+    batch.sort(key=_job_size, reverse=True)
+    sizes = [_job_size(job) for job in batch]
+    total = sum(sizes)
+    if not total:
+        return batch
+    # 大于平均份额 1/workers 的十分之一视为大文件
+    threshold = max(1, total // (10 * max(1, workers)))
+    heavy = sum(1 for size in sizes if size >= threshold)
+    if heavy in (0, len(batch)):
+        return batch
+    per_heavy = max(1, workers // heavy - 1)
+    light = batch[heavy:]
+    ordered = []
+    taken = 0
+    for job in batch[:heavy]:
+        ordered.append(job)
+        ordered.extend(light[taken:taken + per_heavy])
+        taken += per_heavy
+    ordered.extend(light[taken:])
+    return ordered
+
+
+def order_jobs(url_list, workers, config=None):
+    """按文件大小重排下载任务，缩短最后只剩少数大文件在下载的尾部时间
+
+    字典整体排序；迭代器每次读取 ordering_lookahead 个任务分批排序，内存占用仍然有界。
+    size_ordering 为 false 时保持原顺序。
+    """
+    config = config or _config()
+    if not config["launcher"].get("size_ordering", True):
+        return iter_jobs(url_list)
+    if isinstance(url_list, Mapping):
+        return iter(_lpt_order(list(url_list.items()), workers))
+    lookahead = config["launcher"].get("ordering_lookahead", 4096)
+    return _ordered_batches(iter(url_list), workers, lookahead)
+
+
+def _ordered_batches(jobs, workers, lookahead):
+    while True:
+        batch = list(itertools.islice(jobs, max(1, lookahead)))
+        if not batch:
+            return
+        yield from _lpt_order(batch, workers)
+
+
+def iter_download(url_list, threads=1, PassCheck=False, deep_verify=None):
+    """按完成顺序逐个产出 (url, 结果)
+
+    只在有空位时才从 url_list 读取下一个任务，同时在途的任务不超过 download_window 个，
+    内存占用与任务总数无关。提前关闭生成器时不再提交新任务，等待已在途的任务结束。
+    """
+    config = _config()
+    if deep_verify is None:
+        deep_verify = config["launcher"].get("deep_verify", False)
+    window = window_size(config, threads)
+    jobs = iter_jobs(url_list)
+    completed = queue.SimpleQueue()
+    in_flight = 0
+    exhausted = False
+    with Scheduler(threads, config) as scheduler:
+        while True:
+            while not exhausted and in_flight < window:
                 try:
-                    os.remove(save_path)
-                except Exception:
-                    pass
-                raise IOError("size mismatch")
-
-            # 哈希校验（如果提供）
-            if sha1 is not None:
-                calculated_sha1 = hasher.hexdigest()
-                if calculated_sha1 != sha1:
-                    prints.prints("warning", f"SHA1 mismatch for {url}: expected {sha1}, got {calculated_sha1}")
-                    try:
-                        os.remove(save_path)
-                    except Exception:
-                        pass
-                    raise IOError("sha1 mismatch")
-
-            return ["success", f"Download complete: {url}"]
-        
-        except Exception as e:
-            if attempt == max_retries:
-                prints.prints("error", f"Download failed after {max_retries} attempts: {url} - {e}")
-                return ["error", f"Max retries exceeded: {url} - {e}"]
+                    url, info = next(jobs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                scheduler.fetch(url, info, PassCheck, deep_verify).add_done_callback(
+                    lambda f, url=url: completed.put((url, f))
+                )
+                in_flight += 1
+            if not in_flight:
+                break
+            url, future = completed.get()
+            in_flight -= 1
+            if future.exception() is not None:
+                yield url, ["error", f"{url} - {future.exception()}"]
             else:
-                if "timed out" in str(e):
-                    error_type = "Timed out"
-                else:
-                    error_type = "Error"
-                prints.prints("warning", f"{error_type}, retrying... (Attempt {attempt + 1}/{max_retries}) - {e}")
-                # 指数退避，最多等待10秒
-                time.sleep(min(2 ** attempt, 10))
-    
-    # 不会执行到这里，但保留返回语句以防万一
-    return ["error", f"Max retries exceeded: {url}"]
+                yield url, future.result()
+        scheduler.join()
 
 
-def main(url_list, threads=1, PassCheck=False):
-    results = []
+def _config():
     global _TOML_CONFIG
     if _TOML_CONFIG is None:
         _TOML_CONFIG = load_config()
-    toml_config = _TOML_CONFIG
+    return _TOML_CONFIG
 
-    # 自动调整线程数
-    if toml_config["launcher"]["auto_set_thread"] and threads > len(url_list):
-        threads = len(url_list)
-    
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        futures = []
-        for i in url_list:
-            futures.append(
-                executor.submit(
-                    download, i, url_list[i].get("save"), url_list[i].get("size"),
-                    url_list[i].get("sha1"), PassCheck, toml_config
-                )
-            )
-        
-        for future in as_completed(futures):
-            result = future.result()
-            results.append(result)
-    
-    return results
+
+# Scheduler 任务优先级：数值越小越先执行
+CRITICAL = 0
+NORMAL = 1
+BACKGROUND = 2
+
+
+class Scheduler:
+    """共享线程池上的依赖感知任务图
+
+    task()/fetch() 返回 Future；after 中的 Future 全部完成后任务才会提交到线程池，
+    运行中的任务也可以继续添加新任务，join() 会等待全部任务（含动态添加的）结束。
+    fetch() 的失败重试放入延迟队列，到期后重新提交，等待期间不占用工作线程。
+    就绪的任务按 priority（CRITICAL/NORMAL/BACKGROUND）排队，空闲的工作线程总是先取优先级最高的任务。
+    """
+
+    def __init__(self, threads, config=None):
+        self.config = config or _config()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, threads))
+        progress.begin()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._delayed = []
+        self._ready = []
+        self._ready_lock = threading.Lock()
+        self._seq = itertools.count()
+        self._timer = None
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _track(self):
+        future = Future()
+        with self._idle:
+            self._pending += 1
+        future.add_done_callback(self._untrack)
+        return future
+
+    def _untrack(self, _):
+        with self._idle:
+            self._pending -= 1
+            self._idle.notify_all()
+
+    def _submit(self, fn, priority=NORMAL):
+        # 每提交一次线程池就放入一个就绪任务；工作线程运行时才决定取哪一个
+        with self._ready_lock:
+            heapq.heappush(self._ready, (priority, next(self._seq), fn))
+        self.executor.submit(self._run_next)
+
+    def _run_next(self):
+        with self._ready_lock:
+            fn = heapq.heappop(self._ready)[2]
+        fn()
+
+    def _when_ready(self, after, fn, priority=NORMAL):
+        deps = [dep for dep in after if dep is not None]
+        remaining = [len(deps)]
+        lock = threading.Lock()
+
+        def on_dep_done(_):
+            with lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                self._submit(fn, priority)
+
+        if not deps:
+            self._submit(fn, priority)
+        for dep in deps:
+            dep.add_done_callback(on_dep_done)
+
+    def defer(self, delay, fn, priority=NORMAL):
+        """delay 秒后把 fn 按 priority 提交到线程池"""
+        with self._idle:
+            heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), fn, priority))
+            if self._timer is None:
+                self._timer = threading.Thread(target=self._timer_loop, name="download-retry", daemon=True)
+                self._timer.start()
+            self._idle.notify_all()
+
+    def _timer_loop(self):
+        with self._idle:
+            while not self._closed:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, _, fn, priority = heapq.heappop(self._delayed)
+                    self._submit(fn, priority)
+                self._idle.wait(self._delayed[0][0] - now if self._delayed else None)
+
+    def task(self, fn, *args, after=(), priority=NORMAL):
+        future = self._track()
+
+        def run():
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+        self._when_ready(after, run, priority)
+        return future
+
+    def fetch(self, url, info, PassCheck=True, deep_verify=False, after=(), priority=NORMAL):
+        """提交一个下载任务，info 与 download.main 的 url_list 值格式相同
+
+        与 download() 结果相同；Future 在最终成功或放弃重试后才完成。
+        """
+        progress.expect(info.get("size"))
+        save_path, size, sha1 = info.get("save"), info.get("size"), info.get("sha1")
+        future = self._track()
+        state = {"token": None, "attempt": 0, "held": None}
+
+        def done(result):
+            progress.finish(url, result[0] == "success", state["token"])
+            future.set_result(result)
+
+        def park(gate):
+            def granted():
+                # 由其他线程的 release 调用，此时已经持有 gate 的窗口
+                state["held"] = gate
+                try:
+                    self._submit(step, priority)
+                except RuntimeError:
+                    # 任务图已关闭
+                    state["held"] = None
+                    gate.give_back()
+            return granted
+
+        def step():
+            try:
+                if state["token"] is None:
+                    if not future.set_running_or_notify_cancel():
+                        return
+                    # 预先存在校验
+                    if (PassCheck and os.path.exists(save_path) and check_existing(save_path, size, sha1, deep_verify, get_verify_index(self.config))) \
+                            or from_store(save_path, size, sha1, self.config):
+                        progress.finish(url, True, size=size)
+                        future.set_result(["success", f"Download complete: {url}"])
+                        return
+                    state["token"] = progress.start(url, size)
+                    result = _download_segmented_first(url, save_path, size, sha1, self.config, state["token"])
+                    if result is not None:
+                        done(result)
+                        return
+                held, state["held"] = state["held"], None
+                kind, value = _run_attempt(url, save_path, size, sha1, self.config, state["token"], state["attempt"], park, held)
+                if kind == "done":
+                    done(value)
+                    return
+                if kind == "gated":
+                    # 主机窗口已满：不占用工作线程，窗口转交过来时由 park 的回调重新提交
+                    return
+                if kind == "retry":
+                    state["attempt"] += 1
+                self.defer(value, step, priority)
+            except BaseException as e:
+                if state["token"] is not None:
+                    progress.finish(url, False, state["token"])
+                future.set_exception(e)
+
+        self._when_ready(after, step, priority)
+        return future
+
+    def feed(self, url_list, window, PassCheck=True, deep_verify=False, priority=NORMAL, on_result=None):
+        """逐步把 url_list 中的任务提交为 fetch()，同时在途的不超过 window 个，每完成一个补充一个
+
+        url_list 格式同 download.main，只在有空位时才读取下一个任务；on_result(url, 结果) 在每个任务完成时调用。
+        返回的 Future 在全部任务完成后完成，join() 同样会等待；读取第一个任务就出错时直接抛出异常。
+        """
+        future = self._track()
+        jobs = iter_jobs(url_list)
+        lock = threading.Lock()
+        state = {"in_flight": 0, "exhausted": False, "pumping": False, "again": False, "error": None}
+
+        def on_done(url, job):
+            if on_result is not None:
+                on_result(url, ["error", f"{url} - {job.exception()}"] if job.exception() is not None else job.result())
+            with lock:
+                state["in_flight"] -= 1
+            pump()
+
+        def pump():
+            # 已完成的任务的回调可能在 fetch() 返回前就在当前线程执行，用 again 代替递归
+            with lock:
+                if state["pumping"]:
+                    state["again"] = True
+                    return
+                state["pumping"] = True
+            while True:
+                submit = []
+                with lock:
+                    while not state["exhausted"] and state["in_flight"] < window:
+                        try:
+                            submit.append(next(jobs))
+                        except StopIteration:
+                            state["exhausted"] = True
+                        except Exception as e:
+                            state["exhausted"] = True
+                            state["error"] = e
+                        else:
+                            state["in_flight"] += 1
+                for url, info in submit:
+                    self.fetch(url, info, PassCheck, deep_verify, priority=priority).add_done_callback(
+                        lambda job, url=url: on_done(url, job)
+                    )
+                with lock:
+                    if state["again"]:
+                        state["again"] = False
+                        continue
+                    state["pumping"] = False
+                    finished = state["exhausted"] and not state["in_flight"] and not future.done()
+                    if finished:
+                        if state["error"] is not None:
+                            future.set_exception(state["error"])
+                        else:
+                            future.set_result(None)
+                return
+
+        pump()
+        if future.done() and future.exception() is not None:
+            raise future.exception()
+        return future
+
+    def join(self):
+        with self._idle:
+            while self._pending:
+                self._idle.wait()
+        save_indexes(self.config)
+
+    def close(self):
+        with self._idle:
+            self._closed = True
+            self._idle.notify_all()
+        self.executor.shutdown(wait=True)
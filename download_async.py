@@ -0,0 +1,297 @@
+import asyncio
+import atexit
+import hashlib
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import prints
+import download
+
+try:
+    import aiohttp
+except Exception:
+    aiohttp = None
+
+# 写盘与哈希批量交给执行器，缓冲超过该大小时才提交一次
+_FLUSH_SIZE = 1024 * 1024
+
+_LOOP = None
+_SESSION = None
+_lock = threading.Lock()
+
+
+def _get_loop():
+    """进程内唯一的事件循环，在后台线程中运行；各次 main() 调用共用它及其上的 ClientSession 与连接"""
+    global _LOOP
+    if _LOOP is None:
+        with _lock:
+            if _LOOP is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="download-async", daemon=True).start()
+                _LOOP = loop
+                atexit.register(_shutdown)
+    return _LOOP
+
+
+def _get_session(config):
+    """只在事件循环线程中调用；每个请求单独指定超时，连接总数受 max_connections 限制（0 为不限制）"""
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        connector = aiohttp.TCPConnector(limit=config["launcher"].get("max_connections", 0))
+        _SESSION = aiohttp.ClientSession(connector=connector)
+    return _SESSION
+
+
+def _shutdown():
+    # 进程退出前关闭 ClientSession 的连接并停止事件循环
+    try:
+        if _SESSION is not None:
+            asyncio.run_coroutine_threadsafe(_SESSION.close(), _LOOP).result(5)
+    except Exception:
+        pass
+    _LOOP.call_soon_threadsafe(_LOOP.stop)
+
+
+def _write_chunks(f, hasher, chunks):
+    for chunk in chunks:
+        f.write(chunk)
+        if hasher:
+            hasher.update(chunk)
+
+
+def _makedirs(save_path):
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+
+
+def _granted(future, gate):
+    # 窗口已经转交过来；等待方已取消时归还
+    if future.done():
+        gate.give_back()
+    else:
+        future.set_result(None)
+
+
+async def _acquire(gate):
+    """占用 gate 的一个窗口；窗口已满时挂起排队，直到某次 release 把窗口转交过来（release 可能来自其他线程）"""
+    loop = asyncio.get_running_loop()
+    woken = loop.create_future()
+
+    def waiter():
+        try:
+            loop.call_soon_threadsafe(_granted, woken, gate)
+        except RuntimeError:
+            # 事件循环已经关闭
+            gate.give_back()
+
+    if gate.try_acquire(waiter):
+        return
+    await woken
+
+
+async def _download(session, semaphore, controller, executor, url, save_path, size, sha1, PassCheck, config, deep_verify):
+    loop = asyncio.get_running_loop()
+    verify_index = download.get_verify_index(config)
+
+    # 预先存在校验
+    if PassCheck and os.path.exists(save_path):
+        ok = await loop.run_in_executor(
+            executor, download.check_existing, save_path, size, sha1, deep_verify, verify_index
+        )
+        if ok:
+            download.progress.finish(url, True, size=size)
+            return ["success", f"Download complete: {url}"]
+    if await loop.run_in_executor(executor, download.from_store, save_path, size, sha1, config):
+        download.progress.finish(url, True, size=size)
+        return ["success", f"Download complete: {url}"]
+
+    token = download.progress.start(url, size)
+    result = ["error", f"Max retries exceeded: {url}"]
+    try:
+        result = await _transfer(session, semaphore, controller, executor, url, save_path, size, sha1, config, token)
+    finally:
+        download.progress.finish(url, result[0] == "success", token)
+    return result
+
+
+async def _transfer(session, semaphore, controller, executor, url, save_path, size, sha1, config, token):
+    loop = asyncio.get_running_loop()
+    max_retries = config["launcher"]["download_max_retries"]
+    verify_index = download.get_verify_index(config)
+    limiter = download.get_limiter(config)
+    timeout = config["launcher"]["download_time_out"]
+    client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+
+    part_path = f"{save_path}.part"
+    attempt = 0
+    failed_source = None
+    while True:
+        # 按镜像评分选择来源；所有镜像都在熔断中时挂起等待，不计入重试次数（见 download.pick_sources）
+        sources, wait = download.pick_sources(url, size, config)
+        if sources is None:
+            await asyncio.sleep(wait)
+            continue
+        # 上一次失败的镜像让给下一个镜像；pick_sources 放行给它的熔断探测随之取消
+        source = sources[0]
+        if source == failed_source and len(sources) > 1:
+            download.get_breaker(source, config).cancel_probe()
+            source = sources[1]
+        started = loop.time()
+        ttfb = None
+        fetched = 0
+        try:
+            await loop.run_in_executor(executor, _makedirs, save_path)
+            # 从 .part 文件续传（见 download.load_part）
+            offset, hasher, validator = await loop.run_in_executor(
+                executor, download.load_part, part_path, url, size, sha1, source
+            )
+            bytes_written = offset
+            download.progress.seek(token, offset)
+            if size is None or offset < int(size):
+                async with semaphore:
+                    # 按主机的自适应并发窗口（见 download.HostGate）
+                    gate = controller.gate(source)
+                    await _acquire(gate)
+                    healthy = False
+                    started = loop.time()
+                    try:
+                        headers = download.range_headers(offset, validator)
+                        async with session.get(source, headers=headers, timeout=client_timeout) as response:
+                            ttfb = loop.time() - started
+                            healthy = 400 <= response.status < 500 and response.status != 429
+                            if response.status == 416:
+                                await loop.run_in_executor(executor, download.discard_part, part_path)
+                                raise IOError("range not satisfiable")
+                            if response.status >= 400:
+                                raise download.HTTPStatusError(
+                                    source, response.status, download.parse_retry_after(response.headers.get("Retry-After"))
+                                )
+                            if offset and not download.is_resumed(response.status, response.headers, offset):
+                                offset = bytes_written = 0
+                                hasher = hashlib.sha1() if sha1 else None
+                                download.progress.seek(token, 0)
+                            if offset:
+                                prints.prints("debug", f"Resuming: {source} to {save_path} from {offset} Size: {size} (Attempt {attempt + 1})")
+                            else:
+                                await loop.run_in_executor(
+                                    executor, download.save_part_meta, part_path, url, size, sha1, response.headers, source,
+                                    download.should_preallocate(size, config)
+                                )
+                                prints.prints("debug", f"Downloading: {source} to {save_path} Size: {size} (Attempt {attempt + 1})")
+                            f = await loop.run_in_executor(executor, download.open_part, part_path, offset, size, config)
+                            try:
+                                pending = []
+                                pending_size = 0
+                                async for chunk in response.content.iter_chunked(65536):
+                                    pending.append(chunk)
+                                    pending_size += len(chunk)
+                                    bytes_written += len(chunk)
+                                    download.progress.advance(token, len(chunk))
+                                    delay = limiter.reserve(source, len(chunk))
+                                    if delay > 0:
+                                        await asyncio.sleep(delay)
+                                    if pending_size >= _FLUSH_SIZE:
+                                        await loop.run_in_executor(executor, _write_chunks, f, hasher, pending)
+                                        pending = []
+                                        pending_size = 0
+                                if pending:
+                                    await loop.run_in_executor(executor, _write_chunks, f, hasher, pending)
+                            finally:
+                                await loop.run_in_executor(executor, download.close_part, f)
+                        healthy = True
+                    finally:
+                        fetched = bytes_written - offset
+                        gate.release(healthy, fetched, ttfb)
+
+            # 大小校验（如果提供）
+            if size is not None and bytes_written != int(size):
+                prints.prints("warning", f"Size mismatch for {url}: expected {size}, got {bytes_written}")
+                await loop.run_in_executor(executor, download.discard_part, part_path)
+                raise IOError("size mismatch")
+
+            # 哈希校验（如果提供）
+            if sha1 is not None:
+                calculated_sha1 = hasher.hexdigest()
+                if calculated_sha1 != sha1:
+                    prints.prints("warning", f"SHA1 mismatch for {url}: expected {sha1}, got {calculated_sha1}")
+                    await loop.run_in_executor(executor, download.discard_part, part_path)
+                    raise IOError("sha1 mismatch")
+
+            await loop.run_in_executor(executor, download.commit_part, part_path, save_path)
+            if sha1 is not None:
+                await loop.run_in_executor(executor, verify_index.record, save_path, sha1)
+                await loop.run_in_executor(executor, download.to_store, save_path, sha1, config)
+
+            download.record_source(source, config, None, ttfb, fetched, loop.time() - started)
+            return ["success", f"Download complete: {url}"]
+
+        except Exception as e:
+            # aiohttp 的连接错误同样计入熔断器
+            failure = ConnectionError(str(e)) if isinstance(e, aiohttp.ClientConnectionError) else e
+            download.record_source(source, config, failure)
+            failed_source = source
+            if attempt >= max_retries:
+                prints.prints("error", f"Download failed after {max_retries} attempts: {url} - {e}")
+                return ["error", f"Max retries exceeded: {url} - {e}"]
+            if isinstance(e, asyncio.TimeoutError) or "timed out" in str(e):
+                error_type = "Timed out"
+            else:
+                error_type = "Error"
+            prints.prints("warning", f"{error_type}, retrying... (Attempt {attempt + 1}/{max_retries}) - {e}")
+            download.progress.retry(token)
+            # 指数退避（至少等待 Retry-After）；等待期间不占用任何线程
+            await asyncio.sleep(download.retry_delay(attempt, e))
+            attempt += 1
+
+
+async def _main(url_list, threads, PassCheck, deep_verify, config, on_result):
+    session = _get_session(config)
+    semaphore = asyncio.Semaphore(threads)
+    controller = download.ConcurrencyController.from_config(config, threads)
+    executor = ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) + 4))
+    window = download.window_size(config, threads)
+    jobs = download.iter_jobs(url_list)
+    # 只在有空位时才读取下一个任务（见 download.iter_download）
+    in_flight = {}
+    try:
+        while True:
+            for url, info in itertools.islice(jobs, window - len(in_flight)):
+                download.progress.expect(info.get("size"))
+                task = asyncio.ensure_future(_download(
+                    session, semaphore, controller, executor, url, info.get("save"), info.get("size"),
+                    info.get("sha1"), PassCheck, config, deep_verify
+                ))
+                in_flight[task] = url
+            if not in_flight:
+                break
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                on_result(in_flight.pop(task), task.result())
+    finally:
+        # 调用方放弃等待时取消本次的其余任务；共用的 session 保持打开
+        for task in in_flight:
+            task.cancel()
+        if in_flight:
+            await asyncio.wait(in_flight)
+        executor.shutdown(wait=False)
+
+
+def main(url_list, threads=1, PassCheck=False, deep_verify=False, config=None, on_result=None):
+    """与 download.main 相同的约定：在共用的事件循环上以有界并发下载 url_list，返回前等待本次的任务全部结束"""
+    if aiohttp is None:
+        raise RuntimeError("aiohttp is required for the asyncio download backend")
+    config = config or download.load_config()
+    results = [] if on_result is None else None
+    download.progress.begin()
+    future = asyncio.run_coroutine_threadsafe(_main(
+        url_list, max(1, threads), PassCheck, deep_verify, config,
+        on_result or (lambda url, result: results.append(result))
+    ), _get_loop())
+    try:
+        future.result()
+    except BaseException:
+        future.cancel()
+        raise
+    download.save_indexes(config)
+    return results
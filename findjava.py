@@ -1,8 +1,10 @@
 import os
+import json
 import subprocess
 import re
 import platform
 import sys
+from concurrent.futures import ThreadPoolExecutor
 if platform.system() == "Windows":
 	import winreg  # 新增注册表模块
 
@@ -104,15 +106,101 @@ def get_java_info(java_path):
     except (subprocess.TimeoutExpired, OSError, subprocess.SubprocessError):
         return None
 
+def get_java_info_from_release(java_path):
+    """从 JDK/JRE 根目录的 release 文件读取版本和架构，无需启动 JVM"""
+    java_home = os.path.dirname(os.path.dirname(os.path.realpath(java_path)))
+    try:
+        with open(os.path.join(java_home, 'release'), 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+    except OSError:
+        return None
+    version_match = re.search(r'^JAVA_VERSION="?([^"\n]+)"?', content, re.M)
+    arch_match = re.search(r'^OS_ARCH="?([^"\n]+)"?', content, re.M)
+    if not version_match or not arch_match:
+        return None
+    arch = arch_match.group(1)
+    # 与 get_java_info 的输出保持一致（macOS 下 get_java_info 直接使用 os.arch）
+    if platform.system() != 'Darwin':
+        arch = _RELEASE_ARCH.get(arch, arch)
+    return [java_path, version_match.group(1), arch]
+
+
+_RELEASE_ARCH = {'amd64': 'x86_64', 'i386': 'x86', 'i586': 'x86', 'i686': 'x86', 'aarch64': 'arm64'}
+
+
+def _cache_file():
+    try:
+        from config_loader import load_config
+        cache_path = load_config()["launcher"].get("cache_path", "cache/")
+    except Exception:
+        cache_path = "cache/"
+    return os.path.join(cache_path, "java_runtimes.json")
+
+
+def _stamp(java_path):
+    st = os.stat(os.path.realpath(java_path))
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _load_cache(cache_file):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_cache(cache_file, cache):
+    try:
+        os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+        tmp_path = cache_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_file)
+    except OSError:
+        pass
+
+
 def main():
+    """查找所有Java并返回 [路径, 版本, 架构] 列表
+
+    结果按可执行文件路径 + mtime/大小缓存；优先读取 release 文件，其余候选并行执行 java -version。
+    """
     results = []
     java_paths = find_java_executables()
-    
+    cache_file = _cache_file()
+    cache = _load_cache(cache_file)
+    new_cache = {}
+    to_probe = []
+
     for path in java_paths:
-        java_info = get_java_info(path)
+        try:
+            stamp = _stamp(path)
+        except OSError:
+            continue
+        entry = cache.get(path)
+        if entry and entry.get('stamp') == stamp:
+            java_info = entry.get('info')
+        else:
+            java_info = get_java_info_from_release(path)
+            if java_info is None:
+                to_probe.append((path, stamp))
+                continue
+        new_cache[path] = {'stamp': stamp, 'info': java_info}
         if java_info:
             results.append(java_info)
-    
+
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=min(8, len(to_probe))) as executor:
+            probed = executor.map(lambda item: get_java_info(item[0]), to_probe)
+            for (path, stamp), java_info in zip(to_probe, probed):
+                # 探测失败（超时等）的结果不缓存，下次重试
+                if java_info:
+                    new_cache[path] = {'stamp': stamp, 'info': java_info}
+                    results.append(java_info)
+
+    if new_cache != cache:
+        _save_cache(cache_file, new_cache)
     results.sort(key=lambda x: x[0])
     return results
 
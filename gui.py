@@ -23,6 +23,7 @@ from PySide6.QtWidgets import (
 import prints
 from config_loader import load_config
 from core import core as Core
+import download
 import findjava
 
 
@@ -44,6 +45,11 @@ class Worker(QObject):
             self.failed.emit(str(e))
 
 
+class ProgressBridge(QObject):
+    """把 download.progress 后台线程推送的快照转到 UI 线程"""
+    updated = Signal(object)
+
+
 class LauncherGUI(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -55,9 +61,13 @@ class LauncherGUI(QMainWindow):
         self.current_type = "release"  # release | snapshot | old
         self.all_versions: Dict[str, List[Dict[str, Any]]] = {}
         self.java_list: List[List[str]] = []  # [path, version, arch]
+        self._jobs: List[Any] = []  # running (worker, thread) pairs
 
         self._build_ui()
         self._apply_style()
+        self._progress_bridge = ProgressBridge()
+        self._progress_bridge.updated.connect(self._on_progress)
+        download.progress.subscribe(self._progress_bridge.updated.emit)
         self._load_javas()
         self._fetch_versions(self.current_type)
 
@@ -147,10 +157,13 @@ class LauncherGUI(QMainWindow):
         )
 
     def _load_javas(self):
-        try:
-            self.java_list = findjava.main()
-        except Exception:
-            self.java_list = []
+        # Java 探测放到后台线程，避免阻塞窗口首次绘制
+        self.java_combo.clear()
+        self.java_combo.addItem("正在查找Java…")
+        self._run_async(findjava.main, self._on_javas_loaded, lambda e: self._on_javas_loaded([]))
+
+    def _on_javas_loaded(self, java_list):
+        self.java_list = java_list or []
         self.java_combo.clear()
         if not self.java_list:
             self.java_combo.addItem("未找到Java (将尝试系统默认)")
@@ -265,8 +278,22 @@ class LauncherGUI(QMainWindow):
         else:
             self._set_busy(False, "启动流程结束")
 
+    def _on_progress(self, snap: Dict[str, Any]):
+        if not self.progress.isVisible() or not snap.get("files_total"):
+            return
+        if snap["bytes_total"]:
+            self.progress.setRange(0, 1000)
+            self.progress.setValue(int(1000 * min(1.0, snap["bytes_done"] / snap["bytes_total"])))
+        text = f"{snap['files_done']}/{snap['files_total']} 个文件 · {snap['rate'] / 1048576:.1f} MB/s"
+        if snap["eta"] is not None:
+            text += f" · 剩余约 {int(snap['eta'])} 秒"
+        if snap["files_failed"]:
+            text += f" · 失败 {snap['files_failed']}"
+        self.status_label.setText(text)
+
     def _set_busy(self, busy: bool, text: str = ""):
         self.status_label.setText(text)
+        self.progress.setRange(0, 0)  # 收到进度快照前保持不确定模式
         self.progress.setVisible(busy)
         self.refresh_btn.setEnabled(not busy)
         self.download_btn.setEnabled(not busy)
@@ -274,23 +301,29 @@ class LauncherGUI(QMainWindow):
         self.type_combo.setEnabled(not busy)
 
     def _run_async(self, fn, on_ok, on_fail):
-        self.worker = Worker(fn)
-        self.thread = QThread()
-        self.worker.moveToThread(self.thread)
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(lambda r: self._cleanup_thread(on_ok, r))
-        self.worker.failed.connect(lambda e: self._cleanup_thread(on_fail, e))
-        self.thread.start()
-
-    def _cleanup_thread(self, callback, payload):
+        # 允许多个后台任务同时运行（如版本列表与Java探测），各自持有 worker/thread 引用
+        worker = Worker(fn)
+        thread = QThread()
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.finished.connect(lambda r: self._cleanup_thread(worker, thread, on_ok, r))
+        worker.failed.connect(lambda e: self._cleanup_thread(worker, thread, on_fail, e))
+        self._jobs.append((worker, thread))
+        thread.start()
+
+    def _cleanup_thread(self, worker, thread, callback, payload):
         try:
             callback(payload)
         finally:
             try:
-                self.thread.quit()
-                self.thread.wait(2000)
+                thread.quit()
+                thread.wait(2000)
             except Exception:
                 pass
+            try:
+                self._jobs.remove((worker, thread))
+            except ValueError:
+                pass
 
 
 def main():
@@ -1,4 +1,5 @@
 import core
+import download
 import prints
 try:
 	import gui
@@ -10,4 +11,5 @@ if __name__ == "__main__":
 		gui.main()
 	else:
 		# CLI fallback: simple one-shot download example
+		download.progress.subscribe(lambda s: print(f"[{s['files_done']}/{s['files_total']}] {s['bytes_done']}/{s['bytes_total']} bytes, {s['rate'] / 1048576:.1f} MB/s, retries {s['retries']}"))
 		print(core.core().download("release","1.21.7","挽回你"))
\ No newline at end of file
@@ -0,0 +1,170 @@
+import threading
+import urllib.parse
+from collections import deque
+
+# 官方源的元数据与客户端文件分布在多个主机上；镜像站把它们都放在同一根路径下
+_OFFICIAL_PREFIXES = {
+    "meta": (
+        "https://launchermeta.mojang.com/",
+        "https://launcher.mojang.com/",
+        "https://piston-meta.mojang.com/",
+        "https://piston-data.mojang.com/",
+    ),
+    "libraries": ("https://libraries.minecraft.net/",),
+    "assets": ("https://resources.download.minecraft.net/",),
+}
+
+# 镜像站根路径下只有这些路径与官方元数据主机等价；其余路径（如 BMCLAPI 的 forge/、optifine/）在官方源上不存在
+_META_PATHS = ("mc/", "v1/")
+
+# 没有观测数据时的先验值
+_DEFAULT_TTFB = 0.3
+_DEFAULT_RATE = 1024 * 1024
+
+
+def _meta_root(version_json):
+    """由版本清单地址得到镜像的根路径，如 https://bmclapi2.bangbang93.com/"""
+    path = urllib.parse.urlparse(version_json).path
+    index = path.find("/mc/game/")
+    if index < 0:
+        return None
+    return version_json[:len(version_json) - len(path) + index + 1]
+
+
+class MirrorStats:
+    """单个镜像主机的在线评分：首字节延迟与吞吐量的 EWMA、错误率，以及用于对冲延迟的首字节延迟样本"""
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.ttfb = None
+        self.rate = None
+        self.errors = 0.0
+        self.requests = 0
+        self.samples = deque(maxlen=128)
+
+    def record(self, ok, ttfb=None, nbytes=0, seconds=0.0):
+        self.requests += 1
+        self.errors = (1 - self.alpha) * self.errors + (0.0 if ok else self.alpha)
+        if ttfb is not None:
+            self.samples.append(ttfb)
+            self.ttfb = ttfb if self.ttfb is None else (1 - self.alpha) * self.ttfb + self.alpha * ttfb
+        # 小文件的吞吐量主要由延迟决定，不计入
+        if ok and nbytes >= 256 * 1024 and seconds > 0:
+            rate = nbytes / seconds
+            self.rate = rate if self.rate is None else (1 - self.alpha) * self.rate + self.alpha * rate
+
+    def expected_time(self, size=None):
+        """按当前评分估计下载 size 字节需要的秒数，错误率越高估计越悲观"""
+        ttfb = _DEFAULT_TTFB if self.ttfb is None else self.ttfb
+        rate = _DEFAULT_RATE if self.rate is None else self.rate
+        return (ttfb + (size or 0) / rate) * (1 + 4 * self.errors)
+
+    def ttfb_percentile(self, percentile):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def stats(self):
+        return {
+            "ttfb": self.ttfb,
+            "rate": self.rate,
+            "errors": self.errors,
+            "requests": self.requests,
+        }
+
+
+class MirrorSet:
+    """[source_link] 中的各个源互为镜像：把一个下载地址映射为所有源上的等价地址，并按实时评分排序
+
+    source_link_used 指定的源在没有观测数据时优先。
+    """
+
+    def __init__(self, source_links, preferred=None, alpha=0.3):
+        self.alpha = alpha
+        # (类别, 前缀, 源名称)，较长的前缀优先匹配
+        self.prefixes = []
+        self.roots = {}
+        names = [name for name, entry in source_links.items() if isinstance(entry, dict)]
+        if preferred in names:
+            names.remove(preferred)
+            names.insert(0, preferred)
+        self.order = names
+        for name in names:
+            entry = source_links[name]
+            roots = {
+                "meta": _meta_root(entry.get("version_json", "")),
+                "libraries": entry.get("libraries"),
+                "assets": entry.get("assets"),
+            }
+            if name == "mojang":
+                # 官方源的各类文件始终可用，即使配置中没有列出
+                for category, prefixes in _OFFICIAL_PREFIXES.items():
+                    roots[category] = roots.get(category) or prefixes[0]
+                    for prefix in prefixes:
+                        self.prefixes.append((category, prefix, name))
+            for category, root in roots.items():
+                if root:
+                    self.roots.setdefault(name, {})[category] = root
+                    self.prefixes.append((category, root, name))
+        self.prefixes.sort(key=lambda item: len(item[1]), reverse=True)
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def _split(self, url):
+        for category, prefix, name in self.prefixes:
+            if url.startswith(prefix):
+                rest = url[len(prefix):]
+                if category == "meta" and not rest.startswith(_META_PATHS):
+                    continue
+                return category, rest, name
+        return None, None, None
+
+    def candidates(self, url):
+        """返回 url 在所有源上的等价地址（按源的配置顺序，原地址所属的源不一定排在最前）"""
+        category, rest, origin = self._split(url)
+        if category is None:
+            return [url]
+        result = []
+        for name in self.order:
+            root = self.roots.get(name, {}).get(category)
+            if root is None:
+                continue
+            # 原地址本身就在该源上时保留原样（官方源的多个主机之间不能互换）
+            result.append(url if name == origin else root + rest)
+        return result or [url]
+
+    def _host(self, url):
+        host = urllib.parse.urlparse(url).netloc
+        stats = self.hosts.get(host)
+        if stats is None:
+            with self.lock:
+                stats = self.hosts.setdefault(host, MirrorStats(self.alpha))
+        return stats
+
+    def rank(self, urls, size=None):
+        """按预计耗时从快到慢排序；评分相同时保持原顺序"""
+        if len(urls) < 2:
+            return list(urls)
+        hosts = [self._host(url) for url in urls]
+        with self.lock:
+            scored = [(stats.expected_time(size), index, url) for index, (stats, url) in enumerate(zip(hosts, urls))]
+        return [url for _, _, url in sorted(scored)]
+
+    def record(self, url, ok, ttfb=None, nbytes=0, seconds=0.0):
+        stats = self._host(url)
+        with self.lock:
+            stats.record(ok, ttfb, nbytes, seconds)
+
+    def hedge_delay(self, url, percentile=95, minimum=0.25):
+        """对 url 所在主机发出对冲请求前的等待时间：首字节延迟的分位数，样本不足时取较保守的默认值"""
+        stats = self._host(url)
+        with self.lock:
+            value = stats.ttfb_percentile(percentile) if len(stats.samples) >= 16 else None
+        if value is None:
+            return max(minimum, 4 * _DEFAULT_TTFB)
+        return max(minimum, value)
+
+    def stats(self):
+        with self.lock:
+            return {host: stats.stats() for host, stats in self.hosts.items()}
@@ -3,9 +3,12 @@ import io
 import json
 import zipfile
 import pathlib
+import hashlib
+import urllib.parse
 import requests
 from typing import Optional, Dict, Any
 from config_loader import load_config
+import download
 import prints
 
 
@@ -45,11 +48,34 @@ def install_quilt(game_version: str, loader_version: str, name: Optional[str], g
     return _save_profile(profile, game_path, name)
 
 
-def _fetch_installer(url: str) -> bytes:
+def _installer_sha1(url: str) -> Optional[str]:
+    """Maven 仓库在 <url>.sha1 提供校验值；取不到时返回 None"""
+    try:
+        resp = requests.get(url + ".sha1", timeout=15)
+        resp.raise_for_status()
+        digest = resp.text.split()[0].strip().lower()
+    except Exception:
+        return None
+    return digest if len(digest) == 40 and all(c in "0123456789abcdef" for c in digest) else None
+
+
+def _fetch_installer(url: str, game_path: pathlib.Path) -> bytes:
     prints.prints("info", f"Downloading installer: {url}")
-    r = requests.get(url, timeout=60)
-    r.raise_for_status()
-    return r.content
+    # 经由 download 模块下载到游戏目录的 cache 下，大安装包可走分段并行与断点续传；用完即删除
+    name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12] + "-" + (os.path.basename(urllib.parse.urlparse(url).path) or "installer.jar")
+    save_path = game_path / "cache" / "installers" / name
+    sha1 = _installer_sha1(url)
+    # 已知 SHA1 时已存在且校验通过的安装包不再下载
+    status, msg = download.main({url: {"save": save_path, "sha1": sha1}}, 1, sha1 is not None)[0]
+    if status != "success":
+        raise RuntimeError(msg)
+    try:
+        return save_path.read_bytes()
+    finally:
+        try:
+            os.remove(save_path)
+        except OSError:
+            pass
 
 
 def _extract_version_json_from_installer(installer_bytes: bytes) -> Dict[str, Any]:
@@ -92,7 +118,7 @@ def _extract_version_json_from_installer(installer_bytes: bytes) -> Dict[str, An
 
 def install_from_installer(game_version: str, loader_version: str, name: Optional[str], game_path: pathlib.Path, template: str) -> pathlib.Path:
     url = template.format(game_version=game_version, loader_version=loader_version)
-    installer_bytes = _fetch_installer(url)
+    installer_bytes = _fetch_installer(url, game_path)
     profile = _extract_version_json_from_installer(installer_bytes)
     if name:
         profile["id"] = name
@@ -1,57 +1,201 @@
 import os
+import sys
+import atexit
 import datetime
-import inspect
+import queue
 import threading
 import time
 
 _DEFAULT_LOG_DIR = None
+_SETTINGS = None
 
+# 日志级别由低到高；低于阈值的记录在调用线程直接丢弃
+_LEVELS = {"debug": 10, "info": 20, "success": 25, "warn": 30, "warning": 30, "error": 40}
 
-def _get_default_log_dir():
-    """Lazily load log directory from config.toml with a safe fallback."""
-    global _DEFAULT_LOG_DIR
-    if _DEFAULT_LOG_DIR is not None:
-        return _DEFAULT_LOG_DIR
+_queue = queue.SimpleQueue()
+_writer = None
+_writer_lock = threading.Lock()
+_pending = 0
+_pending_cond = threading.Condition()
+_dropped = 0
+
+
+def _get_settings():
+    """Lazily load log settings from config.toml with safe fallbacks."""
+    global _SETTINGS, _DEFAULT_LOG_DIR
+    if _SETTINGS is not None:
+        return _SETTINGS
+    launcher = {}
     try:
-        import toml
-        config = toml.load('config.toml')
-        _DEFAULT_LOG_DIR = config["launcher"]["log_path"]
+        from config_loader import load_config
+        launcher = load_config()["launcher"]
     except Exception:
-        _DEFAULT_LOG_DIR = "log/launcher/"
+        pass
+    _DEFAULT_LOG_DIR = launcher.get("log_path", "log/launcher/")
+    _SETTINGS = {
+        "level": _LEVELS.get(str(launcher.get("log_level", "info")).lower(), 20),
+        "max_bytes": launcher.get("log_max_bytes", 10 * 1024 * 1024),
+        "queue_max": launcher.get("log_queue_max", 10000),
+    }
+    return _SETTINGS
+
+
+def _get_default_log_dir():
+    """Lazily load log directory from config.toml with a safe fallback."""
+    _get_settings()
     return _DEFAULT_LOG_DIR
 
 
+class _LogFile:
+    """按天与大小轮转的日志文件，句柄保持打开"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.day = None
+        self.index = 0
+        self.handle = None
+        self.size = 0
+
+    def _path(self):
+        name = str(self.day) if self.index == 0 else f"{self.day}.{self.index}"
+        return os.path.join(self.directory, name + ".log")
+
+    def _open(self, day):
+        self.close()
+        if day != self.day:
+            self.day = day
+            self.index = 0
+        os.makedirs(self.directory or ".", exist_ok=True)
+        # 跳过当天已写满的文件
+        while self.max_bytes and os.path.exists(self._path()) and os.path.getsize(self._path()) >= self.max_bytes:
+            self.index += 1
+        self.handle = open(self._path(), "a", encoding="utf-8")
+        self.size = self.handle.tell()
+
+    def write(self, text):
+        day = datetime.date.today()
+        if self.handle is None or day != self.day or (self.max_bytes and self.size >= self.max_bytes):
+            if self.handle is not None and day == self.day:
+                self.index += 1
+            self._open(day)
+        self.handle.write(text)
+        self.size += len(text.encode("utf-8"))
+
+    def flush(self):
+        if self.handle is not None:
+            self.handle.flush()
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+
+def _format(record):
+    created, level, message, filename, lineno, thread_name = record
+    formatted_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))
+    return f"{formatted_time} - [ {filename}:{lineno}/{thread_name}/{level.upper()} ]: {message}\n"
+
+
+def _write_loop():
+    """唯一的写线程：批量取出队列中的记录，合并写入文件与标准输出"""
+    global _pending, _dropped
+    settings = _get_settings()
+    files = {}
+    while True:
+        batch = [_queue.get()]
+        try:
+            while len(batch) < 1000:
+                batch.append(_queue.get_nowait())
+        except queue.Empty:
+            pass
+        by_dir = {}
+        out = []
+        with _pending_cond:
+            dropped, _dropped = _dropped, 0
+        if dropped:
+            note = (time.time(), "warning", f"{dropped} log records dropped under load", "prints.py", 0, "log-writer")
+            batch.insert(0, (None, note))
+        for filepath, record in batch:
+            entry = _format(record)
+            by_dir.setdefault(filepath or _get_default_log_dir(), []).append(entry)
+            out.append(entry)
+        for directory, entries in by_dir.items():
+            log_file = files.get(directory)
+            if log_file is None:
+                log_file = files[directory] = _LogFile(directory, settings["max_bytes"])
+            try:
+                log_file.write("".join(entries))
+                log_file.flush()
+            except Exception as e:
+                sys.stderr.write(f"Failed to write log to {directory}: {e}\n")
+        try:
+            sys.stdout.write("\n".join(out) + "\n")
+            sys.stdout.flush()
+        except Exception:
+            pass
+        with _pending_cond:
+            _pending -= len(batch) - (1 if dropped else 0)
+            _pending_cond.notify_all()
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, name="log-writer", daemon=True)
+            _writer.start()
+            atexit.register(flush)
+
+
+def flush(timeout=5.0):
+    """等待队列中已提交的日志全部写出"""
+    deadline = time.monotonic() + timeout
+    with _pending_cond:
+        while _pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            _pending_cond.wait(remaining)
+    return True
+
+
 def prints(level, message, filepath=None):
     """
     输出格式化日志信息到指定文件。
 
+    日志先放入队列，由单独的写线程批量写入（文件句柄保持打开，按天和大小轮转），
+    调用线程不做任何文件 I/O。低于 log_level 的记录直接丢弃；队列积压超过
+    log_queue_max 时，info 及以下级别的记录也会被丢弃并计数。
+
     参数:
-        level (str): 日志级别，如 'info', 'warn', 'error' 等。
-        filepath (str): 日志文件路径前缀，如 'log/launcher/'.
+        level (str): 日志级别，如 'debug', 'info', 'warning', 'error' 等。
+        filepath (str): 日志文件目录，如 'log/launcher/'，默认取配置中的 log_path。
         message (str): 要记录的日志内容。
     """
-    # 获取当前时间
-    timestamp = datetime.date.today()
-    if filepath is None:
-        filepath = _get_default_log_dir()
-    filepath = os.path.join(filepath, str(timestamp) + ".log")
+    global _pending, _dropped
+    settings = _get_settings()
+    rank = _LEVELS.get(str(level).lower(), 20)
+    if rank < settings["level"]:
+        return
+    with _pending_cond:
+        if rank <= 20 and _pending >= settings["queue_max"]:
+            _dropped += 1
+            return
+        _pending += 1
 
     # 获取调用者的信息
-    frame = inspect.currentframe()
-    caller = frame.f_back if frame else None
+    try:
+        caller = sys._getframe(1)
+    except ValueError:
+        caller = None
     filename = os.path.basename(caller.f_code.co_filename) if caller else "<unknown>"
     lineno = caller.f_lineno if caller else 0
-    local_time = time.localtime(time.time())
-    formatted_time = time.strftime('%Y-%m-%d %H:%M:%S', local_time)
     # 获取当前线程名称
     thread_name = threading.current_thread().name
 
-    # 构造日志条目
-    log_entry = f"{formatted_time} - [ {filename}:{lineno}/{thread_name}/{level.upper()} ]: {message}\n"
-    # 确保目录存在
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-
-    # 写入日志文件
-    with open(filepath, 'a', encoding='utf-8') as f:
-        f.write(log_entry)
-    print(log_entry)
\ No newline at end of file
+    _ensure_writer()
+    _queue.put((filepath, (time.time(), str(level), message, filename, lineno, thread_name)))
@@ -1,39 +1,28 @@
-import threading
 from typing import Any, Dict, Optional, Tuple
 
 import requests
-from requests.adapters import HTTPAdapter
+
+import connections
 
 try:
     from urllib3.util.retry import Retry
 except Exception:
     Retry = None
 
-_thread_local = threading.local()
+if Retry is not None:
+    _RETRY = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "HEAD"],
+    )
+else:
+    _RETRY = 0
 
 
 def _get_session() -> requests.Session:
-    sess = getattr(_thread_local, "session", None)
-    if sess is not None:
-        return sess
-    sess = requests.Session()
-    adapter_kwargs = {"pool_connections": 50, "pool_maxsize": 100}
-
-    if Retry is not None:
-        retry = Retry(
-            total=3,
-            backoff_factor=0.5,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET", "HEAD"],
-        )
-        adapter = HTTPAdapter(max_retries=retry, **adapter_kwargs)
-    else:
-        adapter = HTTPAdapter(**adapter_kwargs)
-
-    sess.mount("http://", adapter)
-    sess.mount("https://", adapter)
-    _thread_local.session = sess
-    return sess
+    # 与 download 共用进程级连接池，只保留自己的重试策略
+    return connections.get_session("realtime", _RETRY)
 
 
 def get(
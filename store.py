@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Linux 的 FICLONE ioctl：在 btrfs、XFS 等文件系统上创建共享数据块的写时复制副本（reflink）
+_FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    if fcntl is None:
+        raise OSError("reflink is not supported on this platform")
+    with open(src, "rb") as source, open(dst, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.remove(dst)
+            raise
+
+
+class ContentStore:
+    """按 sha1 寻址的共享文件仓库，多个 game_path 共用同一份数据
+
+    blob 保存在 <root>/objects/<sha1 前两位>/<sha1>。放入 game_path 时优先硬链接，
+    其次 reflink，跨文件系统时复制。blob 在首次被使用前按 hash_file 计算 SHA1，
+    结果以 inode 状态记录在 verify_index 中，状态变化（如经由硬链接被改写）后重新计算。
+    各安装在 <root>/roots/ 下登记自己引用的 sha1，gc() 据此回收 blob（见 gc）。
+    """
+
+    def __init__(self, root, verify_index, hash_file):
+        self.root = os.path.abspath(root)
+        self.verify_index = verify_index
+        self.hash_file = hash_file
+        self.lock = threading.Lock()
+        self.counts = {"hits": 0, "added": 0, "hashed": 0, "hardlink": 0, "reflink": 0, "copy": 0}
+
+    def blob_path(self, sha1):
+        return os.path.join(self.root, "objects", sha1[:2], sha1)
+
+    def lookup(self, sha1, size=None):
+        """仓库中 sha1 对应的 blob 路径；不存在、大小不符或内容与 sha1 不符时返回 None（损坏的 blob 被删除）"""
+        path = self.blob_path(sha1)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if size is not None and st.st_size != int(size):
+            return None
+        if self.verify_index.lookup(path, st) == sha1:
+            return path
+        self._count("hashed")
+        if self.hash_file(path) == sha1:
+            self.verify_index.record(path, sha1, st)
+            return path
+        self.verify_index.forget(path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def _place(self, src, dst):
+        """原子地把 src 的内容放到 dst：硬链接 -> reflink -> 复制，返回所用的方式"""
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp_path = f"{dst}.store-{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.link(src, tmp_path)
+            method = "hardlink"
+        except OSError:
+            try:
+                _reflink(src, tmp_path)
+                method = "reflink"
+            except OSError:
+                shutil.copyfile(src, tmp_path)
+                method = "copy"
+        try:
+            os.replace(tmp_path, dst)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+        self._count(method)
+        return method
+
+    @staticmethod
+    def _same(a, b):
+        try:
+            return os.path.samefile(a, b)
+        except OSError:
+            return False
+
+    def materialize(self, sha1, size, dst):
+        """仓库中有内容正确的 sha1 时把它放到 dst，返回放置方式（dst 已是该 blob 时为 "hardlink"）；否则返回 None
+
+        只有 "hardlink" 时 dst 就是校验过的 blob 本身；reflink/复制得到的 dst 没有被重新计算过 SHA1。
+        """
+        blob = self.lookup(sha1, size)
+        if blob is None:
+            return None
+        method = "hardlink" if self._same(blob, dst) else self._place(blob, dst)
+        self._count("hits")
+        return method
+
+    def add(self, path, sha1):
+        """把刚校验通过的文件 path 收入仓库；仓库已有内容正确的相同 blob 时改为让 path 引用它"""
+        blob = self.blob_path(sha1)
+        if self._same(path, blob):
+            self.verify_index.record(blob, sha1)
+            return
+        if os.path.exists(blob) and self.lookup(sha1) is not None:
+            self._place(blob, path)
+            return
+        # 只有硬链接时 blob 与刚校验过的 path 是同一个文件，其余方式在首次使用时再计算 SHA1
+        if self._place(path, blob) == "hardlink":
+            self.verify_index.record(blob, sha1)
+        self._count("added")
+
+    def discard(self, sha1, path=None):
+        """删除 sha1 对应的 blob；给出 path 时只在 blob 与 path 是同一个文件（内容一同损坏）时删除"""
+        blob = self.blob_path(sha1)
+        if path is not None and not self._same(path, blob):
+            return False
+        self.verify_index.forget(blob)
+        try:
+            os.remove(blob)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _manifest_path(self, owner):
+        return os.path.join(self.root, "roots", hashlib.sha1(owner.encode("utf-8")).hexdigest() + ".json")
+
+    def set_references(self, owner, sha1s):
+        """登记 owner（安装记录文件的路径）引用的全部 sha1，替换其上一次的登记"""
+        owner = os.path.abspath(owner)
+        path = self._manifest_path(owner)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"owner": owner, "objects": sorted(sha1s)}, f)
+        os.replace(tmp_path, path)
+
+    def _references(self):
+        """仍然存在的 owner 登记的 sha1 集合；owner 已被删除的登记一并清除"""
+        referenced = set()
+        try:
+            manifests = list(os.scandir(os.path.join(self.root, "roots")))
+        except FileNotFoundError:
+            return referenced
+        for manifest in manifests:
+            if not manifest.name.endswith(".json"):
+                continue
+            try:
+                with open(manifest.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if not os.path.exists(data["owner"]):
+                    os.remove(manifest.path)
+                    continue
+                referenced.update(data["objects"])
+            except (OSError, ValueError, KeyError):
+                continue
+        return referenced
+
+    def gc(self):
+        """删除不再被引用的 blob 与残留的临时文件
+
+        blob 被任一 owner 登记引用（见 set_references），或仍有其他硬链接时保留。
+        reflink/复制放置的文件与 blob 没有链接关系，只能依靠登记；没有登记的使用方式（如单独调用
+        download_assets）只受硬链接保护。
+        """
+        referenced = self._references()
+        removed = kept = freed = 0
+        objects = os.path.join(self.root, "objects")
+        try:
+            prefixes = list(os.scandir(objects))
+        except FileNotFoundError:
+            prefixes = []
+        for prefix in prefixes:
+            if not prefix.is_dir():
+                continue
+            with os.scandir(prefix.path) as blobs:
+                for blob in blobs:
+                    try:
+                        st = blob.stat(follow_symlinks=False)
+                        if ".store-" not in blob.name and (blob.name in referenced or st.st_nlink > 1):
+                            kept += 1
+                            continue
+                        os.remove(blob.path)
+                        self.verify_index.forget(blob.path)
+                        removed += 1
+                        freed += st.st_size
+                    except OSError:
+                        continue
+        self.verify_index.save()
+        return {"removed": removed, "kept": kept, "freed": freed}
+
+    def save(self):
+        self.verify_index.save()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core  # noqa: E402
+
+
+def _launcher(tmp_path):
+    launcher = core.core()
+    launcher.game_path = str(tmp_path)
+    return launcher
+
+
+def _object(tmp_path, data):
+    sha1 = hashlib.sha1(data).hexdigest()
+    path = tmp_path / "assets" / "objects" / sha1[:2] / sha1
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return sha1
+
+
+def _index(tmp_path, *hashes):
+    path = tmp_path / "assets" / "indexes" / "1.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"objects": {f"file{i}": {"hash": h, "size": 1} for i, h in enumerate(hashes)}}))
+    return path
+
+
+def test_plan_yields_only_missing_objects(tmp_path):
+    launcher = _launcher(tmp_path)
+    present = _object(tmp_path, b"a")
+    missing = hashlib.sha1(b"b").hexdigest()
+    planned = []
+    jobs = list(launcher._plan_assets(_index(tmp_path, present, missing), tmp_path, planned.append))
+    assert planned == [1]
+    assert [info["sha1"] for _, info in jobs] == [missing]
+    # 缺失对象的前缀目录已经建好
+    assert (tmp_path / "assets" / "objects" / missing[:2]).is_dir()
+
+
+def test_cached_listing_is_revalidated_by_directory_mtime(tmp_path, monkeypatch):
+    launcher = _launcher(tmp_path)
+    monkeypatch.setitem(launcher.config["launcher"], "persist_asset_index", True)
+    objects_dir = tmp_path / "assets" / "objects"
+    first = _object(tmp_path, b"a")
+    assert launcher._scan_asset_objects(objects_dir)[0] == {first}
+    assert (objects_dir / ".index.json").exists()
+
+    # 前缀目录未变化时直接复用缓存的列表，不再列目录
+    scanned = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scanned.append(os.fspath(path)) or scandir(path))
+    assert launcher._scan_asset_objects(objects_dir)[0] == {first}
+    assert scanned == [os.fspath(objects_dir)]
+
+    # 新增对象改变了前缀目录的 mtime，重新列出该目录
+    second = _object(tmp_path, b"c")
+    st = os.stat(objects_dir / second[:2])
+    os.utime(objects_dir / second[:2], ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert launcher._scan_asset_objects(objects_dir)[0] == {first, second}
@@ -0,0 +1,79 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import download  # noqa: E402
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(download, "time", clock)
+    return clock
+
+
+def test_opens_after_threshold_and_probes_once(clock):
+    breaker = download.CircuitBreaker("example.com", threshold=3, cooldown=5)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.wait_time() == 0
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.wait_time() == pytest.approx(5)
+
+    clock.now += 5
+    # 冷却结束：只放行一个探测请求
+    assert breaker.wait_time() == 0
+    assert breaker.state == "half_open"
+    assert breaker.wait_time() > 0
+
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.wait_time() == 0
+
+
+def test_failed_probe_doubles_the_cooldown(clock):
+    breaker = download.CircuitBreaker("example.com", threshold=1, cooldown=5, max_cooldown=12)
+    breaker.record_failure()
+    clock.now += 5
+    assert breaker.wait_time() == 0
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.wait_time() == pytest.approx(10)
+    clock.now += 10
+    assert breaker.wait_time() == 0
+    breaker.record_failure()
+    # 不超过 max_cooldown
+    assert breaker.wait_time() == pytest.approx(12)
+
+
+def test_retry_after_opens_immediately(clock):
+    breaker = download.CircuitBreaker("example.com", threshold=5, cooldown=5)
+    breaker.record_failure(retry_after=30)
+    assert breaker.state == "open"
+    assert breaker.wait_time() == pytest.approx(30)
+    # 冷却期内的失败只会延长冷却
+    breaker.record_failure(retry_after=40)
+    assert breaker.wait_time() == pytest.approx(40)
+    breaker.record_failure(retry_after=1)
+    assert breaker.wait_time() == pytest.approx(40)
+
+
+def test_cancelled_probe_is_granted_again(clock):
+    breaker = download.CircuitBreaker("example.com", threshold=1, cooldown=5)
+    breaker.record_failure()
+    clock.now += 5
+    assert breaker.wait_time() == 0
+    breaker.cancel_probe()
+    assert breaker.wait_time() == 0
+    assert breaker.wait_time() > 0
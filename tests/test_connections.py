@@ -0,0 +1,78 @@
+import http.server
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connections  # noqa: E402
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    # 保持连接，才能观察到复用
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _host_stats(origin):
+    return connections.stats()["hosts"].get(origin, {"handshakes": 0, "requests": 0})
+
+
+def test_threads_share_one_pool():
+    server, origin = _serve()
+    try:
+        sessions = []
+
+        def fetch():
+            session = connections.get_session("download")
+            sessions.append(session)
+            for _ in range(3):
+                assert session.get(f"{origin}/x", timeout=5).content == b"ok"
+
+        for _ in range(3):
+            thread = threading.Thread(target=fetch)
+            thread.start()
+            thread.join()
+        # 每个线程有自己的 Session，底层连接只建立一次
+        assert len({id(session) for session in sessions}) == 3
+        stats = _host_stats(origin)
+        assert stats["requests"] == 9 and stats["handshakes"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_prewarmed_connections_are_reused():
+    server, origin = _serve()
+    try:
+        futures = connections.prewarm([f"{origin}/a", f"{origin}/b"], count=2)
+        assert len(futures) == 1 and futures[0].result(5) == 2
+        barrier = threading.Barrier(2)
+
+        def fetch():
+            session = connections.get_session("download")
+            barrier.wait()
+            assert session.get(f"{origin}/x", timeout=5).content == b"ok"
+
+        threads = [threading.Thread(target=fetch) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 两个并发请求都用上了预热的连接，没有再握手
+        assert _host_stats(origin)["handshakes"] == 2
+    finally:
+        server.shutdown()
@@ -0,0 +1,58 @@
+import collections
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import download  # noqa: E402
+
+_Usage = collections.namedtuple("_Usage", "total used free")
+
+
+def test_missing_bytes_counts_absent_and_partial_files(tmp_path):
+    done = tmp_path / "done"
+    done.write_bytes(b"x" * 10)
+    partial = tmp_path / "partial"
+    (tmp_path / "partial.part").write_bytes(b"x" * 30)
+    jobs = {
+        "done": {"save": str(done), "size": 10},
+        "partial": {"save": str(partial), "size": 100},
+        "absent": {"save": str(tmp_path / "absent"), "size": 50},
+        "unknown": {"save": str(tmp_path / "unknown")},
+    }
+    assert download.missing_bytes(jobs) == 70 + 50
+
+
+def test_free_space_check_includes_reserve(tmp_path, monkeypatch):
+    monkeypatch.setattr(shutil, "disk_usage", lambda path: _Usage(1000, 0, 1000))
+    config = {"launcher": {"disk_reserve": 100}}
+    # 目标目录还不存在时检查其最近的已存在上级目录
+    target = tmp_path / "game" / "versions"
+    assert download.check_free_space(target, 900, config)[0] == "success"
+    assert download.check_free_space(target, 901, config)[0] == "error"
+
+
+def test_preallocated_part_is_truncated_on_interrupt(tmp_path):
+    part_path = str(tmp_path / "file.part")
+    config = {"launcher": {"preallocate_min_size": 1}}
+    f = download.open_part(part_path, 0, 1000, config)
+    assert os.path.getsize(part_path) == 1000
+    f.write(b"x" * 300)
+    download.close_part(f)
+    # 续传偏移由文件长度决定，不能把预分配的空洞当成已下载的内容
+    assert os.path.getsize(part_path) == 300
+
+
+def test_commit_replaces_target_atomically(tmp_path):
+    part_path = str(tmp_path / "file.part")
+    save_path = str(tmp_path / "file")
+    with open(save_path, "wb") as f:
+        f.write(b"old")
+    with open(part_path, "wb") as f:
+        f.write(b"new")
+    download.save_part_meta(part_path, "url", 3, None, {})
+    download.commit_part(part_path, save_path)
+    with open(save_path, "rb") as f:
+        assert f.read() == b"new"
+    assert os.listdir(tmp_path) == ["file"]
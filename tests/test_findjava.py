@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import findjava  # noqa: E402
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="fake java runtimes are shell scripts")
+
+
+def _runtime(root, version, release=False):
+    """只会输出 -version 信息的假 Java；release 为 True 时同时写出 JDK 的 release 文件"""
+    java = root / "bin" / "java"
+    java.parent.mkdir(parents=True)
+    java.write_text(f"#!/bin/sh\necho 'openjdk version \"{version}\"' >&2\necho '64-Bit Server VM' >&2\n")
+    java.chmod(0o755)
+    if release:
+        (root / "release").write_text(f'JAVA_VERSION="{version}"\nOS_ARCH="amd64"\n')
+    return str(java)
+
+
+@pytest.fixture
+def runtimes(tmp_path, monkeypatch):
+    probed = []
+    get_java_info = findjava.get_java_info
+    paths = [_runtime(tmp_path / "jdk17", "17.0.1", release=True), _runtime(tmp_path / "jre8", "1.8.0_402")]
+    monkeypatch.setattr(findjava, "find_java_executables", lambda: list(paths))
+    monkeypatch.setattr(findjava, "_cache_file", lambda: str(tmp_path / "cache" / "java_runtimes.json"))
+    monkeypatch.setattr(findjava, "get_java_info", lambda path: probed.append(path) or get_java_info(path))
+    return paths, probed
+
+
+def test_release_file_and_probe(runtimes):
+    (jdk, jre), probed = runtimes
+    assert findjava.main() == [[jdk, "17.0.1", "x86_64"], [jre, "1.8.0_402", "x86_64"]]
+    # 有 release 文件的运行时不启动 JVM
+    assert probed == [jre]
+
+
+def test_cached_until_executable_changes(runtimes):
+    (jdk, jre), probed = runtimes
+    first = findjava.main()
+    probed.clear()
+    assert findjava.main() == first
+    assert probed == []
+
+    with open(jre, "a") as f:
+        f.write("# changed\n")
+    assert findjava.main() == first
+    assert probed == [jre]
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import download  # noqa: E402
+import download_async  # noqa: E402
+
+
+def test_waiter_is_called_on_release():
+    gate = download.HostGate("example.com", 1, 1, adaptive=False)
+    woken = []
+    assert gate.try_acquire()
+    assert not gate.try_acquire(lambda: woken.append(True))
+    gate.release(True)
+    # 窗口直接转交给 waiter
+    assert woken == [True]
+    assert gate.stats()["active"] == 1
+    assert not gate.try_acquire()
+    gate.give_back()
+    assert gate.try_acquire()
+
+
+def test_release_wakes_one_waiter_in_order():
+    gate = download.HostGate("example.com", 2, 2, adaptive=False)
+    woken = []
+    assert gate.try_acquire() and gate.try_acquire()
+    for i in range(5):
+        assert not gate.try_acquire(lambda i=i: woken.append(i))
+    gate.release(True)
+    assert woken == [0]
+    gate.release(True)
+    assert woken == [0, 1]
+    # 有人排队时新来的请求不插队
+    gate.give_back()
+    assert woken == [0, 1, 2]
+    assert not gate.try_acquire()
+
+
+def test_slot_waiter_is_called_when_another_host_releases():
+    controller = download.ConcurrencyController(4, 4, adaptive=False, global_cap=1)
+    first = controller.gate("http://a.example/")
+    second = controller.gate("http://b.example/")
+    woken = []
+    assert first.try_acquire()
+    assert not second.try_acquire(lambda: woken.append(True))
+    first.release(True)
+    assert woken == [True]
+    assert second.stats()["active"] == 1 and first.stats()["active"] == 0
+    assert not first.try_acquire()
+    second.release(True)
+    assert first.try_acquire()
+
+
+def test_slot_waiter_requeues_at_head_when_window_is_full():
+    controller = download.ConcurrencyController(1, 1, adaptive=False, global_cap=1)
+    first = controller.gate("http://a.example/")
+    second = controller.gate("http://b.example/")
+    woken = []
+    assert first.try_acquire()
+    assert not second.try_acquire(lambda: woken.append("slot"))
+    # 阻塞的 acquire 先占了 second 的窗口，再等全局连接
+    blocked = threading.Thread(target=second.acquire)
+    blocked.start()
+    while second.stats()["active"] == 0:
+        threading.Event().wait(0.01)
+    first.release(True)
+    blocked.join(5)
+    assert not blocked.is_alive()
+    # 排队的 waiter 没有拿到窗口，回到 second 队首，不会丢失
+    assert woken == []
+    assert not second.try_acquire()
+    second.release(True)
+    assert woken == ["slot"]
+    assert second.stats()["active"] == 1
+
+
+def test_async_acquire_waits_for_release_from_another_thread():
+    gate = download.HostGate("example.com", 1, 1, adaptive=False)
+    assert gate.try_acquire()
+
+    async def run():
+        timer = threading.Timer(0.1, gate.release, (True,))
+        timer.start()
+        await asyncio.wait_for(download_async._acquire(gate), 5)
+        timer.join()
+
+    asyncio.run(run())
+    assert gate.stats()["active"] == 1
+    assert not gate.waiters
+
+
+def test_async_acquire_gives_back_window_after_cancel():
+    gate = download.HostGate("example.com", 1, 1, adaptive=False)
+    assert gate.try_acquire()
+
+    async def run():
+        task = asyncio.ensure_future(download_async._acquire(gate))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.sleep(0.01)
+        gate.release(True)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert gate.stats()["active"] == 0
+    assert gate.try_acquire()
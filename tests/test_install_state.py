@@ -0,0 +1,60 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core  # noqa: E402
+
+
+def _write(path, data=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _launcher(tmp_path):
+    launcher = core.core()
+    launcher.game_path = str(tmp_path)
+    return launcher
+
+
+def _state(*files):
+    return {"files": {rel: [1, None] for rel in files}, "asset_index": "assets/indexes/1.json"}
+
+
+def test_unchanged_files_are_skipped(tmp_path):
+    launcher = _launcher(tmp_path)
+    same, changed, gone = (str(tmp_path / "libraries" / name) for name in ("same.jar", "changed.jar", "gone.jar"))
+    _write(same)
+    _write(changed)
+    previous = {"files": {"libraries/same.jar": [1, "a"], "libraries/changed.jar": [1, "b"], "libraries/gone.jar": [1, "c"]}}
+    entries = {
+        "same": {"save": same, "size": 1, "sha1": "a"},
+        "changed": {"save": changed, "size": 1, "sha1": "new"},
+        "gone": {"save": gone, "size": 1, "sha1": "c"},
+    }
+    assert launcher._unchanged_files(tmp_path, previous, entries) == {"same"}
+
+
+def test_orphans_referenced_by_other_versions_are_kept(tmp_path):
+    launcher = _launcher(tmp_path)
+    for rel in ("libraries/shared.jar", "libraries/old.jar"):
+        _write(str(tmp_path / rel))
+    # 另一个版本的安装记录仍引用 shared.jar
+    _write(str(tmp_path / "versions" / "other" / "install_state.json"), json.dumps(_state("libraries/shared.jar")).encode())
+    os.makedirs(tmp_path / "versions" / "current")
+    launcher._collect_orphans("current", tmp_path, _state("libraries/shared.jar", "libraries/old.jar"), _state(), None)
+    assert os.path.exists(tmp_path / "libraries" / "shared.jar")
+    assert not os.path.exists(tmp_path / "libraries" / "old.jar")
+
+
+def test_unreadable_version_json_skips_file_cleanup(tmp_path):
+    launcher = _launcher(tmp_path)
+    _write(str(tmp_path / "libraries" / "old.jar"))
+    # 没有安装记录、版本JSON又损坏的版本：无法确定它引用了哪些文件
+    _write(str(tmp_path / "versions" / "broken" / "broken.json"), b"{")
+    os.makedirs(tmp_path / "versions" / "current")
+    assert launcher._install_references(tmp_path, "current")[0] is None
+    launcher._collect_orphans("current", tmp_path, _state("libraries/old.jar"), _state(), None)
+    assert os.path.exists(tmp_path / "libraries" / "old.jar")
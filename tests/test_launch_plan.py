@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core  # noqa: E402
+
+OBJECT = b"legacy sound"
+OBJECT_SHA1 = hashlib.sha1(OBJECT).hexdigest()
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _launcher(tmp_path):
+    launcher = core.core()
+    launcher.game_path = str(tmp_path)
+    return launcher
+
+
+def _legacy_version(tmp_path, name="legacy"):
+    """只有一个资源对象、使用 virtual 布局的旧版本"""
+    version = {"id": name, "mainClass": "net.minecraft.client.Minecraft", "libraries": [], "assetIndex": {"id": "legacy"}}
+    _write(str(tmp_path / "versions" / name / f"{name}.json"), json.dumps(version).encode())
+    _write(str(tmp_path / "versions" / name / f"{name}.jar"), b"jar")
+    index = {"virtual": True, "objects": {"sounds/a.ogg": {"hash": OBJECT_SHA1, "size": len(OBJECT)}}}
+    _write(str(tmp_path / "assets" / "indexes" / "legacy.json"), json.dumps(index).encode())
+    _write(str(tmp_path / "assets" / "objects" / OBJECT_SHA1[:2] / OBJECT_SHA1), OBJECT)
+    return name
+
+
+def test_layout_is_reused_until_the_index_changes(tmp_path, monkeypatch):
+    launcher = _launcher(tmp_path)
+    name = _legacy_version(tmp_path)
+    status, plan = launcher._launch_plan(name)
+    assert status == "success"
+    layout = launcher._launch_layout(name, plan)
+    assert layout["layout"] == "virtual"
+    assert os.path.exists(os.path.join(layout["path"], "sounds", "a.ogg"))
+
+    # 计划与布局都已缓存：再次启动不再逐个检查资源文件
+    calls = []
+    materialize = launcher._materialize_assets
+    monkeypatch.setattr(launcher, "_materialize_assets", lambda *args: calls.append(args) or materialize(*args))
+    status, plan = launcher._launch_plan(name)
+    assert launcher._launch_layout(name, plan) == layout
+    assert calls == []
+
+    # 资源索引变化后重新布局
+    index = {"virtual": True, "objects": {"sounds/b.ogg": {"hash": OBJECT_SHA1, "size": len(OBJECT)}}}
+    _write(str(tmp_path / "assets" / "indexes" / "legacy.json"), json.dumps(index).encode())
+    status, plan = launcher._launch_plan(name)
+    launcher._launch_layout(name, plan)
+    assert len(calls) == 1
+    assert os.path.exists(os.path.join(layout["path"], "sounds", "b.ogg"))
+
+
+def _count_resolves(launcher, monkeypatch):
+    """记录 _launch_plan 实际解析版本JSON的次数"""
+    calls = []
+    allowed = launcher._library_allowed
+    monkeypatch.setattr(launcher, "_library_allowed", lambda *args: calls.append(args) or allowed(*args))
+    return calls
+
+
+def _with_library(tmp_path, name):
+    path = tmp_path / "versions" / name / f"{name}.json"
+    version = json.loads(path.read_text())
+    version["libraries"] = [{"name": "lib", "downloads": {"artifact": {"path": "org/lib.jar"}}}]
+    path.write_text(json.dumps(version))
+    _write(str(tmp_path / "libraries" / "org" / "lib.jar"), b"lib")
+
+
+def test_plan_is_cached_until_its_key_changes(tmp_path, monkeypatch):
+    launcher = _launcher(tmp_path)
+    name = _legacy_version(tmp_path)
+    _with_library(tmp_path, name)
+    resolves = _count_resolves(launcher, monkeypatch)
+    first = launcher._launch_plan(name)[1]
+    assert os.path.exists(tmp_path / "versions" / name / "launch_plan.json")
+    assert launcher._launch_plan(name)[1]["classpath"] == first["classpath"]
+    assert len(resolves) == 1
+
+    # 版本JSON变化
+    path = tmp_path / "versions" / name / f"{name}.json"
+    path.write_text(path.read_text().replace("net.minecraft.client.Minecraft", "net.minecraft.client.main.Main"))
+    assert launcher._launch_plan(name)[1]["main_class"] == "net.minecraft.client.main.Main"
+    assert len(resolves) == 2
+
+    # libraries 重新安装
+    launcher._touch_libraries_stamp(tmp_path)
+    stamp = tmp_path / "libraries" / ".install_stamp"
+    os.utime(stamp, ns=(0, os.stat(stamp).st_mtime_ns + 1_000_000))
+    launcher._launch_plan(name)
+    assert len(resolves) == 3
+
+    # 客户端JAR被删除
+    os.remove(tmp_path / "versions" / name / f"{name}.jar")
+    launcher._launch_plan(name)
+    assert len(resolves) == 4
+
+
+def test_incomplete_plan_is_not_cached(tmp_path):
+    launcher = _launcher(tmp_path)
+    name = _legacy_version(tmp_path)
+    _with_library(tmp_path, name)
+    os.remove(tmp_path / "libraries" / "org" / "lib.jar")
+    status, plan = launcher._launch_plan(name)
+    assert status == "success" and not plan["complete"]
+    assert not os.path.exists(tmp_path / "versions" / name / "launch_plan.json")
@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import download  # noqa: E402
+
+
+class _Clock:
+    """替换 download 模块中的 time，sleep 只推进虚拟时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(download, "time", clock)
+    return clock
+
+
+def test_token_bucket_holds_the_rate(clock):
+    bucket = download.TokenBucket(1_000_000)
+    received = 0
+    # 持续读取 10 秒（虚拟时间），每块按返回的等待时间补齐
+    while clock.now < 1010.0:
+        clock.sleep(bucket.reserve(65536))
+        received += 65536
+    # 初始突发不超过 burst
+    assert received <= 10 * 1_000_000 + bucket.burst + 65536
+    assert received >= 10 * 1_000_000
+
+
+def test_token_bucket_burst_is_capped(clock):
+    bucket = download.TokenBucket(1_000_000)
+    clock.sleep(60)
+    # 空闲很久后也只能立即取走 burst 个令牌
+    assert bucket.reserve(bucket.burst) == 0
+    assert bucket.reserve(500_000) == pytest.approx(0.5)
+
+
+def test_hosts_have_separate_buckets_under_a_global_one(clock):
+    limiter = download.BandwidthLimiter(global_rate=1_000_000, host_rate=100_000)
+    burst = download.TokenBucket(100_000).burst
+    assert limiter.reserve("http://a.example/x", burst) == 0
+    # 另一个主机有自己的令牌
+    assert limiter.reserve("http://b.example/x", burst) == 0
+    assert limiter.reserve("http://a.example/y", 100_000) == pytest.approx(1.0)
+    assert not download.BandwidthLimiter().enabled
+
+
+def test_per_host_cap_limits_the_window():
+    controller = download.ConcurrencyController(64, 64, adaptive=False, per_host_cap=2)
+    gate = controller.gate("http://a.example/")
+    assert gate.try_acquire() and gate.try_acquire()
+    assert not gate.try_acquire()
+    # 其他主机不受影响
+    assert controller.gate("http://b.example/").try_acquire()
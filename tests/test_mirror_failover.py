@@ -0,0 +1,117 @@
+import copy
+import hashlib
+import http.server
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_loader  # noqa: E402
+import download  # noqa: E402
+import mirrors  # noqa: E402
+
+PAYLOAD = os.urandom(256 * 1024)
+SHA1 = hashlib.sha1(PAYLOAD).hexdigest()
+PATH = "/mc/game/objects/payload.bin"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    status = 200
+    delay = 0.0
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        if self.status >= 400:
+            self.send_response(self.status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].split("-")[0])
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(PAYLOAD) - start))
+        self.end_headers()
+        self.wfile.write(PAYLOAD[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(status, delay):
+    handler = type("Handler", (_Handler,), {"status": status, "delay": delay})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+@pytest.fixture
+def mirror_pair(tmp_path, monkeypatch, request):
+    """第一个镜像返回错误状态（可延迟），第二个镜像正常；每个用例使用全新的评分、熔断器与并发窗口"""
+    status, bad_delay, good_delay = request.param
+    bad, bad_root = _serve(status, bad_delay)
+    good, good_root = _serve(200, good_delay)
+    config = copy.deepcopy(config_loader.load_config())
+    config["source_link"] = {
+        "bad": {"version_json": bad_root + "mc/game/version_manifest_v2.json"},
+        "good": {"version_json": good_root + "mc/game/version_manifest_v2.json"},
+    }
+    config["launcher"].update(source_link_used="bad", cache_path=str(tmp_path / "cache"), shared_store="")
+    for name, value in (("_MIRRORS", None), ("_CONTROLLER", None), ("_BREAKERS", {}), ("_VERIFY_INDEX", None)):
+        monkeypatch.setattr(download, name, value)
+    monkeypatch.setattr(download, "_config", lambda: config)
+    monkeypatch.setattr(mirrors.MirrorSet, "hedge_delay", lambda self, url, *args, **kwargs: 0.1)
+    yield config, bad_root.rstrip("/") + PATH, good_root.rstrip("/") + PATH
+    bad.shutdown()
+    good.shutdown()
+
+
+def _attempt(config, url, save_path, sources):
+    token = download.progress.start(url, len(PAYLOAD))
+    try:
+        return download._attempt(url, save_path, len(PAYLOAD), SHA1, config, token, 0, sources)
+    finally:
+        download.progress.finish(url, True, token)
+
+
+def _assert_released(config, *urls):
+    controller = download.get_controller(config)
+    for url in urls:
+        assert controller.gate(url).active == 0
+
+
+# 第一个镜像在对冲请求发出之后、第二个镜像返回之前给出错误状态，成为 fallback 后被丢弃
+@pytest.mark.parametrize("mirror_pair", [(503, 0.3, 0.6), (404, 0.3, 0.6)], indirect=True)
+def test_hedged_failover(mirror_pair, tmp_path):
+    config, bad_url, good_url = mirror_pair
+    config["launcher"]["mirror_hedging"] = True
+    save_path = str(tmp_path / "game" / "payload.bin")
+    result = _attempt(config, bad_url, save_path, [bad_url, good_url])
+    assert result[0] == "success"
+    with open(save_path, "rb") as f:
+        assert f.read() == PAYLOAD
+    _assert_released(config, bad_url, good_url)
+
+
+# 从 .part 续传时不对冲，第一个镜像返回错误状态后在同一次尝试内换到第二个镜像
+@pytest.mark.parametrize("mirror_pair", [(503, 0.0, 0.0), (404, 0.0, 0.0)], indirect=True)
+def test_resume_failover(mirror_pair, tmp_path):
+    config, bad_url, good_url = mirror_pair
+    save_path = str(tmp_path / "game" / "payload.bin")
+    part_path = save_path + ".part"
+    os.makedirs(os.path.dirname(save_path))
+    with open(part_path, "wb") as f:
+        f.write(PAYLOAD[:len(PAYLOAD) // 2])
+    download.save_part_meta(part_path, bad_url, len(PAYLOAD), SHA1, {"ETag": '"payload"'}, bad_url)
+    result = _attempt(config, bad_url, save_path, [bad_url, good_url])
+    assert result[0] == "success"
+    with open(save_path, "rb") as f:
+        assert f.read() == PAYLOAD
+    _assert_released(config, bad_url, good_url)
@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mirrors  # noqa: E402
+
+SOURCE_LINKS = {
+    "mojang": {
+        "version_json": "https://launchermeta.mojang.com/mc/game/version_manifest_v2.json",
+        "libraries": "https://libraries.minecraft.net/",
+        "assets": "https://resources.download.minecraft.net/",
+    },
+    "bmclapi": {
+        "version_json": "https://bmclapi2.bangbang93.com/mc/game/version_manifest_v2.json",
+        "libraries": "https://bmclapi2.bangbang93.com/maven/",
+        "assets": "https://bmclapi2.bangbang93.com/assets/",
+    },
+}
+
+
+def test_meta_paths_are_mirrored():
+    mirror_set = mirrors.MirrorSet(SOURCE_LINKS, "mojang")
+    assert mirror_set.candidates("https://piston-data.mojang.com/v1/objects/ab/client.jar") == [
+        "https://piston-data.mojang.com/v1/objects/ab/client.jar",
+        "https://bmclapi2.bangbang93.com/v1/objects/ab/client.jar",
+    ]
+    assert mirror_set.candidates("https://bmclapi2.bangbang93.com/mc/game/version_manifest_v2.json") == [
+        "https://launchermeta.mojang.com/mc/game/version_manifest_v2.json",
+        "https://bmclapi2.bangbang93.com/mc/game/version_manifest_v2.json",
+    ]
+
+
+def test_mirror_only_paths_are_not_mapped_to_mojang():
+    mirror_set = mirrors.MirrorSet(SOURCE_LINKS, "mojang")
+    for url in (
+        "https://bmclapi2.bangbang93.com/forge/maven/net/minecraftforge/forge/1.20.1-47.2.0/forge-1.20.1-47.2.0-installer.jar",
+        "https://bmclapi2.bangbang93.com/optifine/1.20.1/HD_U/I6",
+    ):
+        assert mirror_set.candidates(url) == [url]
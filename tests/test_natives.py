@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core  # noqa: E402
+
+SHA1 = "0" * 40
+
+
+def _launcher(tmp_path):
+    launcher = core.core()
+    launcher.game_path = str(tmp_path)
+    return launcher
+
+
+def test_failed_extraction_leaves_no_staging_dir(tmp_path):
+    launcher = _launcher(tmp_path)
+    cache_dir = tmp_path / "cache" / "natives"
+    cache_dir.mkdir(parents=True)
+    broken = tmp_path / "natives.jar"
+    broken.write_bytes(b"not a zip")
+    with pytest.raises(zipfile.BadZipFile):
+        launcher._extract_natives_cached(broken, cache_dir, SHA1)
+    assert os.listdir(cache_dir) == []
+
+
+def test_stale_staging_dirs_are_swept(tmp_path):
+    launcher = _launcher(tmp_path)
+    cache_dir = tmp_path / "cache" / "natives"
+    stale = cache_dir / f"{SHA1}.tmp-1-1"
+    fresh = cache_dir / f"{SHA1}.tmp-2-2"
+    done = cache_dir / SHA1
+    for path in (stale, fresh, done):
+        path.mkdir(parents=True)
+    old = time.time() - 7200
+    os.utime(stale, (old, old))
+    os.utime(done, (old, old))
+    launcher._sweep_natives_staging(cache_dir)
+    assert sorted(os.listdir(cache_dir)) == sorted([fresh.name, done.name])
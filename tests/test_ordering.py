@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import download  # noqa: E402
+
+
+def _config(**launcher):
+    return {"launcher": {"size_ordering": True, **launcher}}
+
+
+def _jobs(sizes):
+    return {f"url{i}": {"size": size} for i, size in enumerate(sizes)}
+
+
+def _sizes(jobs):
+    return [info["size"] for _, info in jobs]
+
+
+def test_large_files_start_in_the_first_round():
+    workers = 8
+    sizes = [10] * 100 + [5000, 20000, 1000]
+    ordered = _sizes(download.order_jobs(_jobs(sizes), workers, _config()))
+    first_round = ordered[:workers]
+    # 大文件全部在第一轮派发，按从大到小排列；中间穿插小文件
+    assert [size for size in first_round if size >= 1000] == [20000, 5000, 1000]
+    assert ordered[0] == 20000
+    assert any(size == 10 for size in first_round)
+    assert sorted(ordered) == sorted(sizes)
+
+
+def test_unknown_sizes_count_as_small():
+    jobs = {"a": {"size": None}, "b": {"size": 3}, "c": {}, "d": {"size": 7}}
+    ordered = [url for url, _ in download.order_jobs(jobs, 4, _config())]
+    assert ordered[0] == "d"
+    assert ordered.index("d") < ordered.index("b")
+    # 大小未知的任务保持原有的相对顺序
+    assert ordered.index("a") < ordered.index("c")
+
+
+def test_iterators_are_ordered_in_bounded_batches():
+    sizes = [1, 2, 3, 4, 5, 6]
+    jobs = iter(_jobs(sizes).items())
+    ordered = _sizes(download.order_jobs(jobs, 1, _config(ordering_lookahead=3)))
+    assert ordered == [3, 2, 1, 6, 5, 4]
+
+
+def test_ordering_can_be_disabled():
+    sizes = [1, 100, 10]
+    assert _sizes(download.order_jobs(_jobs(sizes), 4, _config(size_ordering=False))) == sizes
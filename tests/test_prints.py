@@ -0,0 +1,55 @@
+import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prints  # noqa: E402
+
+
+def _settings(monkeypatch, **settings):
+    monkeypatch.setattr(prints, "_SETTINGS", {**prints._get_settings(), **settings})
+
+
+def _log(directory):
+    with open(os.path.join(directory, f"{datetime.date.today()}.log"), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_records_are_written_by_the_writer_thread(tmp_path, monkeypatch):
+    _settings(monkeypatch, level=20)
+    directory = str(tmp_path / "log")
+    prints.prints("debug", "hidden", directory)
+    prints.prints("info", "first", directory)
+    prints.prints("error", "second", directory)
+    assert prints.flush()
+    text = _log(directory)
+    assert "hidden" not in text
+    assert text.index("first") < text.index("second")
+    # 调用位置取自调用 prints() 的帧
+    assert "[ test_prints.py:" in text and "/ERROR ]: second" in text
+
+
+def test_info_is_dropped_under_backlog_but_errors_are_kept(tmp_path, monkeypatch):
+    _settings(monkeypatch, level=20, queue_max=0)
+    # 丢弃计数写到默认日志目录
+    monkeypatch.setattr(prints, "_DEFAULT_LOG_DIR", str(tmp_path / "default"))
+    directory = str(tmp_path / "log")
+    prints.prints("info", "dropped", directory)
+    prints.prints("error", "kept", directory)
+    assert prints.flush()
+    prints.prints("error", "after", directory)
+    assert prints.flush()
+    text = _log(directory) + _log(str(tmp_path / "default"))
+    assert "dropped" not in text.replace("log records dropped", "")
+    assert "kept" in text
+    assert "1 log records dropped under load" in text
+
+
+def test_log_file_rotates_by_size(tmp_path):
+    log_file = prints._LogFile(str(tmp_path), 100)
+    for _ in range(3):
+        log_file.write("x" * 60 + "\n")
+    log_file.close()
+    day = datetime.date.today()
+    assert sorted(os.listdir(tmp_path)) == [f"{day}.1.log", f"{day}.log"]
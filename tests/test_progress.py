@@ -0,0 +1,70 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import download  # noqa: E402
+
+
+def test_snapshot_counts_partial_and_finished_jobs():
+    progress = download.Progress()
+    progress.begin()
+    for size in (100, 300):
+        progress.expect(size)
+    first = progress.start("a", 100)
+    second = progress.start("b", 300)
+    progress.advance(first, 100)
+    progress.advance(second, 50)
+    progress.finish("a", True, first)
+    snapshot = progress.snapshot()
+    assert snapshot["files_total"] == 2 and snapshot["files_done"] == 1 and snapshot["files_active"] == 1
+    assert snapshot["bytes_total"] == 400 and snapshot["bytes_done"] == 150 and snapshot["bytes_received"] == 150
+    assert snapshot["started"] == ["a", "b"] and snapshot["finished"] == [["a", True]]
+    # 事件只推送一次
+    assert progress.snapshot()["started"] == []
+
+
+def test_seek_rewinds_a_restarted_job():
+    progress = download.Progress()
+    progress.expect(100)
+    token = progress.start("a", 100)
+    progress.advance(token, 80)
+    progress.seek(token, 0)
+    progress.retry(token)
+    snapshot = progress.snapshot()
+    assert snapshot["bytes_done"] == 0 and snapshot["bytes_received"] == 80 and snapshot["retries"] == 1
+
+
+def test_begin_resets_only_after_the_batch_finishes():
+    progress = download.Progress()
+    progress.expect(10)
+    token = progress.start("a", 10)
+    progress.begin()
+    assert progress.snapshot()["files_total"] == 1
+    progress.finish("a", False, token)
+    progress.begin()
+    assert progress.snapshot()["files_total"] == 0
+
+
+def test_subscribers_receive_coalesced_snapshots():
+    progress = download.Progress(interval=0.01)
+    received = []
+    event = threading.Event()
+
+    def subscriber(snapshot):
+        received.append(snapshot)
+        if snapshot["files_done"]:
+            event.set()
+
+    progress.subscribe(subscriber)
+    progress.expect(10)
+    token = progress.start("a", 10)
+    for _ in range(10):
+        progress.advance(token, 1)
+    progress.finish("a", True, token)
+    assert event.wait(5)
+    progress.unsubscribe(subscriber)
+    # 同一周期内的多次更新合并为一次推送
+    assert len(received) <= 3
+    assert sum(len(snapshot["finished"]) for snapshot in received) == 1
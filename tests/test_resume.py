@@ -0,0 +1,106 @@
+import copy
+import hashlib
+import http.server
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_loader  # noqa: E402
+import download  # noqa: E402
+
+PAYLOAD = os.urandom(64 * 1024)
+SHA1 = hashlib.sha1(PAYLOAD).hexdigest()
+ETAG = '"v1"'
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    honour_range = True
+    requests = []
+
+    def do_GET(self):
+        self.requests.append({"range": self.headers.get("Range"), "if_range": self.headers.get("If-Range")})
+        start = 0
+        if self.honour_range and self.headers.get("Range") and self.headers.get("If-Range") in (None, ETAG):
+            start = int(self.headers["Range"].split("=")[1].split("-")[0])
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Length", str(len(PAYLOAD) - start))
+        self.end_headers()
+        self.wfile.write(PAYLOAD[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def serve(tmp_path, monkeypatch):
+    """启动本地服务器，返回 (下载函数, 服务器收到的请求)；honour_range 为 False 时服务器忽略 Range"""
+    servers = []
+    config = copy.deepcopy(config_loader.load_config())
+    config["launcher"].update(
+        mirror_hedging=False, cache_path=str(tmp_path / "cache"), shared_store="", segment_threshold=0, download_max_retries=0,
+    )
+    for name, value in (("_MIRRORS", None), ("_CONTROLLER", None), ("_BREAKERS", {}), ("_VERIFY_INDEX", None)):
+        monkeypatch.setattr(download, name, value)
+    monkeypatch.setattr(download, "_config", lambda: config)
+
+    def start(honour_range=True):
+        requests = []
+        handler = type("Handler", (_Handler,), {"honour_range": honour_range, "requests": requests})
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        url = f"http://127.0.0.1:{server.server_address[1]}/file.bin"
+
+        def fetch(save_path):
+            return download.download(url, str(save_path), len(PAYLOAD), SHA1, False, config)
+
+        return url, fetch, requests
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def _partial(save_path, url, length, sha1=SHA1):
+    part_path = f"{save_path}.part"
+    with open(part_path, "wb") as f:
+        f.write(PAYLOAD[:length])
+    download.save_part_meta(part_path, url, len(PAYLOAD), sha1, {"ETag": ETAG})
+
+
+def test_resumes_from_part_file(tmp_path, serve):
+    url, fetch, requests = serve()
+    save_path = tmp_path / "file.bin"
+    _partial(save_path, url, 1000)
+    assert fetch(save_path)[0] == "success"
+    assert requests == [{"range": "bytes=1000-", "if_range": ETAG}]
+    assert save_path.read_bytes() == PAYLOAD
+    assert not os.path.exists(f"{save_path}.part") and not os.path.exists(f"{save_path}.part.meta")
+
+
+def test_full_response_restarts_from_zero(tmp_path, serve):
+    url, fetch, requests = serve(honour_range=False)
+    save_path = tmp_path / "file.bin"
+    _partial(save_path, url, 1000)
+    assert fetch(save_path)[0] == "success"
+    assert requests[0]["range"] == "bytes=1000-"
+    # 服务器返回 200：已有部分被丢弃，内容仍然完整
+    assert save_path.read_bytes() == PAYLOAD
+
+
+def test_part_for_other_content_is_not_resumed(tmp_path, serve):
+    url, fetch, requests = serve()
+    save_path = tmp_path / "file.bin"
+    # .meta 记录的是另一个文件的 sha1
+    _partial(save_path, url, 1000, sha1="0" * 40)
+    assert fetch(save_path)[0] == "success"
+    assert requests == [{"range": None, "if_range": None}]
+    assert save_path.read_bytes() == PAYLOAD
@@ -0,0 +1,119 @@
+import copy
+import hashlib
+import http.server
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_loader  # noqa: E402
+import download  # noqa: E402
+
+PAYLOAD = b"x" * 200
+SHA1 = hashlib.sha1(PAYLOAD).hexdigest()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/slow/"):
+            time.sleep(0.5)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_full_gate_does_not_block_workers(tmp_path, monkeypatch):
+    """一个主机的窗口已满时，工作线程继续处理其他主机的任务"""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    config = copy.deepcopy(config_loader.load_config())
+    config["launcher"].update(
+        adaptive_concurrency=False, download_initial_concurrency=1, max_connections_per_host=1,
+        mirror_hedging=False, cache_path=str(tmp_path / "cache"), shared_store="",
+    )
+    for name, value in (("_MIRRORS", None), ("_CONTROLLER", None), ("_BREAKERS", {}), ("_VERIFY_INDEX", None)):
+        monkeypatch.setattr(download, name, value)
+    monkeypatch.setattr(download, "_config", lambda: config)
+    finished = {}
+    started = time.monotonic()
+    try:
+        with download.Scheduler(2, config) as scheduler:
+            jobs = [(f"http://127.0.0.1:{port}/slow/{i}", f"slow{i}") for i in range(4)]
+            jobs += [(f"http://localhost:{port}/fast/{i}", f"fast{i}") for i in range(4)]
+            for url, name in jobs:
+                future = scheduler.fetch(url, {"save": str(tmp_path / name), "size": len(PAYLOAD), "sha1": SHA1}, False)
+                future.add_done_callback(lambda f, name=name: finished.setdefault(name, (time.monotonic() - started, f.result())))
+            scheduler.join()
+    finally:
+        server.shutdown()
+    assert all(result[0] == "success" for _, result in finished.values())
+    # 慢主机的任务排在前面且窗口只有 1；快主机的任务不必等它们全部完成
+    assert max(finished[f"fast{i}"][0] for i in range(4)) < 1.0
+    assert min(finished[f"slow{i}"][0] for i in range(4)) >= 0.5
+    for host in ("127.0.0.1", "localhost"):
+        assert download.get_controller(config).gate(f"http://{host}:{port}/").stats()["active"] == 0
+
+
+def test_feed_keeps_window_and_joins(tmp_path, monkeypatch):
+    """feed() 只在有空位时读取任务；已存在的文件立即完成，不会递归提交"""
+    config = copy.deepcopy(config_loader.load_config())
+    config["launcher"].update(cache_path=str(tmp_path / "cache"), shared_store="")
+    monkeypatch.setattr(download, "_VERIFY_INDEX", None)
+    monkeypatch.setattr(download, "_config", lambda: config)
+    counts = {"pulled": 0, "done": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def jobs():
+        for i in range(2000):
+            path = tmp_path / "files" / str(i)
+            path.parent.mkdir(exist_ok=True)
+            path.write_bytes(PAYLOAD)
+            with lock:
+                counts["pulled"] += 1
+                counts["peak"] = max(counts["peak"], counts["pulled"] - counts["done"])
+            yield f"http://127.0.0.1:9/{i}", {"save": str(path), "size": len(PAYLOAD), "sha1": SHA1}
+
+    def on_result(url, result):
+        assert result[0] == "success"
+        with lock:
+            counts["done"] += 1
+
+    with download.Scheduler(4, config) as scheduler:
+        feed = scheduler.feed(jobs(), 8, True, on_result=on_result)
+        scheduler.join()
+    assert feed.done() and feed.exception() is None
+    assert counts["done"] == 2000
+    assert counts["peak"] <= 8
+
+
+def test_critical_tasks_run_before_background_ones():
+    """唯一的工作线程空出来后先取关键任务，后台任务排在后面"""
+    config = copy.deepcopy(config_loader.load_config())
+    order = []
+    gate = threading.Event()
+    with download.Scheduler(1, config) as scheduler:
+        scheduler.task(gate.wait, 5)
+        for i in range(3):
+            scheduler.task(order.append, f"background{i}", priority=download.BACKGROUND)
+        for i in range(3):
+            scheduler.task(order.append, f"critical{i}", priority=download.CRITICAL)
+        gate.set()
+        scheduler.join()
+    assert order == ["critical0", "critical1", "critical2", "background0", "background1", "background2"]
+
+
+def test_task_waits_for_its_dependencies():
+    config = copy.deepcopy(config_loader.load_config())
+    order = []
+    with download.Scheduler(4, config) as scheduler:
+        first = scheduler.task(lambda: time.sleep(0.1) or order.append("index"))
+        second = scheduler.task(order.append, "assets", after=[first, None], priority=download.CRITICAL)
+        scheduler.join()
+    assert second.done() and order == ["index", "assets"]
@@ -0,0 +1,73 @@
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import download  # noqa: E402
+import store  # noqa: E402
+
+DATA = b"shared object" * 1024
+SHA1 = hashlib.sha1(DATA).hexdigest()
+
+
+def _store(tmp_path):
+    root = tmp_path / "store"
+    return store.ContentStore(str(root), download.VerifyIndex(str(root / "verified.json")), download.get_sha1)
+
+
+def _write(path, data=DATA):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _corrupt_blob(shared):
+    # 与原内容大小相同，只靠大小无法发现
+    _write(shared.blob_path(SHA1), b"x" * len(DATA))
+
+
+def test_corrupted_blob_is_not_materialized(tmp_path):
+    shared = _store(tmp_path)
+    _corrupt_blob(shared)
+    dst = str(tmp_path / "game" / "object")
+    assert shared.materialize(SHA1, len(DATA), dst) is None
+    assert not os.path.exists(dst)
+    assert not os.path.exists(shared.blob_path(SHA1))
+
+
+def test_add_keeps_verified_file_over_corrupted_blob(tmp_path):
+    shared = _store(tmp_path)
+    _corrupt_blob(shared)
+    path = str(tmp_path / "game" / "object")
+    _write(path)
+    shared.add(path, SHA1)
+    with open(path, "rb") as f:
+        assert f.read() == DATA
+    with open(shared.blob_path(SHA1), "rb") as f:
+        assert f.read() == DATA
+
+
+def test_gc_keeps_registered_blobs_placed_by_copy(tmp_path, monkeypatch):
+    shared = _store(tmp_path)
+
+    def no_link(src, dst):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(os, "link", no_link)
+    monkeypatch.setattr(store, "_reflink", no_link)
+    owner = tmp_path / "game" / "versions" / "1.0" / "install_state.json"
+    _write(str(owner), b"{}")
+    path = str(tmp_path / "game" / "object")
+    _write(path)
+    shared.add(path, SHA1)
+    assert os.stat(shared.blob_path(SHA1)).st_nlink == 1
+
+    shared.set_references(str(owner), {SHA1})
+    assert shared.gc()["removed"] == 0
+    assert os.path.exists(shared.blob_path(SHA1))
+
+    # 登记者被删除后，blob 不再被引用
+    os.remove(owner)
+    assert shared.gc()["removed"] == 1
+    assert not os.path.exists(shared.blob_path(SHA1))
@@ -0,0 +1,97 @@
+import copy
+import hashlib
+import http.server
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_loader  # noqa: E402
+import core  # noqa: E402
+import download  # noqa: E402
+
+CLIENT = b"client jar" * 100
+OBJECT = b"asset object"
+OBJECT_SHA1 = hashlib.sha1(OBJECT).hexdigest()
+INDEX = json.dumps({"objects": {"a.ogg": {"hash": OBJECT_SHA1, "size": len(OBJECT)}}}).encode()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    files = {}
+
+    def do_GET(self):
+        data = self.files.get(self.path)
+        if data is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def installed(tmp_path, monkeypatch):
+    """客户端JAR内容损坏（大小不变）、资源对象缺失的已安装版本"""
+    handler = type("Handler", (_Handler,), {"files": {
+        "/client.jar": CLIENT, "/1.json": INDEX, f"/objects/{OBJECT_SHA1[:2]}/{OBJECT_SHA1}": OBJECT,
+    }})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root = f"http://127.0.0.1:{server.server_address[1]}"
+
+    config = copy.deepcopy(config_loader.load_config())
+    config["launcher"].update(cache_path=str(tmp_path / "cache"), shared_store="", mirror_hedging=False, download_backend="thread")
+    config["source_link"][config["launcher"]["source_link_used"]]["assets"] = f"{root}/objects/"
+    for name, value in (("_MIRRORS", None), ("_CONTROLLER", None), ("_BREAKERS", {}), ("_VERIFY_INDEX", None)):
+        monkeypatch.setattr(download, name, value)
+    monkeypatch.setattr(download, "_config", lambda: config)
+    launcher = core.core()
+    launcher.config = config
+    launcher.game_path = str(tmp_path / "game")
+
+    game = tmp_path / "game"
+    version = {
+        "id": "v", "mainClass": "Main", "libraries": [],
+        "downloads": {"client": {"url": f"{root}/client.jar", "size": len(CLIENT), "sha1": hashlib.sha1(CLIENT).hexdigest()}},
+        "assetIndex": {"id": "1", "url": f"{root}/1.json", "size": len(INDEX), "sha1": hashlib.sha1(INDEX).hexdigest()},
+    }
+    (game / "versions" / "v").mkdir(parents=True)
+    (game / "versions" / "v" / "v.json").write_text(json.dumps(version))
+    (game / "versions" / "v" / "v.jar").write_bytes(b"x" * len(CLIENT))
+    (game / "assets" / "indexes").mkdir(parents=True)
+    (game / "assets" / "indexes" / "1.json").write_bytes(INDEX)
+    yield launcher, game
+    server.shutdown()
+
+
+def test_verify_reports_damaged_files(installed):
+    launcher, game = installed
+    status, report = launcher.verify(repair=False)
+    assert status == "error"
+    assert report["versions"] == {"v": "ok"}
+    assert report["checked"] == 3 and report["ok"] == 1
+    damaged = {os.path.basename(entry["path"]): entry["status"] for entry in report["damaged"]}
+    assert damaged == {"v.jar": "sha1", OBJECT_SHA1: "missing"}
+    assert not os.path.exists(game / "assets" / "objects" / OBJECT_SHA1[:2] / OBJECT_SHA1)
+    json.dumps(report)
+
+
+def test_verify_repairs_only_damaged_files(installed):
+    launcher, game = installed
+    status, report = launcher.verify()
+    assert status == "success"
+    assert len(report["repaired"]) == 2 and not report["repair_failed"]
+    assert (game / "versions" / "v" / "v.jar").read_bytes() == CLIENT
+    assert (game / "assets" / "objects" / OBJECT_SHA1[:2] / OBJECT_SHA1).read_bytes() == OBJECT
+    # 修复后再次校验全部通过
+    assert launcher.verify(repair=False)[0] == "success"
@@ -0,0 +1,70 @@
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import download  # noqa: E402
+
+DATA = b"verified content"
+SHA1 = hashlib.sha1(DATA).hexdigest()
+
+
+def _verified(tmp_path):
+    path = tmp_path / "file.bin"
+    path.write_bytes(DATA)
+    index = download.VerifyIndex(str(tmp_path / "verified.json"))
+    index.record(str(path), SHA1)
+    return path, index
+
+
+def test_unchanged_file_is_not_rehashed(tmp_path, monkeypatch):
+    path, index = _verified(tmp_path)
+    assert index.lookup(str(path)) == SHA1
+
+    def rehash(*args):
+        raise AssertionError("file was rehashed")
+
+    monkeypatch.setattr(download, "get_sha1", rehash)
+    assert download.check_existing(str(path), len(DATA), SHA1, False, index)
+
+
+def test_modified_file_invalidates_entry(tmp_path):
+    path, index = _verified(tmp_path)
+    # 大小不变、内容改变：mtime 变化后不再采用记录的 SHA1
+    path.write_bytes(b"x" * len(DATA))
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert index.lookup(str(path)) is None
+    assert not download.check_existing(str(path), len(DATA), SHA1, False, index)
+
+
+def test_replaced_file_invalidates_entry(tmp_path):
+    path, index = _verified(tmp_path)
+    st = os.stat(path)
+    # 同样大小与 mtime，但换成了另一个 inode
+    other = tmp_path / "other.bin"
+    other.write_bytes(DATA)
+    os.utime(other, ns=(st.st_atime_ns, st.st_mtime_ns))
+    other_inode = os.stat(other).st_ino
+    os.replace(other, path)
+    assert os.stat(path).st_ino == other_inode != st.st_ino
+    assert index.lookup(str(path)) is None
+
+
+def test_deep_verify_ignores_index(tmp_path, monkeypatch):
+    path, index = _verified(tmp_path)
+    hashed = []
+    get_sha1 = download.get_sha1
+    monkeypatch.setattr(download, "get_sha1", lambda *args: hashed.append(args) or get_sha1(*args))
+    assert download.check_existing(str(path), len(DATA), SHA1, True, index)
+    assert hashed
+
+
+def test_index_survives_reload(tmp_path):
+    path, index = _verified(tmp_path)
+    index.save()
+    assert download.VerifyIndex(str(tmp_path / "verified.json")).lookup(str(path)) == SHA1
+    index.forget(str(path))
+    index.save()
+    assert download.VerifyIndex(str(tmp_path / "verified.json")).lookup(str(path)) is None